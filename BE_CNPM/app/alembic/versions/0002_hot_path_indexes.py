@@ -0,0 +1,44 @@
+"""hot path indexes
+
+Composite indexes for the OrderRoom and UsedRoom lookups in crud_order:
+orders of a room on a day, orders of a user on a day, and the room a user
+is currently in (checkout sentinel + date).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 13:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name: str, table: str, columns: list) -> None:
+    # Database cũ tạo bằng create_all từ model mới có thể đã có sẵn index
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+    if name not in existing:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _create_index('ix_orderroom_room_id_date', 'orderroom', ['room_id', 'date'])
+    _create_index('ix_orderroom_user_id_date', 'orderroom', ['user_id', 'date'])
+    _create_index('ix_usedroom_user_id_checkout_date', 'usedroom', ['user_id', 'checkout', 'date'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_usedroom_user_id_checkout_date', table_name='usedroom')
+    op.drop_index('ix_orderroom_user_id_date', table_name='orderroom')
+    op.drop_index('ix_orderroom_room_id_date', table_name='orderroom')
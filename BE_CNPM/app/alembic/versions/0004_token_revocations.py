@@ -0,0 +1,41 @@
+"""token revocations
+
+Change log of revoked access tokens (by jti or by user), read by every
+worker to keep its in-memory revocation list in sync.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tokenrevocation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tokenrevocation_expires_at'), 'tokenrevocation', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tokenrevocation_expires_at'), table_name='tokenrevocation')
+    op.drop_table('tokenrevocation')
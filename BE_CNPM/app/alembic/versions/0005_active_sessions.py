@@ -0,0 +1,103 @@
+"""active sessions
+
+ActiveSession (one row per user) replaces the UsedRoom rows whose checkout
+is the 23:59:59 sentinel. Open sessions from today and yesterday are moved
+over; older sentinel rows are left in UsedRoom as finished history.
+UsedRoom gets checkout_date for sessions that cross midnight, and
+Report.used_room_id becomes nullable (reports filed during a session are
+linked to its UsedRoom at check-out).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 19:40:00.000000
+
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHECKOUT_SENTINEL = time(23, 59, 59)
+
+usedroom = sa.table(
+    'usedroom',
+    sa.column('id', sa.Integer), sa.column('order_id', sa.Integer), sa.column('user_id', sa.Integer),
+    sa.column('room_id', sa.Integer), sa.column('date', sa.Date), sa.column('checkin', sa.Time),
+    sa.column('checkout', sa.Time),
+)
+report = sa.table('report', sa.column('used_room_id', sa.Integer))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    activesession = op.create_table('activesession',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orderroom.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['room_id'], ['room.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index(op.f('ix_activesession_room_id'), 'activesession', ['room_id'], unique=False)
+    op.add_column('usedroom', sa.Column('checkout_date', sa.Date(), nullable=True))
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.alter_column('used_room_id', existing_type=sa.Integer(), nullable=True)
+
+    # Chuyển các phiên đang mở gần đây (dòng mới nhất của mỗi user) sang ActiveSession
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(usedroom)
+        .where(usedroom.c.checkout == CHECKOUT_SENTINEL, usedroom.c.date >= date.today() - timedelta(days=1))
+        .order_by(usedroom.c.id)
+    ).mappings().all()
+    latest = {row['user_id']: row for row in rows}
+    if latest:
+        op.bulk_insert(activesession, [
+            {'user_id': row['user_id'], 'room_id': row['room_id'], 'order_id': row['order_id'],
+             'started_at': datetime.combine(row['date'], row['checkin'])}
+            for row in latest.values()
+        ])
+        moved = [row['id'] for row in latest.values()]
+        bind.execute(report.update().where(report.c.used_room_id.in_(moved)).values(used_room_id=None))
+        bind.execute(usedroom.delete().where(usedroom.c.id.in_(moved)))
+
+    existing = {index['name'] for index in sa.inspect(bind).get_indexes('usedroom')}
+    if 'ix_usedroom_user_id_checkout_date' in existing:
+        op.drop_index('ix_usedroom_user_id_checkout_date', table_name='usedroom')
+    op.create_index('ix_usedroom_user_id_date', 'usedroom', ['user_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Phiên đang mở quay lại thành dòng UsedRoom có checkout 23:59:59.
+    # Report.used_room_id vẫn để nullable: báo cáo chưa gắn UsedRoom không bị xóa.
+    bind = op.get_bind()
+    activesession = sa.table(
+        'activesession',
+        sa.column('user_id', sa.Integer), sa.column('room_id', sa.Integer),
+        sa.column('order_id', sa.Integer), sa.column('started_at', sa.DateTime),
+    )
+    rows = bind.execute(sa.select(activesession)).mappings().all()
+    if rows:
+        op.bulk_insert(usedroom, [
+            {'order_id': row['order_id'], 'user_id': row['user_id'], 'room_id': row['room_id'],
+             'date': row['started_at'].date(), 'checkin': row['started_at'].time(), 'checkout': CHECKOUT_SENTINEL}
+            for row in rows
+        ])
+    op.drop_index('ix_usedroom_user_id_date', table_name='usedroom')
+    op.create_index('ix_usedroom_user_id_checkout_date', 'usedroom', ['user_id', 'checkout', 'date'], unique=False)
+    with op.batch_alter_table('usedroom') as batch_op:
+        batch_op.drop_column('checkout_date')
+    op.drop_index(op.f('ix_activesession_room_id'), table_name='activesession')
+    op.drop_table('activesession')
@@ -0,0 +1,71 @@
+"""daily booking stats
+
+Rollup of bookings, cancellations and check-ins per day x branch x
+building x room type, maintained by the order write paths. Filled from
+the existing OrderRoom rows (same query as
+`python -m app.maintenance rebuild-booking-stats`).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 21:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+orderroom = sa.table(
+    'orderroom',
+    sa.column('id', sa.Integer), sa.column('room_id', sa.Integer), sa.column('date', sa.Date),
+    sa.column('is_used', sa.Boolean), sa.column('is_cancel', sa.Boolean),
+)
+room = sa.table(
+    'room',
+    sa.column('id', sa.Integer), sa.column('branch_id', sa.Integer),
+    sa.column('building_id', sa.Integer), sa.column('type_id', sa.Integer),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    stats = op.create_table('dailybookingstats',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('building_id', sa.Integer(), nullable=False),
+    sa.Column('type_id', sa.Integer(), nullable=False),
+    sa.Column('bookings', sa.Integer(), nullable=False),
+    sa.Column('cancellations', sa.Integer(), nullable=False),
+    sa.Column('checkins', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['branch.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['building_id'], ['building.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['type_id'], ['roomtype.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('date', 'branch_id', 'building_id', 'type_id')
+    )
+
+    # Điền từ OrderRoom hiện có: hủy khi đã check-in (trả phòng) không tính là hủy
+    cancelled = sa.and_(orderroom.c.is_cancel == sa.true(), orderroom.c.is_used == sa.false())
+    op.execute(stats.insert().from_select(
+        ['date', 'branch_id', 'building_id', 'type_id', 'bookings', 'cancellations', 'checkins'],
+        sa.select(
+            orderroom.c.date, room.c.branch_id, room.c.building_id, room.c.type_id,
+            sa.func.count(orderroom.c.id),
+            sa.func.sum(sa.case((cancelled, 1), else_=0)),
+            sa.func.sum(sa.case((orderroom.c.is_used == sa.true(), 1), else_=0)),
+        )
+        .select_from(orderroom.join(room, room.c.id == orderroom.c.room_id))
+        .group_by(orderroom.c.date, room.c.branch_id, room.c.building_id, room.c.type_id)
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('dailybookingstats')
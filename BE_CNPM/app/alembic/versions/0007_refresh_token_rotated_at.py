@@ -0,0 +1,35 @@
+"""refresh token rotated_at
+
+When a refresh token was exchanged for its successor, so that a reuse within
+REFRESH_TOKEN_REUSE_GRACE_SECONDS (several tabs refreshing with the same token)
+does not revoke the whole family.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('refreshtoken') as batch_op:
+        batch_op.add_column(sa.Column('rotated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('refreshtoken') as batch_op:
+        batch_op.drop_column('rotated_at')
@@ -0,0 +1,40 @@
+"""heatmap changes
+
+Change log of the (room, day) pairs whose bookings or check-ins changed,
+so that every worker drops the cached heatmaps that contain them.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 23:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('heatmapchange',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_heatmapchange_created_at'), 'heatmapchange', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_heatmapchange_created_at'), table_name='heatmapchange')
+    op.drop_table('heatmapchange')
@@ -0,0 +1,51 @@
+"""calendar keyset indexes
+
+Indexes in the keyset order of the admin calendar (date, begin, id), for a
+whole building and for one room. (room_id, date, begin, id) replaces
+(room_id, date), which is its prefix, so inserts pay for one more index only.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 23:55:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name: str, table: str, columns: list) -> None:
+    # Database cũ tạo bằng create_all từ model mới có thể đã có sẵn index
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+    if name not in existing:
+        op.create_index(name, table, columns, unique=False)
+
+
+def _drop_index(name: str, table: str) -> None:
+    existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+    if name in existing:
+        op.drop_index(name, table_name=table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tạo index mới trước khi xóa index cũ: MySQL cần 1 index bắt đầu bằng room_id cho khóa ngoại
+    _create_index('ix_orderroom_room_id_date_begin_id', 'orderroom', ['room_id', 'date', 'begin', 'id'])
+    _create_index('ix_orderroom_date_begin_id', 'orderroom', ['date', 'begin', 'id'])
+    _drop_index('ix_orderroom_room_id_date', 'orderroom')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _create_index('ix_orderroom_room_id_date', 'orderroom', ['room_id', 'date'])
+    _drop_index('ix_orderroom_date_begin_id', 'orderroom')
+    _drop_index('ix_orderroom_room_id_date_begin_id', 'orderroom')
@@ -0,0 +1,40 @@
+"""user cache evictions
+
+Change log of the users whose profile changed, so that every worker drops
+them from its user cache.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 23:58:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('usercacheeviction',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker', sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_usercacheeviction_created_at'), 'usercacheeviction', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_usercacheeviction_created_at'), table_name='usercacheeviction')
+    op.drop_table('usercacheeviction')
@@ -1,13 +1,14 @@
 from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from sqlmodel import Session
 from app.cores.db import engine
 from app.cores.security import ALGORITHM, decode_access_token
+from app.cores.revocation import token_revocations
 from app.cores.config import API_V1_STR, SECRET_KEY
 from app.model import User
-from app.crud.crud_user import get_user_by_username
+from app.crud.crud_user import get_user_by_username, get_user_cached
 
 
 # Khai báo HTTPBearer
@@ -21,22 +22,36 @@ def get_db():
 SessionDep = Annotated[Session, Depends(get_db)]
 TokenDep = Annotated[HTTPAuthorizationCredentials, Depends(oauth2_scheme)]
 
-# Lấy thông tin user từ token
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    try:
+def get_token_claims(request: Request, token: TokenDep) -> dict:
+    """
+    Claims of the bearer token, decoded once per request.
+    JWTAuthMiddleware stores them on request.state.claims; routes outside the
+    middleware (or tests) decode here and store them the same way.
+    """
+    claims = getattr(request.state, "claims", None)
+    if claims is None:
         if not token:
             raise HTTPException(status_code=401, detail="Missing token")
-        token_str = token.credentials
-        data = decode_access_token(token_str)
-        username = data.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.PyJWTError:
+        claims = decode_access_token(token.credentials)
+        if token_revocations.is_revoked(claims):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        request.state.claims = claims
+    if claims.get("sub") is None:
         raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = get_user_by_username(session, username)
+    return claims
+
+ClaimsDep = Annotated[dict, Depends(get_token_claims)]
+
+# Lấy thông tin user từ token.
+# Token của user bị khóa đã bị chặn bởi token_revocations, nên User lấy từ cache là đủ
+# (không cần đọc lại DB ở mỗi request để kiểm tra isActive).
+def get_current_user(session: SessionDep, claims: ClaimsDep) -> User:
+    user_id = claims.get("uid")
+    if user_id is not None:
+        user = get_user_cached(session, user_id)
+    else:
+        # Token phát hành trước khi có uid
+        user = get_user_by_username(session, claims["sub"])
     if not user or not user.isActive:
         raise HTTPException(status_code=401, detail="Inactive user")
     return user
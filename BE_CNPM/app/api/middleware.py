@@ -0,0 +1,111 @@
+'''
+Middleware ASGI kiểm tra JWT trước khi vào router.
+
+Quy tắc truy cập được khai báo theo prefix của router (AccessRule) và biên dịch
+một lần thành 1 regex, nên mỗi request chỉ tốn 1 lần match thay vì quét danh sách.
+Claims đã giải mã được lưu vào request.state.claims cho get_current_user.
+Token đã bị thu hồi (đăng xuất, khóa tài khoản) bị chặn bằng danh sách trong bộ nhớ,
+không cần truy vấn DB.
+'''
+import json
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.cores.revocation import token_revocations
+from app.cores.security import decode_access_token
+
+
+@dataclass(frozen=True)
+class AccessRule:
+    '''
+    prefix: prefix của đường dẫn (khớp cả prefix hoặc prefix + "/...").
+    public: không cần token.
+    role: claim phải đúng (vd. "isadmin"); None = chỉ cần token hợp lệ.
+    '''
+    prefix: str
+    public: bool = False
+    role: Optional[str] = None
+    detail: str = "Permission denied"
+
+
+# Đường dẫn không khớp prefix nào: chỉ cần token hợp lệ
+DEFAULT_RULE = AccessRule(prefix="")
+
+
+class PrefixMatcher:
+    def __init__(self, rules: Sequence[AccessRule]):
+        # Prefix dài hơn được thử trước để /api/v1/admin/x không rơi vào /api/v1
+        self.rules: List[AccessRule] = sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+        pattern = "|".join(f"({re.escape(rule.prefix.rstrip('/'))}(?:/|$))" for rule in self.rules)
+        self._regex = re.compile(pattern) if self.rules else None
+
+    def match(self, path: str) -> AccessRule:
+        if self._regex is None:
+            return DEFAULT_RULE
+        found = self._regex.match(path)
+        if found is None:
+            return DEFAULT_RULE
+        return self.rules[found.lastindex - 1]
+
+
+class JWTAuthMiddleware:
+    def __init__(self, app: ASGIApp, rules: Sequence[AccessRule]):
+        self.app = app
+        self.matcher = PrefixMatcher(rules)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Bỏ qua websocket/lifespan và yêu cầu OPTIONS (CORS preflight)
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.matcher.match(scope["path"])
+        if rule.public:
+            await self.app(scope, receive, send)
+            return
+
+        token = _bearer_token(scope)
+        if not token:
+            await _reject(send, 401, "Missing token")
+            return
+        try:
+            claims = decode_access_token(token)
+        except HTTPException as e:
+            await _reject(send, e.status_code, e.detail, e.headers)
+            return
+        if claims.get("sub") is None:
+            await _reject(send, 401, "Invalid token")
+            return
+        if token_revocations.is_revoked(claims):
+            await _reject(send, 401, "Token has been revoked")
+            return
+        if rule.role and not claims.get(rule.role, False):
+            await _reject(send, 403, rule.detail)
+            return
+
+        # request.state đọc từ scope["state"]
+        scope.setdefault("state", {})["claims"] = claims
+        await self.app(scope, receive, send)
+
+
+def _bearer_token(scope: Scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            return value.decode("latin-1").replace("Bearer ", "")
+    return ""
+
+
+async def _reject(send: Send, status_code: int, detail: str, headers: Optional[dict] = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    raw_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
@@ -1,12 +1,16 @@
-from fastapi import APIRouter,Query, Depends, HTTPException, status
+from fastapi import APIRouter,Query, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from math import ceil
+from datetime import date, timedelta
+import asyncio
+import json
 from sqlmodel import Session
 from app.schemas.admin import getUser
 from app.schemas.user import User_Short
 from app.schemas.metadata import Metadata
-from app.schemas.admin import getUser,changeUserStatus
+from app.schemas.admin import getUser,changeUserStatus,matrixCheck,poolStatus
 from app.schemas.metadata import Metadata
-from app.schemas.room import Branch_In, Buiding_In, TypeRoom_In,Room_with_device_In, RoomIn, RoomDevice, reponse
+from app.schemas.room import Branch_In, Buiding_In, TypeRoom_In,Room_with_device_In, RoomIn, RoomDevice, reponse, responseoccupancy
 
 from app.crud.crud_user import get_all_user,change_user_status
 from typing import List
@@ -19,9 +23,22 @@ from app.crud.crud_room import create_room, get_room, update_room, delete_room,
 from app.crud.crud_room import create_room_device, get_room_device, update_room_device, delete_room_device
 #from app.crud.crud_room import create_branch, create_building, create_room_type, create_room, 
 
-from app.crud.crud_order import get_order_rooms_by_filter
+from app.crud.crud_order import get_order_rooms_by_filter, get_room_occupancy
+from app.crud.crud_order import get_calendar_events, encode_calendar_cursor, decode_calendar_cursor
 from app.api.dependencies import SessionDep, checkyear, checkmonth, checkday
-from app.schemas.order import responseorder
+from app.schemas.order import responseorder, responsecalendar
+from app.schemas.stats import responsetimeseries, responseutilization, responseheatmap
+from app.crud.crud_stats import get_booking_timeseries
+from app.cores.availability import availability_matrix
+from app.cores import analytics
+from app.cores.db import engine, pool_status, pool_stats
+from app.cores.security import password_hasher
+from app.cores.sso import sso_breaker
+from app.cores.revocation import token_revocations
+from app.cores.library_occupancy import library_occupancy
+from app.cores.room_events import room_events
+from app.cores.config import settings
+from app.crud.crud_user import sso_negative_cache, sso_profile_cache
 router = APIRouter()
 
 # router.include_router(
@@ -508,3 +525,249 @@ def get_order_by_filter(session: SessionDep,
     }
 
 
+@router.get("/calendar", response_model=responsecalendar)
+def get_calendar(session: SessionDep,
+                 building_id: int = Query(..., description="Building ID"),
+                 date_from: date = Query(..., description="First day"),
+                 date_to: date = Query(..., description="Last day (may be in another year)"),
+                 room_id: int | None = Query(default=None, description="Only this room"),
+                 after: str | None = Query(default=None, description="next_cursor of the previous page"),
+                 limit: int = Query(default=500, ge=1, le=5000, description="Events per page")):
+    '''
+    Calendar feed of a building: compact booking events (room, date, begin, end, state)
+    ordered by date and start time. Pass next_cursor as `after` to read the next page;
+    an empty range returns an empty list.
+    '''
+    if not session.get(Building, building_id):
+        raise HTTPException(status_code=404, detail="Building not found")
+    events, next_cursor = get_calendar_events(session, building_id, date_from, date_to,
+                                              room_id=room_id,
+                                              after=decode_calendar_cursor(after) if after else None,
+                                              limit=limit)
+    return {
+        "msg": "Get calendar successfully",
+        "data": events,
+        "next_cursor": encode_calendar_cursor(next_cursor) if next_cursor else None
+    }
+
+@router.get("/room_occupancy", response_model=responseoccupancy)
+def room_occupancy(session: SessionDep,
+                   branch_id: int | None = Query(default=None, description="Only rooms of this branch"),
+                   building_id: int | None = Query(default=None, description="Only rooms of this building"),
+                   in_use: bool = Query(default=False, description="Only rooms with someone checked in")):
+    '''
+    Rooms and the users checked in them right now, grouped by branch and building.
+    One query per call, cheap enough for the dashboard to poll every few seconds.
+    '''
+    return {
+        "msg": "Get room occupancy successfully",
+        "data": get_room_occupancy(session, branch_id=branch_id, building_id=building_id, in_use=in_use)
+    }
+
+
+@router.get("/stats/timeseries", response_model=responsetimeseries)
+def booking_timeseries(session: SessionDep,
+                       grain: str = Query(default="day", pattern="^(day|week|month)$", description="day, week or month"),
+                       date_from: date | None = Query(default=None, description="First day (default: 30 days, 12 weeks or 12 months back)"),
+                       date_to: date | None = Query(default=None, description="Last day (default: today)"),
+                       branch_id: int | None = Query(default=None),
+                       building_id: int | None = Query(default=None),
+                       type_id: int | None = Query(default=None, description="Room type ID")):
+    '''
+    Bookings, cancellations, check-ins and no-shows per period, read from the daily rollup
+    (DailyBookingStats) only. Periods without bookings are returned with zeros.
+    '''
+    date_to = date_to or date.today()
+    if date_from is None:
+        date_from = date_to - timedelta(days={"day": 29, "week": 7 * 12 - 1, "month": 365}[grain])
+    return {
+        "msg": "Get booking timeseries successfully",
+        "data": get_booking_timeseries(session, grain, date_from, date_to,
+                                       branch_id=branch_id, building_id=building_id, type_id=type_id)
+    }
+
+
+@router.get("/stats/utilization", response_model=responseutilization)
+def room_utilization(session: SessionDep,
+                     date_from: date | None = Query(default=None, description="First day (default: 30 days back)"),
+                     date_to: date | None = Query(default=None, description="Last day (default: today)"),
+                     branch_id: int | None = Query(default=None),
+                     building_id: int | None = Query(default=None),
+                     type_id: int | None = Query(default=None, description="Room type ID")):
+    '''
+    Per-room booked vs used hours, no-show rate and mean check-in delay, computed with numpy
+    over OrderRoom/UsedRoom read in chunks (bounded memory over a whole semester).
+    '''
+    if not analytics.ENABLED:
+        raise HTTPException(status_code=503, detail="Utilization analytics requires numpy")
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+    return {
+        "msg": "Get room utilization successfully",
+        "data": analytics.compute_utilization(session, date_from, date_to,
+                                              branch_id=branch_id, building_id=building_id, type_id=type_id)
+    }
+
+@router.get("/stats/heatmap", response_model=responseheatmap)
+def occupancy_heatmap(session: SessionDep,
+                      building_id: int = Query(description="Building ID"),
+                      date_from: date | None = Query(default=None, description="First day (default: 4 weeks back)"),
+                      date_to: date | None = Query(default=None, description="Last day (default: today)")):
+    '''
+    Weekday x hour heatmap of a building: average booked rooms and checked-in sessions per hour.
+    Cached per (building, date range) until an order or a room usage in that range changes.
+    '''
+    if not analytics.ENABLED:
+        raise HTTPException(status_code=503, detail="Occupancy heatmap requires numpy")
+    if not session.get(Building, building_id):
+        raise HTTPException(status_code=404, detail="Building not found")
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=27)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+    return {
+        "msg": "Get occupancy heatmap successfully",
+        "data": analytics.heatmap_cache.get(session, building_id, date_from, date_to)
+    }
+
+
+@router.get("/stats/heatmap/status", response_model=poolStatus)
+def get_heatmap_cache_status():
+    '''
+    Heatmap cache of this worker: cached entries, hits, misses, entries dropped by writes
+    and the change log entries received from other workers.
+    '''
+    return {
+        "msg": "Get heatmap cache status successfully",
+        "data": analytics.heatmap_cache.stats()
+    }
+
+@router.get("/room_events")
+async def stream_room_events(request: Request):
+    '''
+    Server-sent events with room status changes (booked/released, occupancy, library headcount),
+    emitted after each commit, in every worker. Connect first: on the "ready" event load
+    /room_occupancy while keeping the events that arrive meanwhile, then apply them;
+    on a "resync" event (the client fell behind and events were dropped) do it again.
+    '''
+    if room_events.full:
+        raise HTTPException(status_code=503, detail="Too many room event listeners")
+
+    async def stream():
+        # Đăng ký trong generator: finally luôn chạy khi luồng kết thúc
+        client = room_events.subscribe()
+        if client is None:
+            return
+        try:
+            yield "retry: 3000\n\n"
+            # Đã đăng ký: mọi sự kiện commit sau lúc này đều tới client
+            yield f"event: ready\ndata: {json.dumps({'type': 'ready', 'seq': room_events.seq})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(client.queue.get(), timeout=settings.ROOM_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Giữ kết nối qua proxy và phát hiện client đã ngắt
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {item['seq']}\nevent: {item['type']}\ndata: {json.dumps(item)}\n\n"
+        finally:
+            room_events.unsubscribe(client)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/room_events/status", response_model=poolStatus)
+def get_room_events_status():
+    '''
+    Room event hub of this worker: connected listeners, events published, events still queued
+    and events dropped for listeners that fell behind.
+    '''
+    return {
+        "msg": "Get room events status successfully",
+        "data": room_events.stats()
+    }
+
+
+@router.get("/availability_matrix/check", response_model=matrixCheck)
+def check_availability_matrix(session: SessionDep,
+                              samples: int = Query(default=1000, ge=0, le=100000, description="Number of random probes")):
+    '''
+    Compare the in-memory availability matrix with OrderRoom, RoomDaySlots and check_room_availability.
+    Returns the list of mismatches (empty when consistent).
+    '''
+    if not availability_matrix.enabled:
+        raise HTTPException(status_code=404, detail="Availability matrix is disabled")
+    mismatches = availability_matrix.verify(session, samples=samples)
+    return {
+        "msg": "Availability matrix is consistent" if not mismatches else "Availability matrix is inconsistent",
+        "data": mismatches
+    }
+
+
+@router.get("/db/pool", response_model=poolStatus)
+def get_pool_status(reset: bool = Query(default=False, description="Reset the wait statistics after reading")):
+    '''
+    Connection pool occupancy and checkout wait times (avg/p50/p95/p99/max in ms) of this worker.
+    A growing p95 or any timeouts mean DB_POOL_SIZE + DB_MAX_OVERFLOW is too small for the load.
+    '''
+    status = pool_status(engine)
+    if reset:
+        pool_stats.reset()
+    return {
+        "msg": "Get pool status successfully",
+        "data": status
+    }
+
+
+@router.get("/password_hasher", response_model=poolStatus)
+def get_password_hasher_status():
+    '''
+    bcrypt executor of this worker: pending/queued jobs, max queue depth, rejected (503) jobs,
+    rehashed logins and the wait time before a job starts.
+    '''
+    return {
+        "msg": "Get password hasher status successfully",
+        "data": password_hasher.stats()
+    }
+
+
+@router.get("/sso", response_model=poolStatus)
+def get_sso_status():
+    '''
+    SSO circuit breaker state of this worker and the size of the SSO negative/profile caches.
+    '''
+    return {
+        "msg": "Get SSO status successfully",
+        "data": {
+            **sso_breaker.stats(),
+            "negative_cache_size": len(sso_negative_cache),
+            "profile_cache_size": len(sso_profile_cache),
+        }
+    }
+
+
+@router.get("/token_revocation", response_model=poolStatus)
+def get_token_revocation_status():
+    '''
+    Access token revocation list of this worker: revoked tokens/users still held in memory,
+    change log cursor, time since the last sync and requests rejected with a revoked token.
+    '''
+    return {
+        "msg": "Get token revocation status successfully",
+        "data": token_revocations.stats()
+    }
+
+
+@router.get("/library_occupancy", response_model=poolStatus)
+def get_library_occupancy_status():
+    '''
+    Write-behind library occupancy service of this worker: rooms and users held in memory,
+    events waiting for the next flush, flush count/failures and the duration of the last flush.
+    '''
+    return {
+        "msg": "Get library occupancy status successfully",
+        "data": library_occupancy.stats()
+    }
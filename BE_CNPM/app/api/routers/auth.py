@@ -125,15 +125,18 @@
 #     }
 
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlmodel import Session
-from app.schemas.user import UserIn, UserOut, Token, UserOut_json, Token_json, Register_In
+from app.schemas.user import UserIn, UserOut, Token, UserOut_json, Token_json, Register_In, RefreshIn
 from app.schemas.admin import AdminIn
-from app.crud.crud_user import create_user, authenticate_user, register_user
+from app.crud.crud_user import create_user, authenticate_user_async, register_user
 from app.api.dependencies import SessionDep, get_current_user, CurrentUser, isUser
 from sqlmodel import select
 from app.model import User
-from app.cores.security import create_access_token, verify_key
+from app.cores.security import create_access_token, decode_access_token, verify_key, user_token_claims
+from app.crud.crud_token import create_refresh_token, rotate_refresh_token, revoke_refresh_token, revoke_access_token
+from app.crud.crud_user import get_user_cached
+from fastapi.concurrency import run_in_threadpool
 import logging
 
 # Cấu hình logging
@@ -143,16 +146,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/login", response_model=Token_json)
-def login(data: UserIn, session: SessionDep):
+async def login(data: UserIn, session: SessionDep):
     try:
         logger.debug(f"Login attempt for username: {data.username}")
         
-        user = authenticate_user(session, data.username, data.password)
+        # bcrypt chạy trên password_hasher, không chiếm threadpool trong lúc chờ
+        user = await authenticate_user_async(session, data.username, data.password)
         logger.debug(f"Authentication result: {user}")
         
         if not user:
             # Trong file cũ, nếu user không tồn tại, gọi create_user
-            user = create_user(session, data)
+            user = await create_user(session, data)
             if not user:
                 logger.warning(f"Authentication failed for username: {data.username}")
                 raise HTTPException(
@@ -167,19 +171,14 @@ def login(data: UserIn, session: SessionDep):
                 detail="User account is inactive"
             )
         
-        access_token = create_access_token(
-            data={
-                "sub": user.username,
-                "isuser": user.isUser,
-                "isadmin": user.isAdmin,
-                "isactive": user.isActive
-            }
-        )
+        access_token = create_access_token(data=user_token_claims(user))
+        refresh_token = await run_in_threadpool(create_refresh_token, session, user.id)
         logger.info(f"Token generated successfully for user: {user.username}")
 
         return {
             "msg": "Login successfully",
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "data": {
                 "id": user.id,
                 "username": user.username,
@@ -203,12 +202,45 @@ def login(data: UserIn, session: SessionDep):
             detail=f"Internal server error: {str(e)}"
         )
 
+@router.post("/refresh", response_model=Token_json)
+def refresh(data: RefreshIn, session: SessionDep):
+    '''
+    Exchange a refresh token for a new access token and a new refresh token.
+    The old refresh token cannot be used again; no password and no bcrypt involved.
+    '''
+    user_id, refresh_token = rotate_refresh_token(session, data.refresh_token)
+    user = get_user_cached(session, user_id)
+    if not user or not user.isActive:
+        raise HTTPException(status_code=401, detail="User account is inactive")
+    return {
+        "msg": "Refresh token successfully",
+        "access_token": create_access_token(data=user_token_claims(user)),
+        "refresh_token": refresh_token,
+    }
+
+@router.post("/logout", response_model=Token_json)
+def logout(data: RefreshIn, session: SessionDep, request: Request):
+    '''
+    Revoke the refresh token (and its rotation chain) and, if the request carries one,
+    the access token in every worker.
+    '''
+    revoke_refresh_token(session, data.refresh_token)
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    if token:
+        try:
+            claims = decode_access_token(token)
+        except HTTPException:
+            claims = {}  # token hết hạn/không hợp lệ: không cần thu hồi
+        if claims.get("jti") and claims.get("exp"):
+            revoke_access_token(session, claims["jti"], claims["exp"])
+    return {"msg": "Logout successfully"}
+
 @router.post("/register", response_model=UserOut_json)
-def register(data: Register_In, session: SessionDep):
+async def register(data: Register_In, session: SessionDep):
     try:
         logger.debug(f"Register attempt for username: {data.username}")
         
-        existing_user = authenticate_user(session, data.username, data.password)
+        existing_user = await authenticate_user_async(session, data.username, data.password)
         if existing_user:
             logger.warning(f"Registration failed - username already exists: {data.username}")
             raise HTTPException(
@@ -216,7 +248,7 @@ def register(data: Register_In, session: SessionDep):
                 detail="Username already exists"
             )
         
-        db_user = register_user(session, data)
+        db_user = await register_user(session, data)
         if not db_user:
             logger.error(f"Registration failed for username: {data.username}")
             raise HTTPException(
@@ -248,8 +280,8 @@ def register(data: Register_In, session: SessionDep):
         )
 
 @router.post("/register_admin", response_model=UserOut_json)
-def register_admin(data: AdminIn , session: SessionDep):
-    user = authenticate_user(session, data.username, data.password)
+async def register_admin(data: AdminIn , session: SessionDep):
+    user = await authenticate_user_async(session, data.username, data.password)
     if user:
         raise HTTPException(status_code=400, detail="Username already exists")
         # return {
@@ -262,7 +294,7 @@ def register_admin(data: AdminIn , session: SessionDep):
         #     "message": "Key is incorrect",
         #     "data": None
         # }
-    db_user = register_user(session, data, isAdmin=True)
+    db_user = await register_user(session, data, isAdmin=True)
     if not db_user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
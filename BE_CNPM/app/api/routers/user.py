@@ -5,18 +5,22 @@ from math import ceil
 from app.schemas.user import  UserOut_json 
 from app.api.dependencies import SessionDep,get_current_user,CurrentUser,checkyear,checkmonth,checkday,checkhours
 from app.schemas.user import  UserOut_json,Update_password, UpdateUser
-from app.schemas.order import OrderIn, CancelIn,  responseorder, changetime,CheckIn1,CheckOut1,CheckIn2,CheckOut2,Report
+from app.schemas.order import OrderIn, CancelIn,  responseorder, responselibrary, changetime,CheckIn1,CheckOut1,CheckIn2,CheckOut2,Report, responsefreeslot, AvailabilityBatchIn, responseavailability
 from app.schemas.room import reponse
 from app.model import User, OrderRoom, CancelRoom, UsedRoom, Room, Branch, Building, RoomType
 from app.cores.security import create_access_token, verify_key
 from datetime import datetime, date, time,timedelta
 
 from app.crud.crud_user import change_user_info, change_user_pasword
-from app.crud.crud_order import create_cancel_room, create_used_room, get_order_room, create_order_room,check_room_availability,get_all_order_rooms,update_order_room, update_state_order_room
-from app.crud.crud_order import  update_used_room,check_overlapping_time_of_room_by_user, find_order_for_checkin,create_used_room, get_used_room_being_used_by_user_id, update_used_room, get_order_room,get_used_room_by_order_id
+from app.crud.crud_order import create_cancel_room, create_used_room, get_order_room, create_order_room,check_room_availability,get_all_order_rooms,update_order_room, update_state_order_room, search_available_rooms
+from app.crud.crud_order import  update_used_room,check_overlapping_time_of_room_by_user, find_order_for_checkin,create_used_room, update_used_room, get_order_room,get_used_room_by_order_id
+from app.crud.crud_order import start_active_session, get_active_session, end_active_session, find_free_slots, check_availability_batch
 
 from app.crud.crud_room import filter_rooms, check_lib_available,get_room_type
-from app.crud.crud_order import get_order_rooms_by_filter,checkin_library, checkout_library,get_cancel_room,get_order_room, get_used_room, get_cancel_room_by_user_id,get_cancel_room_by_order_id, get_used_room_being_used_by_user_id, get_used_room_by_order_id, get_used_room_by_user_id
+from app.crud.unit_of_work import unit_of_work
+from app.cores.library_occupancy import library_occupancy
+from app.cores.config import settings
+from app.crud.crud_order import get_order_rooms_by_filter,checkin_library, checkout_library,get_cancel_room,get_order_room, get_used_room, get_cancel_room_by_user_id,get_cancel_room_by_order_id, get_used_room_by_order_id, get_used_room_by_user_id
 
 
 from app.crud.crud_report_noti import create_report, get_report, get_reports, update_report, delete_report
@@ -57,8 +61,8 @@ def update_user_info(data:UpdateUser , current_user: CurrentUser, session: Sessi
 # def update_user_info(data: , current_user: CurrentUser, session: SessionDep):
 
 @router.put("/user/password", response_model=responseorder)
-def update_user_password(data: Update_password, current_user: CurrentUser, session: SessionDep):
-    db_user = change_user_pasword(session, current_user.username, data.new_password, data.old_password)
+async def update_user_password(data: Update_password, current_user: CurrentUser, session: SessionDep):
+    db_user = await change_user_pasword(session, current_user.username, data.new_password, data.old_password)
     if not db_user:
         raise HTTPException(status_code=404, detail="Cannot update password")
     return {
@@ -116,8 +120,8 @@ def filter_room(
     date_order: int = Query(...,ge=1,le=31, title="Date", description="Date of the month"),
     month_order: int = Query(...,ge=1,le=12, title="Month", description="Month of the year"),
     year_order: int = Query(...,ge=2024, title="Year", description="Year"),
-    start_time: int = Query(...,ge=7,le=20, title="Start time", description="Start time of the room"),
-    end_time: int = Query(...,ge=7,le=20, title="End time", description="End time of the room"),
+    start_time: int = Query(...,ge=settings.BOOKING_OPEN_HOUR,le=settings.BOOKING_CLOSE_HOUR - 1, title="Start time", description="Start time of the room"),
+    end_time: int = Query(...,ge=settings.BOOKING_OPEN_HOUR + 1,le=settings.BOOKING_CLOSE_HOUR, title="End time", description="End time of the room"),
     limitation: int = Query(10, ge=1, le=20, title="Limit", description="Limit of the number of rooms")
     ):
 
@@ -134,7 +138,7 @@ def filter_room(
     # Create a time object for end time
     end = time(hour=end_time)
     #Validate start and end times
-    if start > end:
+    if start >= end:
         raise HTTPException(status_code=400, detail="Start time must be before end time")
 
     # Check for past bookings
@@ -146,23 +150,83 @@ def filter_room(
         raise HTTPException(status_code=400, detail=f"{now}, {start_order} Your time is not valid")
     
 
-    rooms= filter_rooms(session, branch_id=branch_id, building_id=building_id, type_id=type_id)
-    if not rooms:
-        raise HTTPException(status_code=404, detail="No rooms found")
-    available_rooms = []
-
-    for room in rooms:
-        if check_room_availability(session, room.id, order_date, start, end):
-            available_rooms.append(room)
-            if len(available_rooms) >= limitation:
-                break
+    available_rooms, total = search_available_rooms(session,
+                                                    date=order_date,
+                                                    start_time=start,
+                                                    end_time=end,
+                                                    branch_id=branch_id,
+                                                    building_id=building_id,
+                                                    type_id=type_id,
+                                                    limit=limitation)
     if not available_rooms:
         raise HTTPException(status_code=404, detail="No available rooms found")
     return {
         "msg": "Search room successfully",
-        "data": available_rooms
+        "data": available_rooms,
+        "metadata": {
+            "page": 1,
+            "perpage": limitation,
+            "total": total,
+            "total_page": ceil(total / limitation)
+        }
     }
     
+@router.get("/findslot", response_model=responsefreeslot)
+def find_slot(
+    session: SessionDep,
+    duration: int = Query(..., ge=1, le=settings.BOOKING_CLOSE_HOUR - settings.BOOKING_OPEN_HOUR, title="Duration", description="Length of the booking in hours"),
+    building_id: int | None = Query(None, ge=0, title="Building ID", description="ID of the building"),
+    branch_id: int | None = Query(None, ge=0, title="Branch ID", description="ID of the branch"),
+    type_id: int | None = Query(None, ge=0, title="Type ID", description="ID of the type"),
+    date_from: date | None = Query(None, title="From", description="First day to search (default: today)"),
+    date_to: date | None = Query(None, title="To", description="Last day to search (default: 7 days from date_from)"),
+    limitation: int = Query(10, ge=1, le=20, title="Limit", description="Limit of the number of slots")
+    ):
+    '''
+    Earliest rooms and start hours free for `duration` hours between date_from and date_to
+    (one candidate per room and day), instead of trying hours one by one with /searchroom.
+    '''
+    date_from = date_from or date.today()
+    date_to = date_to or date_from + timedelta(days=6)
+    if (date_to - date_from).days > 31:
+        raise HTTPException(status_code=400, detail="The date range must not exceed 31 days")
+
+    slots = find_free_slots(session,
+                            duration=duration,
+                            date_from=date_from,
+                            date_to=date_to,
+                            branch_id=branch_id,
+                            building_id=building_id,
+                            type_id=type_id,
+                            limit=limitation)
+    if not slots:
+        raise HTTPException(status_code=404, detail="No free slot found")
+    return {
+        "msg": "Find slot successfully",
+        "data": slots,
+        "metadata": {
+            "page": 1,
+            "perpage": limitation,
+            "total": len(slots),
+            "total_page": 1
+        }
+    }
+
+@router.post("/availability", response_model=responseavailability)
+def check_availability(data: AvailabilityBatchIn, session: SessionDep):
+    '''
+    Free/busy status of many (room, date, start hour, end hour) cells in one request,
+    e.g. a week grid of the booking page. Returns the booked-hours mask of each
+    room-day (bit h = hour h booked) and whether each cell is free, in request order.
+    '''
+    days, free = check_availability_batch(session, [
+        (cell.room_id, cell.date, cell.start_time, cell.end_time) for cell in data.cells
+    ])
+    return {
+        "msg": "Check availability successfully",
+        "data": {"days": days, "free": free}
+    }
+
 @router.get("/searchlibrary", response_model=responseorder)
 def search_library(
     session: SessionDep,
@@ -202,7 +266,7 @@ def order_room(data: OrderIn, current_user: CurrentUser, session: SessionDep):
     time_start = datetime(data.year, data.month, data.date, data.start_time)
     time_end = datetime(data.year, data.month, data.date, data.end_time)
 
-    if time_start > time_end:
+    if time_start >= time_end:
         raise HTTPException(status_code=400, detail="Start time must be before end time")
     
     now = datetime.now()
@@ -252,7 +316,7 @@ def change_order(data: changetime, current_user: CurrentUser, session: SessionDe
     time_start = datetime(data.year, data.month, data.date, data.start_time)
     time_end = datetime(data.year, data.month, data.date, data.end_time)
     
-    if time_start > time_end:
+    if time_start >= time_end:
         raise HTTPException(status_code=400, detail="Start time must be before end time")
     
     now = datetime.now()
@@ -316,12 +380,14 @@ def cancel_room(data: CancelIn, current_user: CurrentUser, session: SessionDep):
             detail="Cannot cancel order after 2 days of the end time"
         )
     
-    cancel = create_cancel_room(session, order_id=data.order_id, user_id=user.id,date_cancel=now)
-    
-    if not cancel:
-        raise HTTPException(status_code=404, detail="Cannot cancel order")
-    if not update_state_order_room(session, order_id=data.order_id, iscancel=True):
-        raise HTTPException(status_code=404, detail="Cannot cancel order")
+    # Tạo CancelRoom và đổi trạng thái đơn trong cùng 1 transaction
+    with unit_of_work(session):
+        cancel = create_cancel_room(session, order_id=data.order_id, user_id=user.id,date_cancel=now)
+        
+        if not cancel:
+            raise HTTPException(status_code=404, detail="Cannot cancel order")
+        if not update_state_order_room(session, order_id=data.order_id, iscancel=True):
+            raise HTTPException(status_code=404, detail="Cannot cancel order")
     return{
         "msg": "Cancel room successfully",
         "data": cancel
@@ -331,38 +397,29 @@ def cancel_room(data: CancelIn, current_user: CurrentUser, session: SessionDep):
 @router.post("/checkin1", response_model=responseorder)
 def check_in1(session: SessionDep, current_user: CurrentUser, data: CheckIn1):
     user= current_user
-    order= find_order_for_checkin(session, data.room_id, user.id)
+    order= find_order_for_checkin(session, user_id=user.id, room_id=data.room_id)
     if not order:
         raise HTTPException(status_code=404, detail="You check in too early| you have not ordered this room| You have checked in this room")
     
-
-
-    used_room= create_used_room(session, order_id=order.id,
-                                user_id=user.id,
-                                room_id=data.room_id,
-                                date_checkin=datetime.now().date(),
-                                time_checkin=int(datetime.now().time()))
-    
-    if not used_room:
-        raise HTTPException(status_code=404, detail="Cannot check in")
-    
-    if not update_state_order_room(session, order_id=order.id, isused=True):
-        raise HTTPException(status_code=404, detail="Cannot check in")
+    with unit_of_work(session):
+        active = start_active_session(session, user_id=user.id, room_id=data.room_id, order_id=order.id)
+        if not update_state_order_room(session, order_id=order.id, isused=True):
+            raise HTTPException(status_code=404, detail="Cannot check in")
     
     return{
         "msg": "Check in successfully",
-        "data": used_room
+        "data": active
     }
 
 @router.post("/checkout1", response_model=responseorder)
 def check_out1(session: SessionDep, current_user: CurrentUser, data: CheckOut1):
     user= current_user
-    used_order= get_used_room_being_used_by_user_id(session, user.id)
+    active = get_active_session(session, user.id)
 
-    if used_order.room_id != data.room_id:
+    if active.room_id != data.room_id:
         raise HTTPException(status_code=404, detail="You check out wrong room")
     
-    used_order= update_used_room(session, used_order.id, user.id, datetime.now().time())
+    used_order= end_active_session(session, user.id)
    
     return {
         "msg": "Check out successfully",
@@ -385,18 +442,13 @@ def check_in2( current_user: CurrentUser,
     if order.is_cancel:
         raise HTTPException(status_code=404, detail="You have already canceled this order")
     
-    used_order= create_used_room(session, 
-                                 order_id=data.order_id,
-                                   user_id=user.id,
-                                    room_id= order.room_id,
-                                    date= datetime.now().date(),
-                                    checkin=datetime.now().time())
- 
-    update_state_order_room(session=session,order_id=order.id, isused=True, iscancel=False)
-    if not used_order:
-        raise HTTPException(status_code=404, detail="Cannot check in")
-    if not update_state_order_room(session, order_id=data.order_id, isused=True, iscancel=False):
-        raise HTTPException(status_code=404, detail="Cannot check in")
+    with unit_of_work(session):
+        used_order= start_active_session(session, 
+                                         user_id=user.id,
+                                         room_id=order.room_id,
+                                         order_id=data.order_id)
+        if not update_state_order_room(session, order_id=data.order_id, isused=True, iscancel=False):
+            raise HTTPException(status_code=404, detail="Cannot check in")
     
     return {
         "msg": "Check in successfully",
@@ -424,81 +476,62 @@ def check_in2( current_user: CurrentUser,
 @router.post("/checkout2", response_model=responseorder)
 def check_out2(current_user: CurrentUser, session: SessionDep):
     user = current_user
-    used_order = get_used_room_being_used_by_user_id(session, user.id)
 
-    if used_order is None:
-        raise HTTPException(status_code=404, detail="You have not checked in any room")
+    # Chuyển ActiveSession sang UsedRoom và cập nhật OrderRoom cùng commit một lần
+    with unit_of_work(session):
+        used_room = end_active_session(session, user.id)
 
-    # Cập nhật thời gian checkout cho UsedRoom
-    try:
-        used_room = update_used_room(
-            session,
-            used_room_id=used_order.id,
-            user_id=user.id,
-            checkout=datetime.now().time(),
-            checkout_date=datetime.now().date()
-        )
-        if not used_room:
-            raise HTTPException(status_code=404, detail="Cannot check out")
-    except Exception as e:
-        print(f"Error in update_used_room: {str(e)}")  # Log lỗi
-        raise HTTPException(status_code=500, detail=f"Failed to update used room: {str(e)}")
-
-    # Cập nhật iscancel = true cho OrderRoom nếu có order_id
-    if used_room.order_id:
-        try:
+        # Cập nhật iscancel = true cho OrderRoom nếu có order_id
+        if used_room.order_id:
             order = get_order_room(session, used_room.order_id)
             if not order:
                 raise HTTPException(status_code=404, detail="Cannot find associated order")
             if not update_state_order_room(session, order_id=used_room.order_id, isused=order.is_used, iscancel=True):
                 raise HTTPException(status_code=404, detail="Cannot update order status")
-        except Exception as e:
-            print(f"Error updating OrderRoom: {str(e)}")  # Log lỗi
-            raise HTTPException(status_code=500, detail=f"Failed to update order status: {str(e)}")
 
     return {
         "msg": "Check out successfully",
         "data": used_room
     }
 
-@router.post("/checkinlibrary", response_model=responseorder)
+@router.post("/checkinlibrary", response_model=responselibrary)
 def checkinlibrary(session: SessionDep,current_user:CurrentUser, data: CheckIn1):    
     user= current_user
-    if  not checkin_library(session, data.room_id):
-        raise HTTPException(status_code=404, detail="Cannot check in library")
-    
-    used_room= create_used_room(session, 
-                                room_id=data.room_id,
-                                order_id=None,
-                                user_id=user.id,
-                                date=datetime.now().date(),
-                                checkin=datetime.now().time())
-    if not used_room:
-        raise HTTPException(status_code=404, detail="Cannot check in")
+    if library_occupancy.enabled:
+        # Ghi vào bộ nhớ + journal, UsedRoom được ghi xuống DB theo lô
+        quantity = library_occupancy.check_in(session, user.id, data.room_id)
+        return {
+            "msg": "Check in library successfully",
+            "data": {"room_id": data.room_id, "quantity": quantity}
+        }
+    with unit_of_work(session):
+        quantity = checkin_library(session, data.room_id)
+        start_active_session(session, user_id=user.id, room_id=data.room_id)
     return {
         "msg": "Check in library successfully",
-        "data": None
+        "data": {"room_id": data.room_id, "quantity": quantity}
     }
 
-@router.post("/checkoutlibrary", response_model=responseorder)
+@router.post("/checkoutlibrary", response_model=responselibrary)
 def checkoutlibrary(session: SessionDep,current_user: CurrentUser, data: CheckOut1):
     user= current_user
-    used_order= get_used_room_being_used_by_user_id(session, user.id)
+    if library_occupancy.enabled:
+        quantity = library_occupancy.check_out(user.id, data.room_id)
+        return {
+            "msg": "Check out library successfully",
+            "data": {"room_id": data.room_id, "quantity": quantity}
+        }
+    active = get_active_session(session, user.id)
 
-    if used_order.room_id != data.room_id:
+    if active.room_id != data.room_id:
         raise HTTPException(status_code=404, detail="You check out wrong room")
     
-    if not checkout_library(session, data.room_id):
-        raise HTTPException(status_code=404, detail="Cannot check out library")
-    
-    used_order= update_used_room(session, 
-                                 used_room_id=used_order.id, 
-                                 order_id=None,
-                                    user_id=user.id,
-                                     checkout=datetime.now().time())
+    with unit_of_work(session):
+        quantity = checkout_library(session, data.room_id)
+        end_active_session(session, user.id)
     return {
         "msg": "Check out library successfully",
-        "data": None
+        "data": {"room_id": data.room_id, "quantity": quantity}
     }
     
 # ----- get some thing
@@ -625,12 +658,13 @@ def get_used(session: SessionDep, order_id: int):
 @router.post("/report", response_model=responseorder)
 def report(session: SessionDep, current_user: CurrentUser, data: Report):
     user = current_user
-    used_order= get_used_room_being_used_by_user_id(session, user.id)
+    # Đang ở phòng: báo cáo được gắn vào UsedRoom khi check-out
+    active = get_active_session(session, user.id)
 
     report= create_report(session, 
-                          used_room_id=used_order.id, 
+                          used_room_id=None, 
                           user_id=user.id, 
-                          room_id=used_order.room_id,
+                          room_id=active.room_id,
                           led=data.led,
                           air_conditioner=data.air_conditioner,
                           socket=data.socket,
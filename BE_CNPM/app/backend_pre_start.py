@@ -0,0 +1,75 @@
+'''
+Chuẩn bị database trước khi chạy các worker, chạy từ thư mục BE_CNPM:
+
+    python -m app.backend_pre_start
+    uvicorn app.main:app --workers N
+
+Chờ database sẵn sàng rồi chạy alembic upgrade head. Database cũ được tạo bằng
+SQLModel.metadata.create_all (chưa có bảng alembic_version) được đánh dấu ở
+revision 0001 trước khi nâng cấp.
+'''
+import logging
+import time
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlmodel import Session
+
+from app.cores.db import engine
+from app.model import RoomDaySlots, SlotClaim
+from app.crud.crud_order import rebuild_room_day_slots
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_TRIES = 60
+WAIT_SECONDS = 1
+BASELINE_REVISION = "0001"
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def wait_for_db() -> None:
+    for attempt in range(1, MAX_TRIES + 1):
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return
+        except Exception as e:
+            logger.warning(f"Database not ready ({attempt}/{MAX_TRIES}): {e}")
+            time.sleep(WAIT_SECONDS)
+    raise RuntimeError("Database is not reachable")
+
+
+def migrate() -> bool:
+    """Upgrade the schema to head. Returns True if the slot tables had to be created."""
+    config = Config(str(ALEMBIC_INI))
+    created_slots = False
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = set(inspect(connection).get_table_names())
+        if "alembic_version" not in tables and "user" in tables:
+            # Database tạo bằng create_all: bổ sung các bảng baseline có thể còn thiếu rồi đánh dấu
+            logger.info(f"Existing schema without migrations, stamping {BASELINE_REVISION}")
+            created_slots = "slotclaim" not in tables
+            for table in (RoomDaySlots.__table__, SlotClaim.__table__):
+                table.create(connection, checkfirst=True)
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
+    return created_slots
+
+
+def main() -> None:
+    logger.info("Waiting for database")
+    wait_for_db()
+    logger.info("Running migrations")
+    if migrate():
+        # Bảng slot mới tạo còn rỗng, điền lại từ OrderRoom
+        with Session(engine) as session:
+            logger.info(f"Rebuilt {rebuild_room_day_slots(session)} RoomDaySlots rows")
+    logger.info("Database is ready")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+'''
+Thống kê mức sử dụng phòng trên lịch sử OrderRoom / UsedRoom, tính bằng numpy.
+
+OrderRoom và UsedRoom được đọc theo từng khối ANALYTICS_CHUNK_SIZE dòng (yield_per: server-side
+cursor trên MySQL), mỗi khối chuyển thành các mảng cột rồi cộng dồn theo phòng bằng
+np.bincount. Bộ nhớ chỉ phụ thuộc kích thước khối và số phòng, không phụ thuộc số dòng.
+
+Chỉ số theo phòng:
+    booked_hours   : tổng giờ của các đơn không bị hủy trước khi dùng
+    used_hours     : tổng giờ check-in -> check-out (UsedRoom, kể cả thư viện)
+    utilization    : used_hours / booked_hours
+    no_show_rate   : đơn của các ngày đã qua không hủy, không check-in / số đơn đó
+    mean_checkin_delay_minutes : giờ check-in - giờ bắt đầu đơn (âm = đến sớm)
+
+Heatmap thứ x giờ của 1 tòa nhà: mỗi khoảng [bắt đầu, kết thúc) cộng +1/-1 vào mảng hiệu
+theo phút của thứ trong tuần (np.bincount), cumsum ra số phòng đang dùng từng phút rồi gộp theo giờ.
+Kết quả cache theo (building_id, date_from, date_to); khi flush có OrderRoom/UsedRoom thay đổi,
+sau commit chỉ xóa các mục cùng tòa nhà có khoảng ngày chứa ngày bị đổi. Với HEATMAP_CACHE_SHARED,
+các (phòng, ngày) đó còn được ghi vào bảng HeatmapChange cùng transaction để các worker khác
+xóa cache của mình sau tối đa 1 chu kỳ CHANGE_LOG_SYNC_SECONDS (sync_heatmap_changes).
+'''
+import threading
+from datetime import date, time, timedelta
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.cores.cache import TTLCache
+from app.cores.change_log import ChangeLogReader, log_entry
+from app.cores.config import settings
+from app.model import Branch, Building, HeatmapChange, OrderRoom, Room, RoomType, UsedRoom
+
+try:
+    import numpy as np
+except ImportError:  # numpy là phụ thuộc tùy chọn
+    np = None
+
+ENABLED = np is not None
+_CHECKOUT_SENTINEL = time(23, 59, 59)  # UsedRoom cũ chưa check-out (trước ActiveSession)
+
+
+def _ordinals(values: Iterable[date], count: int) -> "np.ndarray":
+    return np.fromiter((value.toordinal() for value in values), dtype=np.int64, count=count)
+
+def _minutes(values: Iterable[time], count: int) -> "np.ndarray":
+    return np.fromiter(
+        (value.hour * 60 + value.minute + value.second / 60 for value in values),
+        dtype=np.float64, count=count,
+    )
+
+
+class _RoomTotals:
+    # Các cột cộng dồn theo chỉ số phòng (vị trí trong room_ids đã sắp xếp)
+    FIELDS = ("bookings", "booked_hours", "past_bookings", "no_shows", "used_sessions",
+              "used_hours", "delayed_checkins", "delay_minutes")
+
+    def __init__(self, room_ids: "np.ndarray"):
+        self.room_ids = room_ids
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(len(room_ids), dtype=np.float64))
+
+    def index(self, room_ids: "np.ndarray") -> "np.ndarray":
+        return np.searchsorted(self.room_ids, room_ids)
+
+    def add(self, field: str, index: "np.ndarray", weights: "np.ndarray") -> None:
+        total = getattr(self, field)
+        total += np.bincount(index, weights=weights, minlength=len(total))
+
+
+def compute_utilization(
+    session: Session,
+    date_from: date,
+    date_to: date,
+    branch_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    type_id: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> dict:
+    """
+    Per-room utilization over [date_from, date_to], streaming OrderRoom and UsedRoom in chunks.
+
+    Args:
+        session (Session): The database session.
+        date_from (date): First day (included).
+        date_to (date): Last day (included).
+        branch_id (Optional[int]): Only rooms of this branch.
+        building_id (Optional[int]): Only rooms of this building.
+        type_id (Optional[int]): Only rooms of this type.
+        chunk_size (Optional[int]): Rows per chunk (default: ANALYTICS_CHUNK_SIZE).
+
+    Returns:
+        dict: {"rooms": [per-room metrics], "total": metrics over all the rooms,
+        "orders": rows read, "used_rooms": rows read}.
+    """
+    chunk_size = chunk_size or settings.ANALYTICS_CHUNK_SIZE
+    room_filters = []
+    if branch_id is not None:
+        room_filters.append(Room.branch_id == branch_id)
+    if building_id is not None:
+        room_filters.append(Room.building_id == building_id)
+    if type_id is not None:
+        room_filters.append(Room.type_id == type_id)
+
+    rooms = session.exec(
+        select(Room.id, Room.no_room, Room.branch_id, Room.building_id, RoomType.type_name)
+        .join(RoomType, RoomType.id == Room.type_id)
+        .where(*room_filters)
+        .order_by(Room.id)
+    ).all()
+    totals = _RoomTotals(np.asarray([room[0] for room in rooms], dtype=np.int64))
+    today = date.today().toordinal()
+
+    # Chạy bằng Core trên connection của session: không dựng lại từng dòng qua ORM
+    connection = session.connection()
+
+    # --- OrderRoom ---
+    orders = connection.execute(
+        select(OrderRoom.room_id, OrderRoom.date, OrderRoom.begin, OrderRoom.end, OrderRoom.is_used, OrderRoom.is_cancel)
+        .join(Room, Room.id == OrderRoom.room_id)
+        .where(OrderRoom.date >= date_from, OrderRoom.date <= date_to, *room_filters)
+        .execution_options(yield_per=chunk_size)
+    )
+    order_rows = 0
+    for chunk in orders.partitions():
+        count = len(chunk)
+        order_rows += count
+        room_ids, days, begins, ends, used, cancelled = zip(*chunk)
+        index = totals.index(np.fromiter(room_ids, dtype=np.int64, count=count))
+        used = np.fromiter(used, dtype=bool, count=count)
+        # Đơn được trả phòng lúc check-out cũng có is_cancel: chỉ tính hủy khi chưa dùng
+        booked = ~(np.fromiter(cancelled, dtype=bool, count=count) & ~used)
+        hours = np.clip(_minutes(ends, count) - _minutes(begins, count), 0, None) / 60
+        past = booked & (_ordinals(days, count) < today)
+        totals.add("bookings", index, booked)
+        totals.add("booked_hours", index, hours * booked)
+        totals.add("past_bookings", index, past)
+        totals.add("no_shows", index, past & ~used)
+
+    # --- UsedRoom (+ giờ bắt đầu của đơn để tính độ trễ check-in) ---
+    used_rooms = connection.execute(
+        select(UsedRoom.room_id, UsedRoom.date, UsedRoom.checkin, UsedRoom.checkout, UsedRoom.checkout_date,
+               OrderRoom.date, OrderRoom.begin)
+        .join(Room, Room.id == UsedRoom.room_id)
+        .outerjoin(OrderRoom, OrderRoom.id == UsedRoom.order_id)
+        .where(UsedRoom.date >= date_from, UsedRoom.date <= date_to, *room_filters)
+        .where(or_(UsedRoom.checkout_date.is_not(None), UsedRoom.checkout != _CHECKOUT_SENTINEL))
+        .execution_options(yield_per=chunk_size)
+    )
+    used_rows = 0
+    for chunk in used_rooms.partitions():
+        count = len(chunk)
+        used_rows += count
+        room_ids, days, checkins, checkouts, checkout_days, order_days, begins = zip(*chunk)
+        index = totals.index(np.fromiter(room_ids, dtype=np.int64, count=count))
+        days = _ordinals(days, count)
+        start = days * 1440 + _minutes(checkins, count)
+        end_days = np.where(
+            np.fromiter((day is None for day in checkout_days), dtype=bool, count=count),
+            days,
+            _ordinals((day or date.min for day in checkout_days), count),
+        )
+        minutes = np.clip(end_days * 1440 + _minutes(checkouts, count) - start, 0, None)
+        totals.add("used_sessions", index, np.ones(count))
+        totals.add("used_hours", index, minutes / 60)
+
+        with_order = np.fromiter((begin is not None for begin in begins), dtype=bool, count=count)
+        if with_order.any():
+            order_start = (
+                _ordinals((day or date.min for day in order_days), count) * 1440
+                + _minutes((begin or time() for begin in begins), count)
+            )
+            totals.add("delayed_checkins", index, with_order)
+            totals.add("delay_minutes", index, np.where(with_order, start - order_start, 0))
+
+    return {
+        "rooms": [
+            {"room_id": room_id, "no_room": no_room, "branch_id": branch, "building_id": building,
+             "type_name": type_name, **_metrics(totals, i)}
+            for i, (room_id, no_room, branch, building, type_name) in enumerate(rooms)
+        ],
+        "total": _metrics(totals, slice(None)),
+        "orders": order_rows,
+        "used_rooms": used_rows,
+    }
+
+
+def _metrics(totals: _RoomTotals, at) -> dict:
+    # at: chỉ số 1 phòng, hoặc slice(None) để cộng tất cả các phòng
+    value = {field: float(np.sum(getattr(totals, field)[at])) for field in _RoomTotals.FIELDS}
+    return {
+        "bookings": int(value["bookings"]),
+        "booked_hours": round(value["booked_hours"], 2),
+        "used_sessions": int(value["used_sessions"]),
+        "used_hours": round(value["used_hours"], 2),
+        "utilization": round(value["used_hours"] / value["booked_hours"], 4) if value["booked_hours"] else None,
+        "no_shows": int(value["no_shows"]),
+        "no_show_rate": round(value["no_shows"] / value["past_bookings"], 4) if value["past_bookings"] else None,
+        "mean_checkin_delay_minutes": (
+            round(value["delay_minutes"] / value["delayed_checkins"], 2) if value["delayed_checkins"] else None
+        ),
+    }
+
+
+# --- Heatmap thứ x giờ ---
+_MINUTES = 24 * 60
+_SWEEP = _MINUTES + 1  # thêm 1 ô cho khoảng kết thúc lúc 24:00
+_HEATMAP_KEY = "heatmap_changes"
+_ALL = "all"
+
+
+class _WeekSweep:
+    # Mảng hiệu theo (thứ, phút), cộng dồn qua các khối
+    def __init__(self):
+        self.diff = np.zeros(7 * _SWEEP, dtype=np.int64)
+
+    def add(self, ordinals: "np.ndarray", begin: "np.ndarray", end: "np.ndarray") -> None:
+        keep = end > begin
+        base = ((ordinals[keep] - 1) % 7) * _SWEEP  # date(1, 1, 1) là thứ Hai
+        self.diff += np.bincount(base + begin[keep], minlength=self.diff.size)
+        self.diff -= np.bincount(base + end[keep], minlength=self.diff.size)
+
+    def hours(self, days: "np.ndarray") -> list:
+        busy = np.cumsum(self.diff.reshape(7, _SWEEP), axis=1)[:, :_MINUTES]
+        hours = busy.reshape(7, 24, 60).sum(axis=2) / 60 / np.maximum(days, 1)[:, None]
+        return np.round(hours, 3).tolist()
+
+
+def _rounded_minutes(values: Iterable[time], count: int) -> "np.ndarray":
+    return np.rint(_minutes(values, count)).astype(np.int64)
+
+def compute_heatmap(
+    session: Session,
+    building_id: int,
+    date_from: date,
+    date_to: date,
+    chunk_size: Optional[int] = None
+) -> dict:
+    """
+    Weekday x hour occupancy of a building over [date_from, date_to], with a vectorized sweep
+    over OrderRoom and UsedRoom read in chunks.
+
+    Args:
+        session (Session): The database session.
+        building_id (int): The building.
+        date_from (date): First day (included).
+        date_to (date): Last day (included).
+        chunk_size (Optional[int]): Rows per chunk (default: ANALYTICS_CHUNK_SIZE).
+
+    Returns:
+        dict: {"building_id", "date_from", "date_to", "rooms": room count,
+        "days": number of Mondays..Sundays in the range,
+        "booked": 7x24 average booked rooms (Monday first),
+        "used": 7x24 average checked-in sessions (library: people)}.
+    """
+    chunk_size = chunk_size or settings.ANALYTICS_CHUNK_SIZE
+    first, last = date_from.toordinal(), date_to.toordinal()
+    days = np.bincount((np.arange(first, last + 1) - 1) % 7, minlength=7)
+    rooms = session.exec(select(Room.id).where(Room.building_id == building_id)).all()
+    connection = session.connection()
+
+    booked = _WeekSweep()
+    orders = connection.execute(
+        select(OrderRoom.date, OrderRoom.begin, OrderRoom.end, OrderRoom.is_used, OrderRoom.is_cancel)
+        .join(Room, Room.id == OrderRoom.room_id)
+        .where(Room.building_id == building_id, OrderRoom.date >= date_from, OrderRoom.date <= date_to)
+        .execution_options(yield_per=chunk_size)
+    )
+    for chunk in orders.partitions():
+        count = len(chunk)
+        days_, begins, ends, used, cancelled = zip(*chunk)
+        keep = ~(np.fromiter(cancelled, dtype=bool, count=count) & ~np.fromiter(used, dtype=bool, count=count))
+        booked.add(_ordinals(days_, count)[keep], _rounded_minutes(begins, count)[keep],
+                   _rounded_minutes(ends, count)[keep])
+
+    # Lượt dùng qua nửa đêm: phần sau tính vào ngày check-out (bỏ qua các ngày trọn vẹn ở giữa)
+    used = _WeekSweep()
+    used_rooms = connection.execute(
+        select(UsedRoom.date, UsedRoom.checkin, UsedRoom.checkout, UsedRoom.checkout_date)
+        .join(Room, Room.id == UsedRoom.room_id)
+        .where(Room.building_id == building_id,
+               UsedRoom.date >= date_from - timedelta(days=1), UsedRoom.date <= date_to)
+        .where(or_(UsedRoom.checkout_date.is_not(None), UsedRoom.checkout != _CHECKOUT_SENTINEL))
+        .execution_options(yield_per=chunk_size)
+    )
+    for chunk in used_rooms.partitions():
+        count = len(chunk)
+        days_, checkins, checkouts, checkout_days = zip(*chunk)
+        start_days = _ordinals(days_, count)
+        end_days = np.maximum(start_days, _ordinals((day or date.min for day in checkout_days), count))
+        start, end = _rounded_minutes(checkins, count), _rounded_minutes(checkouts, count)
+        same_day = end_days == start_days
+        first_part = (start_days >= first) & (start_days <= last)
+        used.add(start_days[first_part], start[first_part], np.where(same_day, end, _MINUTES)[first_part])
+        second_part = ~same_day & (end_days >= first) & (end_days <= last)
+        used.add(end_days[second_part], np.zeros(int(second_part.sum()), dtype=np.int64), end[second_part])
+
+    return {
+        "building_id": building_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "rooms": len(rooms),
+        "days": days.tolist(),
+        "booked": booked.hours(days),
+        "used": used.hours(days),
+    }
+
+
+class HeatmapCache:
+    '''
+    Heatmap đã tính, khóa (building_id, date_from, date_to), kèm tập phòng của tòa nhà lúc tính.
+    generation tăng mỗi lần xóa: kết quả tính song song với 1 lần ghi sẽ không được lưu.
+    '''
+    def __init__(self, ttl: float, maxsize: int, shared: bool):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self.shared = shared
+        self.log = ChangeLogReader(HeatmapChange)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, session: Session, building_id: int, date_from: date, date_to: date) -> dict:
+        """Cached heatmap of a building, computed with compute_heatmap on a miss."""
+        key = (building_id, date_from, date_to)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        generation = self.generation
+        result = compute_heatmap(session, building_id, date_from, date_to)
+        rooms = frozenset(session.exec(select(Room.id).where(Room.building_id == building_id)).all())
+        if generation == self.generation:
+            self._cache.set(key, (rooms, result))
+        return result
+
+    def invalidate(self, changes: set) -> None:
+        """Drop the entries whose building and date range contain a changed (room_id, day)."""
+        with self._lock:
+            self.generation += 1
+        if _ALL in changes:
+            self.invalidations += len(self._cache)
+            self._cache.clear()
+            return
+        for key in self._cache.keys():
+            cached = self._cache.get(key)
+            if cached is None:
+                continue
+            _, date_from, date_to = key
+            if any(room_id in cached[0] and date_from <= day <= date_to for room_id, day in changes):
+                self._cache.pop(key)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            **self.log.stats(),
+        }
+
+
+heatmap_cache = HeatmapCache(ttl=settings.HEATMAP_CACHE_TTL_SECONDS, maxsize=settings.HEATMAP_CACHE_SIZE,
+                             shared=settings.HEATMAP_CACHE_SHARED)
+
+
+def sync_heatmap_changes(session: Session) -> int:
+    """
+    Drop the cached heatmaps touched by the changes other workers committed since the last sync.
+
+    Returns:
+        int: The number of change log entries applied.
+    """
+    payloads = heatmap_cache.log.read(session)
+    changes = set()
+    for payload in payloads:
+        if payload == _ALL:
+            changes.add(_ALL)
+        else:
+            changes.update((room_id, date.fromisoformat(day)) for room_id, day in payload)
+    if changes:
+        heatmap_cache.invalidate(changes)
+    return len(payloads)
+
+def _record_changes(session: OrmSession, changes: set) -> None:
+    # Xóa cache của worker này sau commit; các worker khác đọc dòng HeatmapChange (cùng transaction,
+    # cùng SAVEPOINT: rollback thì mất theo)
+    session.info.setdefault(_HEATMAP_KEY, set()).update(changes)
+    if heatmap_cache.shared:
+        payload = _ALL if _ALL in changes else [[room_id, day.isoformat()] for room_id, day in changes]
+        session.add(log_entry(HeatmapChange, payload))
+
+def queue_heatmap_change(session: OrmSession, room_id: int, *days: Optional[date]) -> None:
+    """Remember OrderRoom/UsedRoom rows written without the ORM; cached heatmaps are dropped after commit."""
+    changes = {(room_id, day) for day in days if day is not None}
+    if changes:
+        _record_changes(session, changes)
+
+def _history(obj, name: str) -> list:
+    # Giá trị hiện tại và giá trị cũ (trước khi sửa) của 1 thuộc tính
+    history = inspect(obj).attrs[name].history
+    return [value for value in chain(history.added, history.unchanged, history.deleted) if value is not None]
+
+@event.listens_for(OrmSession, "before_flush")
+def _collect_heatmap_changes(session, flush_context, instances) -> None:
+    # Ghi nhận cả khi cache đang rỗng: 1 heatmap đang tính song song sẽ không được lưu (generation)
+    changes = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (OrderRoom, UsedRoom)):
+            days = _history(obj, "date") + (_history(obj, "checkout_date") if isinstance(obj, UsedRoom) else [])
+            changes.update((room_id, day) for room_id in _history(obj, "room_id") for day in days)
+        elif isinstance(obj, Room) and (obj in session.new or obj in session.deleted
+                                        or inspect(obj).attrs.building_id.history.has_changes()):
+            changes.add(_ALL)  # phòng mới, bị xóa hoặc chuyển tòa nhà
+        elif isinstance(obj, (Branch, Building)) and obj in session.deleted:
+            changes.add(_ALL)
+    if changes:
+        _record_changes(session, changes)
+
+# after_commit/after_rollback cũng chạy cho SAVEPOINT, chỉ xử lý transaction ngoài cùng
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_heatmaps(session) -> None:
+    if session.in_nested_transaction():
+        return
+    changes = session.info.pop(_HEATMAP_KEY, None)
+    if changes:
+        heatmap_cache.invalidate(changes)
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_heatmap_changes(session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_HEATMAP_KEY, None)
@@ -0,0 +1,294 @@
+'''
+Ma trận phòng trống trong bộ nhớ: rooms x (days x 24 giờ) cho một cửa sổ ngày trượt.
+
+Ma trận được nạp từ OrderRoom và được vá sau mỗi lần commit có thay đổi RoomDaySlots,
+nên trả lời giống hệt bitmap RoomDaySlots mà check_room_availability dùng.
+Trạng thái nằm trong tiến trình, vì vậy chỉ bật khi chạy 1 worker.
+'''
+import logging
+import random
+import threading
+from datetime import date, time, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.cores.config import AVAILABILITY_MATRIX_ENABLED, AVAILABILITY_MATRIX_DAYS
+from app.model import OrderRoom, Room, RoomDaySlots
+
+try:
+    import numpy as np
+except ImportError:  # numpy là phụ thuộc tùy chọn
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_DAY = 24
+_PATCHES_KEY = "availability_patches"
+_ROOMS_CHANGED_KEY = "availability_rooms_changed"
+
+
+class AvailabilityMatrix:
+    def __init__(self, days: int = 14, enabled: bool = True):
+        self.days = days
+        self.enabled = enabled and np is not None
+        self.start: Optional[date] = None
+        self.loaded = False
+        self._lock = threading.Lock()
+        if np is not None:
+            self._hour_bits = np.left_shift(1, np.arange(HOURS_PER_DAY, dtype=np.int64))
+            self._reset()
+
+    def _reset(self) -> None:
+        self.room_ids = np.empty(0, dtype=np.int64)
+        self.room_index = {}
+        self.branch_ids = np.empty(0, dtype=np.int64)
+        self.building_ids = np.empty(0, dtype=np.int64)
+        self.type_ids = np.empty(0, dtype=np.int64)
+        self.active = np.empty(0, dtype=bool)
+        self.booked = np.zeros((0, self.days, HOURS_PER_DAY), dtype=bool)
+
+    def load(self, engine: Engine, start: Optional[date] = None) -> None:
+        """
+        (Re)load the matrix for the window [start, start + days) from Room and OrderRoom.
+        The rows are read in a new session opened while holding the lock: every commit
+        before it is in the snapshot, every later one patches the new matrix after it.
+
+        Args:
+            engine (Engine): The database engine.
+            start (Optional[date]): First day of the window (default: today).
+        """
+        if not self.enabled:
+            return
+        start = start or date.today()
+        end = start + timedelta(days=self.days)
+        # Giữ lock trong lúc nạp để các bản vá đến sau được áp lên ma trận mới; session riêng
+        # để snapshot bắt đầu sau khi đã giữ lock (session của request có thể đã mở transaction từ trước)
+        with self._lock, Session(engine) as session:
+            rooms = session.exec(
+                select(Room.id, Room.branch_id, Room.building_id, Room.type_id, Room.active).order_by(Room.id)
+            ).all()
+            columns = list(zip(*rooms)) if rooms else [(), (), (), (), ()]
+            room_ids = np.asarray(columns[0], dtype=np.int64)
+            room_index = {int(room_id): i for i, room_id in enumerate(room_ids)}
+
+            orders = session.exec(
+                select(OrderRoom.room_id, OrderRoom.date, OrderRoom.begin, OrderRoom.end)
+                .where(OrderRoom.is_cancel == False)
+                .where(OrderRoom.date >= start, OrderRoom.date < end)
+            ).all()
+
+            # Quét hiệu (difference array) theo giờ thay vì lặp từng giờ của từng đơn
+            diff = np.zeros((len(room_ids), self.days, HOURS_PER_DAY + 1), dtype=np.int32)
+            if orders:
+                rows = np.fromiter((room_index.get(o.room_id, -1) for o in orders), dtype=np.int64, count=len(orders))
+                days = np.fromiter(((o.date - start).days for o in orders), dtype=np.int64, count=len(orders))
+                begins = np.fromiter((o.begin.hour for o in orders), dtype=np.int64, count=len(orders))
+                ends = np.fromiter(
+                    (o.end.hour + (1 if (o.end.minute or o.end.second or o.end.microsecond) else 0) for o in orders),
+                    dtype=np.int64, count=len(orders)
+                )
+                keep = (rows >= 0) & (ends > begins)
+                rows, days, begins, ends = rows[keep], days[keep], begins[keep], np.minimum(ends[keep], HOURS_PER_DAY)
+                np.add.at(diff, (rows, days, begins), 1)
+                np.add.at(diff, (rows, days, ends), -1)
+
+            self.room_ids = room_ids
+            self.room_index = room_index
+            self.branch_ids = np.asarray(columns[1], dtype=np.int64)
+            self.building_ids = np.asarray(columns[2], dtype=np.int64)
+            self.type_ids = np.asarray(columns[3], dtype=np.int64)
+            self.active = np.asarray(columns[4], dtype=bool)
+            self.booked = np.cumsum(diff[:, :, :HOURS_PER_DAY], axis=2) > 0
+            self.start = start
+            self.loaded = True
+        logger.info(f"Availability matrix loaded: {len(room_ids)} rooms x {self.days} days from {start}")
+
+    def invalidate(self) -> None:
+        """Drop the matrix so queries fall back to the database until the next load."""
+        with self._lock:
+            self.loaded = False
+
+    def is_stale(self) -> bool:
+        return self.enabled and (not self.loaded or self.start != date.today())
+
+    def _day_index(self, day: date) -> Optional[int]:
+        if not self.loaded:
+            return None
+        offset = (day - self.start).days
+        if 0 <= offset < self.days:
+            return offset
+        return None
+
+    def _mask_to_hours(self, mask: int):
+        return (np.right_shift(mask, np.arange(HOURS_PER_DAY, dtype=np.int64)) & 1).astype(bool)
+
+    def patch(self, room_id: int, day: date, mask: int, booked: bool) -> None:
+        """
+        Set (booked=True) or clear (booked=False) the hours of mask for a room-day.
+        Room-days outside the window are ignored; unknown rooms invalidate the matrix.
+        """
+        with self._lock:
+            offset = self._day_index(day)
+            if offset is None:
+                return
+            row = self.room_index.get(room_id)
+            if row is None:
+                self.loaded = False
+                return
+            hours = self._mask_to_hours(mask)
+            if booked:
+                self.booked[row, offset] |= hours
+            else:
+                self.booked[row, offset] &= ~hours
+
+    def room_mask(self, room_id: int, day: date) -> Optional[int]:
+        """Return the booked-hours mask of a room-day, or None if it is outside the matrix."""
+        with self._lock:
+            offset = self._day_index(day)
+            row = self.room_index.get(room_id)
+            if offset is None or row is None:
+                return None
+            return int(self._hour_bits[self.booked[row, offset]].sum())
+
+    def search(
+        self,
+        day: date,
+        mask: int,
+        branch_id: Optional[int] = None,
+        building_id: Optional[int] = None,
+        type_id: Optional[int] = None,
+        limit: int = 0
+    ) -> Optional[Tuple[List[int], int, int]]:
+        """
+        Find the active rooms free for every hour of mask on day.
+        Filters behave like filter_rooms (falsy values are ignored).
+
+        Returns:
+            Optional[Tuple[List[int], int, int]]: (free room ids ordered by ID and cut at limit,
+            number of rooms matching the filters, number of free rooms),
+            or None when the matrix cannot answer (disabled, not loaded, day outside the window, empty mask).
+        """
+        if not self.enabled or not mask:
+            return None
+        with self._lock:
+            offset = self._day_index(day)
+            if offset is None:
+                return None
+            candidates = self.active.copy()
+            if branch_id:
+                candidates &= self.branch_ids == branch_id
+            if building_id:
+                candidates &= self.building_ids == building_id
+            if type_id:
+                candidates &= self.type_ids == type_id
+            busy = self.booked[:, offset, :][:, self._mask_to_hours(mask)].any(axis=1)
+            free_ids = self.room_ids[candidates & ~busy]
+            total_rooms = int(candidates.sum())
+        total_free = int(free_ids.size)
+        if limit > 0:
+            free_ids = free_ids[:limit]
+        return free_ids.tolist(), total_rooms, total_free
+
+    def verify(self, session: Session, samples: int = 1000) -> List[str]:
+        """
+        Prove the matrix answers like check_room_availability.
+        Compares every room-day of the window with the masks rebuilt from OrderRoom and with
+        RoomDaySlots, then compares random (room, day, hours) probes with check_room_availability.
+
+        Args:
+            session (Session): The database session.
+            samples (int): Number of random check_room_availability probes.
+
+        Returns:
+            List[str]: A description of every mismatch (empty when consistent).
+        """
+        # Import muộn để tránh vòng import với crud_order
+        from app.crud.crud_order import check_room_availability, hours_mask
+
+        if not self.enabled or not self.loaded:
+            return ["Availability matrix is not loaded"]
+        start, end = self.start, self.start + timedelta(days=self.days)
+
+        expected = {}
+        for room_id, day, begin, finish in session.exec(
+            select(OrderRoom.room_id, OrderRoom.date, OrderRoom.begin, OrderRoom.end)
+            .where(OrderRoom.is_cancel == False)
+            .where(OrderRoom.date >= start, OrderRoom.date < end)
+        ):
+            expected[(room_id, day)] = expected.get((room_id, day), 0) | hours_mask(begin, finish)
+        stored = {
+            (slots.room_id, slots.date): slots.mask
+            for slots in session.exec(
+                select(RoomDaySlots).where(RoomDaySlots.date >= start, RoomDaySlots.date < end)
+            )
+        }
+
+        mismatches = []
+        days = [start + timedelta(days=i) for i in range(self.days)]
+        for room_id in self.room_ids.tolist():
+            for day in days:
+                matrix_mask = self.room_mask(room_id, day)
+                order_mask = expected.get((room_id, day), 0)
+                slots_mask = stored.get((room_id, day), 0)
+                if not (matrix_mask == order_mask == slots_mask):
+                    mismatches.append(
+                        f"room {room_id} on {day}: matrix={matrix_mask:024b} "
+                        f"orders={order_mask:024b} slots={slots_mask:024b}"
+                    )
+
+        room_ids = self.room_ids.tolist()
+        for _ in range(samples if room_ids else 0):
+            room_id = random.choice(room_ids)
+            day = random.choice(days)
+            begin = random.randrange(HOURS_PER_DAY)
+            finish = random.randint(begin + 1, HOURS_PER_DAY)
+            mask = ((1 << finish) - 1) ^ ((1 << begin) - 1)
+            from_matrix = not (self.room_mask(room_id, day) & mask)
+            from_db = check_room_availability(session, room_id, day, *_hour_range(begin, finish))
+            if from_matrix != from_db:
+                mismatches.append(
+                    f"room {room_id} on {day} {begin}h-{finish}h: matrix={from_matrix} check_room_availability={from_db}"
+                )
+        return mismatches
+
+
+def _hour_range(begin: int, finish: int) -> Tuple[time, time]:
+    # time không biểu diễn được 24h, dùng 23:59:59 (vẫn thuộc giờ 23 như hours_mask)
+    return time(begin), time(finish) if finish < HOURS_PER_DAY else time(23, 59, 59)
+
+
+availability_matrix = AvailabilityMatrix(days=AVAILABILITY_MATRIX_DAYS, enabled=AVAILABILITY_MATRIX_ENABLED)
+
+
+# --- Vá ma trận sau khi transaction commit ---
+def queue_slot_patch(session: Session, room_id: int, day: date, mask: int, booked: bool) -> None:
+    """Remember a RoomDaySlots change, applied to the matrix once the session commits."""
+    if availability_matrix.enabled and mask:
+        session.info.setdefault(_PATCHES_KEY, []).append((room_id, day, mask, booked))
+
+def queue_rooms_changed(session: Session) -> None:
+    """Remember that rooms were created, moved or deleted; the matrix is dropped after commit."""
+    if availability_matrix.enabled:
+        session.info[_ROOMS_CHANGED_KEY] = True
+
+# after_commit/after_rollback cũng chạy cho SAVEPOINT, chỉ xử lý transaction ngoài cùng
+@event.listens_for(OrmSession, "after_commit")
+def _apply_patches(session) -> None:
+    if session.in_nested_transaction():
+        return
+    patches = session.info.pop(_PATCHES_KEY, None)
+    if session.info.pop(_ROOMS_CHANGED_KEY, False):
+        availability_matrix.invalidate()
+        return
+    for patch in patches or ():
+        availability_matrix.patch(*patch)
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_patches(session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_PATCHES_KEY, None)
+    session.info.pop(_ROOMS_CHANGED_KEY, None)
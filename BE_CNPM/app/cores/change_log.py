@@ -0,0 +1,73 @@
+'''
+Change log dùng chung giữa các worker (RoomEvent, HeatmapChange, UserCacheEviction).
+
+Đường ghi thêm 1 dòng (worker, payload JSON, created_at) trong chính transaction của thay đổi:
+commit thì các worker khác thấy, rollback thì không. Mỗi worker đọc theo id tăng dần
+(ChangeLogReader.read), bỏ qua các dòng do chính nó ghi (đã áp dụng lúc commit).
+Dòng cũ hơn LOG_RETENTION_SECONDS bị xóa khi đọc, vì mọi worker đã đọc từ lâu.
+'''
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from uuid import uuid4
+
+from sqlalchemy import delete, or_
+from sqlmodel import Session, select
+
+# Đọc lại cả vài giây gần nhất: id cấp lúc INSERT nhưng commit có thể đến muộn hơn id lớn hơn
+SYNC_LOOKBACK_SECONDS = 10
+LOG_RETENTION_SECONDS = 300
+
+WORKER_ID = uuid4().hex
+
+
+def log_entry(model, payload: Any):
+    """A change log row of this worker, to add to the session of the change."""
+    return model(worker=WORKER_ID, payload=json.dumps(payload), created_at=datetime.now(timezone.utc))
+
+
+class ChangeLogReader:
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._seen: Dict[int, float] = {}  # id đã đọc trong khoảng lookback -> lúc đọc
+        self.cursor = 0  # id lớn nhất đã đọc
+        self.received = 0
+        self.last_purge = 0.0
+
+    def read(self, session: Session) -> List[Any]:
+        """
+        Payloads written by other workers since the last read, each returned once,
+        and delete the entries older than LOG_RETENTION_SECONDS every minute or so.
+        """
+        model = self.model
+        now = datetime.now(timezone.utc)
+        entries = session.exec(
+            select(model)
+            .where(or_(model.id > self.cursor,
+                       model.created_at >= now - timedelta(seconds=SYNC_LOOKBACK_SECONDS)))
+            .order_by(model.id)
+        ).all()
+        clock = time.time()
+        payloads = []
+        with self._lock:
+            for entry in entries:
+                if entry.id in self._seen:
+                    continue
+                self._seen[entry.id] = clock
+                if entry.worker != WORKER_ID:
+                    payloads.append(json.loads(entry.payload))
+            self.cursor = max([self.cursor] + [entry.id for entry in entries])
+            for entry_id in [entry_id for entry_id, seen in self._seen.items() if seen < clock - 2 * SYNC_LOOKBACK_SECONDS]:
+                del self._seen[entry_id]
+            self.received += len(payloads)
+        if clock - self.last_purge >= LOG_RETENTION_SECONDS / 5:
+            session.execute(delete(model).where(model.created_at < now - timedelta(seconds=LOG_RETENTION_SECONDS)))
+            session.commit()
+            self.last_purge = clock
+        return payloads
+
+    def stats(self) -> dict:
+        return {"cursor": self.cursor, "received": self.received}
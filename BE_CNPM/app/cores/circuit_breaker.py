@@ -0,0 +1,109 @@
+'''
+Circuit breaker cho lời gọi ra dịch vụ ngoài (SSO).
+
+closed    : gọi bình thường, đếm số lỗi liên tiếp.
+open      : sau `failure_threshold` lỗi liên tiếp, từ chối ngay trong `reset_timeout` giây.
+half_open : hết thời gian chờ, cho đúng 1 lời gọi thử; thành công thì đóng lại, lỗi thì mở tiếp.
+'''
+import threading
+import time
+from typing import Awaitable, Callable, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    '''Breaker đang mở, lời gọi bị từ chối mà không chạm tới dịch vụ.'''
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def _before_call(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def _on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """
+        Await fn(*args, **kwargs) through the breaker.
+        Only exceptions in failure_exceptions count as failures; any other exception
+        ends a half-open trial without changing the state.
+
+        Raises:
+            CircuitOpenError: The breaker is open.
+        """
+        self._before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_failure()
+            raise
+        except BaseException:
+            with self._lock:
+                self._trial_running = False
+            raise
+        self._on_success()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+            }
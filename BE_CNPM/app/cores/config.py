@@ -1,23 +1,116 @@
+from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class Settings(BaseSettings):
+    '''
+    Cấu hình ứng dụng, đọc từ biến môi trường (hoặc file .env trong thư mục BE_CNPM).
+    '''
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
+    API_V1_STR: str = "/api/v1"
 
+    # Access token ngắn hạn, làm mới bằng refresh token (xoay vòng, thu hồi được)
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    # Dùng lại refresh token vừa đổi trong khoảng này (vd. 2 tab cùng refresh) được cấp token mới
+    # cùng family thay vì thu hồi cả family
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: float = 10
+    # Chu kỳ mỗi worker đọc change log thu hồi token của các worker khác
+    TOKEN_REVOCATION_SYNC_SECONDS: float = 1.0
 
-# ADMIN_KEY: str ="something"
+    # Các khóa bí mật (bắt buộc, không để giá trị mặc định trong mã nguồn)
+    SECRET_KEY: str
+    ADMIN_SECRET_KEY: str
 
-from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+    # Cấu hình database (mặc định: MySQL của XAMPP)
+    DB_USER: str = "root"
+    DB_PASSWORD: str = ""
+    DB_HOST: str = "localhost"
+    DB_PORT: int = 3306
+    DB_NAME: str = "cnpm_db"
+    # Ghi đè toàn bộ chuỗi kết nối, vd. sqlite:///./cnpm.db khi chạy local/bench
+    DATABASE_URL: Optional[str] = None
 
-# Cấu hình database
-DB_USER = "root"  # XAMPP default
-DB_PASSWORD = ""  # XAMPP default
-DB_HOST = "localhost"
-DB_PORT = 3306
-DB_NAME = "cnpm_db"
+    # Connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # giây chờ tối đa để lấy connection
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800  # giây, nhỏ hơn wait_timeout của MySQL
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # 0 = không giới hạn
+    DB_ECHO: bool = False
 
-# Chuỗi kết nối
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # bcrypt: cost và executor riêng cho hash/verify mật khẩu
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64  # quá số này thì trả 503 thay vì xếp hàng
 
-# Các khóa bí mật
+    # SSO của trường (đổi sang fake server trong testing/fake_sso.py khi test/bench)
+    SSO_BASE_URL: str = "https://sso.hcmut.edu.vn"
+    MYBK_BASE_URL: str = "https://mybk.hcmut.edu.vn"
+    SSO_TIMEOUT_SECONDS: float = 10
+    SSO_CONNECT_TIMEOUT_SECONDS: float = 3
+    SSO_MAX_CONNECTIONS: int = 20
+    # Circuit breaker và cache quanh get_information
+    SSO_BREAKER_FAILURES: int = 5  # số lỗi liên tiếp để mở breaker
+    SSO_BREAKER_RESET_SECONDS: float = 30
+    SSO_NEGATIVE_CACHE_TTL_SECONDS: float = 15  # (username, mật khẩu) vừa bị SSO từ chối
+    SSO_PROFILE_CACHE_TTL_SECONDS: float = 300  # profile đã lấy được nhưng chưa lưu vào DB
+
+    # Cache User theo id cho get_current_user (0 = tắt).
+    # Khóa tài khoản có hiệu lực ngay qua danh sách thu hồi token; đổi hồ sơ/trạng thái ghi
+    # change log UserCacheEviction, các worker khác xóa cache sau <= TOKEN_REVOCATION_SYNC_SECONDS.
+    # TTL chỉ là giới hạn trên khi đồng bộ bị lỗi.
+    USER_CACHE_TTL_SECONDS: float = 300
+    USER_CACHE_SIZE: int = 4096
+
+    # Giờ đặt phòng: bắt đầu từ BOOKING_OPEN_HOUR, kết thúc muộn nhất lúc BOOKING_CLOSE_HOUR
+    # (khung giờ của /searchroom và /findslot; bộ lọc của FE cho chọn 06:00 - 21:00)
+    BOOKING_OPEN_HOUR: int = 6
+    BOOKING_CLOSE_HOUR: int = 21
+
+    # Ma trận phòng trống trong bộ nhớ (cần numpy, chỉ đúng khi chạy 1 worker)
+    AVAILABILITY_MATRIX_ENABLED: bool = False
+    AVAILABILITY_MATRIX_DAYS: int = 14
+
+    # Check-in/out thư viện ghi vào bộ nhớ + journal, ghi DB theo lô (chỉ đúng khi chạy 1 worker)
+    LIBRARY_WRITE_BEHIND_ENABLED: bool = False
+    LIBRARY_JOURNAL_PATH: str = "library_journal.jsonl"
+    LIBRARY_JOURNAL_FSYNC: bool = True
+    LIBRARY_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LIBRARY_FLUSH_BATCH_SIZE: int = 500
+
+    # Kênh SSE trạng thái phòng cho dashboard admin (hàng đợi riêng, có giới hạn, cho mỗi client)
+    ROOM_EVENTS_QUEUE_SIZE: int = 256
+    ROOM_EVENTS_MAX_CLIENTS: int = 50
+    ROOM_EVENTS_HEARTBEAT_SECONDS: float = 15
+    # Chia sẻ sự kiện giữa các worker qua bảng RoomEvent (tắt khi chỉ chạy 1 worker)
+    ROOM_EVENTS_SHARED: bool = True
+
+    # Thống kê mức sử dụng phòng (cần numpy): số dòng OrderRoom/UsedRoom đọc mỗi khối
+    ANALYTICS_CHUNK_SIZE: int = 50000
+    # Cache heatmap theo (tòa nhà, khoảng ngày): xóa khi đơn/lượt dùng trong khoảng đó thay đổi (0 = không cache)
+    HEATMAP_CACHE_TTL_SECONDS: float = 600
+    HEATMAP_CACHE_SIZE: int = 256
+    # Báo các worker khác xóa cache qua bảng HeatmapChange (tắt khi chỉ chạy 1 worker)
+    HEATMAP_CACHE_SHARED: bool = True
+    # Chu kỳ mỗi worker đọc change log (RoomEvent, HeatmapChange) của các worker khác
+    CHANGE_LOG_SYNC_SECONDS: float = 1.0
+
+    @property
+    def database_url(self) -> str:
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
+        return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
+
+settings = Settings()
+
+# Giữ các hằng cũ cho các module đang import trực tiếp
+API_V1_STR = settings.API_V1_STR
+SECRET_KEY = settings.SECRET_KEY
+ADMIN_SECRET_KEY = settings.ADMIN_SECRET_KEY
+DATABASE_URL = settings.database_url
+AVAILABILITY_MATRIX_ENABLED = settings.AVAILABILITY_MATRIX_ENABLED
+AVAILABILITY_MATRIX_DAYS = settings.AVAILABILITY_MATRIX_DAYS
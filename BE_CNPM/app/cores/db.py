@@ -1,6 +1,141 @@
-from sqlmodel import create_engine, SQLModel
-from .config import DATABASE_URL
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
 
-engine= create_engine(DATABASE_URL, echo=True, future=True)
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlmodel import create_engine
+from .config import settings, Settings
 
-SQLModel.metadata.create_all(engine)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    '''
+    Thời gian chờ lấy connection từ pool, dùng để chọn DB_POOL_SIZE theo số worker uvicorn.
+    Chỉ giữ `window` lần checkout gần nhất để tính percentile.
+    '''
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent.append(wait)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self.checkouts = self.timeouts = 0
+            self.total_wait = self.max_wait = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, timeouts = self.checkouts, self.timeouts
+            total_wait, max_wait = self.total_wait, self.max_wait
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1000
+
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "avg_wait_ms": total_wait / checkouts * 1000 if checkouts else 0.0,
+            "p50_wait_ms": percentile(0.50),
+            "p95_wait_ms": percentile(0.95),
+            "p99_wait_ms": percentile(0.99),
+            "max_wait_ms": max_wait * 1000,
+        }
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    '''QueuePool đo thời gian chờ của mỗi lần checkout (kể cả khi phải mở connection mới).'''
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - started)
+        return connection
+
+
+def build_engine(config: Optional[Settings] = None):
+    """
+    Build the SQLAlchemy engine from the settings.
+    MySQL gets a TimedQueuePool with the configured size/overflow/recycle and a
+    per-session max_execution_time; SQLite (local/bench runs) gets the same pool
+    for file databases and a StaticPool for in-memory ones.
+
+    Args:
+        config (Optional[Settings]): Settings to use (default: app settings).
+
+    Returns:
+        Engine: The configured engine.
+    """
+    config = config or settings
+    url = config.database_url
+    connect_args = {}
+    pool_args = {
+        "poolclass": TimedQueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+    if url.startswith("sqlite"):
+        # FastAPI chạy route sync trong threadpool
+        connect_args["check_same_thread"] = False
+        if config.DB_STATEMENT_TIMEOUT_MS:
+            # SQLite không có statement timeout, chỉ có thời gian chờ khóa
+            connect_args["timeout"] = config.DB_STATEMENT_TIMEOUT_MS / 1000
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            pool_args = {"poolclass": StaticPool}
+    elif url.startswith("mysql") and config.DB_STATEMENT_TIMEOUT_MS:
+        # max_execution_time chỉ áp dụng cho SELECT
+        connect_args["init_command"] = f"SET SESSION max_execution_time={config.DB_STATEMENT_TIMEOUT_MS}"
+
+    engine = create_engine(url, echo=config.DB_ECHO, connect_args=connect_args, **pool_args)
+
+    logger.info(f"Database engine: {engine.url.render_as_string(hide_password=True)}")
+    return engine
+
+
+def pool_status(engine) -> dict:
+    """Current pool occupancy plus the checkout wait statistics."""
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    status.update(pool_stats.snapshot())
+    return status
+
+
+# Schema do alembic quản lý (app/backend_pre_start.py), không tạo bảng khi import
+engine = build_engine()
@@ -0,0 +1,427 @@
+'''
+Dịch vụ occupancy thư viện kiểu write-behind (tùy chọn, LIBRARY_WRITE_BEHIND_ENABLED).
+
+Check-in/check-out thư viện chỉ đổi trạng thái trong bộ nhớ (số người mỗi phòng, ai đang
+ở phòng nào) và ghi 1 dòng vào journal cục bộ (fsync) trước khi trả lời. Một thread nền
+gom các sự kiện và ghi xuống DB theo lô (executemany) mỗi LIBRARY_FLUSH_INTERVAL_SECONDS
+hoặc khi đủ LIBRARY_FLUSH_BATCH_SIZE sự kiện, trong 1 transaction: check-in thành
+ActiveSession, check-out chuyển ActiveSession sang UsedRoom như đường DB thường.
+
+Journal chỉ giữ các sự kiện chưa ghi xuống DB. Khi khởi động, các sự kiện còn lại được
+ghi lại (idempotent: phiên/UsedRoom đã có trong DB thì bỏ qua, quantity ghi giá trị
+tuyệt đối), nên tiến trình chết giữa chừng không làm mất sự kiện nào.
+
+Bộ nhớ là nguồn đúng cho Room.quantity của phòng thư viện, vì vậy chỉ bật khi chạy 1 worker.
+'''
+import json
+import logging
+import os
+import threading
+import time as time_module
+from datetime import date, datetime, time
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, event, exists
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from app.cores.analytics import queue_heatmap_change
+from app.cores.config import settings
+from app.cores.room_events import room_events
+from app.model import ActiveSession, Room, RoomType, UsedRoom
+
+logger = logging.getLogger(__name__)
+
+_ROOM_UPDATES_KEY = "library_room_updates"
+
+
+class LibraryOccupancyService:
+    def __init__(
+        self,
+        journal_path: str,
+        flush_interval: float,
+        batch_size: int,
+        fsync: bool = True,
+        enabled: bool = True,
+    ):
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.enabled = enabled
+        self.engine = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # 1 lần flush tại một thời điểm
+        self._rooms: Dict[int, List[int]] = {}  # room_id -> [quantity, max_quantity]
+        self._active: Dict[int, int] = {}  # user_id -> room_id đang ở
+        self._pending: List[dict] = []
+        self._journal = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+
+    # --- Vòng đời ---
+    def start(self, engine) -> None:
+        """Replay the journal, load library rooms and active users, then start the flusher thread."""
+        self.engine = engine
+        replayed = self._replay_journal()
+        with Session(engine) as session:
+            self._load(session)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="library-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Library occupancy: {len(self._rooms)} rooms, {len(self._active)} users inside, "
+                    f"{replayed} journal events replayed")
+
+    def stop(self) -> None:
+        """Stop the flusher thread and flush what is left."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        self._journal.close()
+        self._journal = None
+
+    def _load(self, session: Session) -> None:
+        rooms = session.exec(
+            select(Room.id, Room.quantity, Room.max_quantity)
+            .join(RoomType, RoomType.id == Room.type_id)
+            .where(RoomType.type_name == "Library")
+        ).all()
+        active = session.exec(
+            select(ActiveSession.user_id, ActiveSession.room_id)
+            .where(ActiveSession.room_id.in_([room_id for room_id, _, _ in rooms]))
+        ).all()
+        with self._lock:
+            self._rooms = {room_id: [quantity or 0, max_quantity or 0] for room_id, quantity, max_quantity in rooms}
+            self._active = {user_id: room_id for user_id, room_id in active}
+
+    def _room(self, session: Session, room_id: int) -> List[int]:
+        # Gọi ngoài self._lock. Phòng tạo sau khi khởi động: đọc DB lần đầu khi có người dùng tới,
+        # check_in thêm vào self._rooms khi đã giữ lock
+        room = self._rooms.get(room_id)
+        if room is not None:
+            return room
+        row = session.exec(
+            select(Room.quantity, Room.max_quantity)
+            .join(RoomType, RoomType.id == Room.type_id)
+            .where(Room.id == room_id, RoomType.type_name == "Library")
+        ).first()
+        if row is None:
+            if session.get(Room, room_id) is None:
+                raise HTTPException(status_code=404, detail=f"Room with ID {room_id} not found")
+            raise HTTPException(status_code=400, detail="Room is not a library room")
+        return [row[0] or 0, row[1] or 0]
+
+    # --- Trả lời từ bộ nhớ ---
+    def is_available(self, room_id: int) -> Optional[bool]:
+        """True/False from memory, None if the room is not loaded (ask the database)."""
+        room = self._rooms.get(room_id)
+        if room is None:
+            return None
+        return room[0] < room[1]
+
+    def active_room(self, user_id: int) -> Optional[int]:
+        return self._active.get(user_id)
+
+    def quantity(self, room_id: int) -> Optional[int]:
+        # Số người trong phòng theo bộ nhớ (DB có thể chậm hơn 1 lần flush), None nếu chưa nạp
+        room = self._rooms.get(room_id)
+        return room[0] if room is not None else None
+
+    def check_in(self, session: Session, user_id: int, room_id: int) -> int:
+        """
+        Count a student into a library room in memory and journal the event.
+
+        Args:
+            session (Session): Used only to load a room seen for the first time.
+            user_id (int): The ID of the user.
+            room_id (int): The ID of the library room.
+
+        Returns:
+            int: The new occupancy of the room.
+
+        Raises:
+            HTTPException: 404/400 if the room is not a library, 400 if it is full
+            or the user is already inside a library.
+        """
+        # Đọc DB trước khi lấy lock: trong lock chỉ còn kiểm tra/cập nhật bộ nhớ và ghi journal
+        loaded = self._room(session, room_id)
+        other = session.get(ActiveSession, user_id)
+        with self._lock:
+            room = self._rooms.setdefault(room_id, loaded)
+            # ActiveSession của phòng thư viện có thể chưa flush: chỉ tin DB với các phòng khác
+            if user_id in self._active or (other is not None and other.room_id not in self._rooms):
+                raise HTTPException(status_code=400, detail="You have already checked in a room")
+            if room[0] >= room[1]:
+                raise HTTPException(status_code=400, detail="Library is not available now")
+            room[0] += 1
+            self._active[user_id] = room_id
+            self._append({"kind": "in", "user_id": user_id, "room_id": room_id, "quantity": room[0]})
+            return room[0]
+
+    def check_out(self, user_id: int, room_id: int) -> int:
+        """
+        Count a student out of the library room they are in, in memory, and journal the event.
+
+        Returns:
+            int: The new occupancy of the room.
+
+        Raises:
+            HTTPException: 404 if the user is not in a library, 404 if it is another room.
+        """
+        with self._lock:
+            current = self._active.get(user_id)
+            if current is None:
+                raise HTTPException(status_code=404, detail="You have not checked in any room")
+            if current != room_id:
+                raise HTTPException(status_code=404, detail="You check out wrong room")
+            del self._active[user_id]
+            room = self._rooms.get(room_id)
+            if room is None:  # phòng vừa bị xóa
+                return 0
+            room[0] = max(0, room[0] - 1)
+            self._append({"kind": "out", "user_id": user_id, "room_id": room_id, "quantity": room[0]})
+            return room[0]
+
+    def set_room(self, room_id: int, quantity: Optional[int], max_quantity: Optional[int]) -> None:
+        # Admin sửa phòng (update_room): áp dụng vào bộ nhớ sau khi commit
+        with self._lock:
+            room = self._rooms.get(room_id)
+            if room is not None:
+                room[0] = quantity or 0
+                if max_quantity is not None:
+                    room[1] = max_quantity
+
+    def forget_room(self, room_id: int) -> None:
+        # Phòng bị xóa hoặc đổi loại: nạp lại từ DB ở lần dùng sau
+        with self._lock:
+            self._rooms.pop(room_id, None)
+
+    def _append(self, record: dict) -> None:
+        # Gọi khi đang giữ self._lock
+        now = datetime.now()
+        record["date"] = now.date().isoformat()
+        record["time"] = now.time().isoformat()
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        # Bộ nhớ là nguồn đúng: phát ngay, không chờ flush
+        if room_events.active:
+            room_events.publish([{"type": "library", "room_id": record["room_id"], "quantity": record["quantity"]}])
+
+    # --- Ghi xuống DB ---
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Library occupancy flush failed, will retry: {e}")
+
+    def flush(self) -> int:
+        """
+        Write the pending events to the database in one transaction and drop them from the journal.
+        On failure the events stay pending (and in the journal) for the next flush.
+
+        Returns:
+            int: The number of events written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+            if not events:
+                return 0
+            started = time_module.perf_counter()
+            try:
+                with Session(self.engine) as session:
+                    apply_events(session, events, replay=False)
+                    session.commit()
+            except Exception:
+                with self._lock:
+                    self._pending = events + self._pending
+                    self.failures += 1
+                raise
+            with self._lock:
+                # Journal chỉ còn các sự kiện đến trong lúc flush
+                self._rewrite_journal(self._pending)
+                self.flushed += len(events)
+                self.flushes += 1
+                self.last_flush_ms = (time_module.perf_counter() - started) * 1000
+            return len(events)
+
+    def _rewrite_journal(self, records: List[dict]) -> None:
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp:
+            for record in records:
+                tmp.write(json.dumps(record) + "\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        if self._journal is not None:
+            self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        if self._journal is not None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _replay_journal(self) -> int:
+        if not os.path.exists(self.journal_path):
+            return 0
+        events = []
+        with open(self.journal_path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Dòng cuối bị cắt khi tiến trình chết lúc đang ghi: sự kiện chưa được trả lời
+                    break
+        if events:
+            with Session(self.engine) as session:
+                apply_events(session, events, replay=True)
+                session.commit()
+        self._rewrite_journal([])
+        return len(events)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "rooms": len(self._rooms),
+                "users_inside": len(self._active),
+                "pending": len(self._pending),
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "failures": self.failures,
+                "last_flush_ms": self.last_flush_ms,
+            }
+
+
+def apply_events(session: Session, events: List[dict], replay: bool) -> None:
+    """
+    Write journal events with one executemany per statement: check-outs of sessions
+    already in the database (INSERT into UsedRoom + DELETE from ActiveSession),
+    sessions opened and closed within the batch (INSERT into UsedRoom), sessions
+    still open (INSERT into ActiveSession) and the final quantity of each room.
+    With replay=True, rows already written by an earlier flush are skipped.
+    """
+    opened: Dict[int, dict] = {}  # user_id -> ActiveSession chưa có trong DB
+    finished: List[dict] = []  # mở và đóng trong cùng lô: thẳng vào UsedRoom
+    closes: Dict[int, datetime] = {}  # user_id -> giờ check-out của ActiveSession đã có trong DB
+    quantities: Dict[int, int] = {}
+    for record in events:
+        moment = datetime.combine(date.fromisoformat(record["date"]), time.fromisoformat(record["time"]))
+        quantities[record["room_id"]] = record["quantity"]
+        if record["kind"] == "in":
+            opened[record["user_id"]] = {"user_id": record["user_id"], "room_id": record["room_id"],
+                                         "order_id": None, "started_at": moment}
+            continue
+        row = opened.pop(record["user_id"], None)
+        if row is not None:
+            finished.append(_used_room_row(row, moment))
+        else:
+            closes[record["user_id"]] = moment
+
+    # Phòng bị xóa trong lúc chờ flush: bỏ sự kiện của nó (INSERT sẽ lỗi khóa ngoại)
+    existing = set(session.exec(select(Room.id).where(Room.id.in_(list(quantities)))).all())
+    new_sessions = [row for row in opened.values() if row["room_id"] in existing]
+    finished = [row for row in finished if row["room_id"] in existing]
+    quantities = {room_id: quantity for room_id, quantity in quantities.items() if room_id in existing}
+
+    # ActiveSession cần đóng: đọc 1 lần. Khi replay, phiên đã đóng (hoặc phiên mở sau lần check-out) không tính.
+    active = session.exec(select(ActiveSession).where(ActiveSession.user_id.in_(list(closes)))).all() if closes else []
+    active = [row for row in active if row.started_at <= closes[row.user_id]]
+    finished = [_used_room_row(row.model_dump(), closes[row.user_id]) for row in active] + finished
+
+    # User vẫn còn ActiveSession (phòng khác, hoặc lần flush trước đã commit mà chưa kịp xóa journal)
+    open_users = set(session.exec(
+        select(ActiveSession.user_id).where(ActiveSession.user_id.in_([row["user_id"] for row in new_sessions]))
+    ).all()) - {row.user_id for row in active} if new_sessions else set()
+    new_sessions = [row for row in new_sessions if row["user_id"] not in open_users]
+    if replay:
+        # Lần flush trước có thể đã commit mà chưa kịp xóa journal
+        finished = [row for row in finished if not _used_room_exists(session, row)]
+
+    connection = session.connection()
+    sessions = ActiveSession.__table__
+    if active:
+        connection.execute(
+            sessions.delete().where(sessions.c.user_id == bindparam("b_user_id")),
+            [{"b_user_id": row.user_id} for row in active],
+        )
+    if finished:
+        connection.execute(UsedRoom.__table__.insert(), finished)
+        for row in finished:
+            queue_heatmap_change(session, row["room_id"], row["date"], row["checkout_date"])
+    if new_sessions:
+        connection.execute(sessions.insert(), new_sessions)
+    if quantities:
+        rooms = Room.__table__
+        connection.execute(
+            rooms.update().where(rooms.c.id == bindparam("b_id")).values(quantity=bindparam("b_quantity")),
+            [{"b_id": room_id, "b_quantity": quantity} for room_id, quantity in quantities.items()],
+        )
+
+
+def _used_room_row(active: dict, ended_at: datetime) -> dict:
+    return {
+        "order_id": active["order_id"], "user_id": active["user_id"], "room_id": active["room_id"],
+        "date": active["started_at"].date(), "checkin": active["started_at"].time(),
+        "checkout": ended_at.time(), "checkout_date": ended_at.date(),
+    }
+
+
+def _used_room_exists(session: Session, row: dict) -> bool:
+    return session.exec(select(exists().where(
+        UsedRoom.user_id == row["user_id"],
+        UsedRoom.room_id == row["room_id"],
+        UsedRoom.date == row["date"],
+        UsedRoom.checkin == row["checkin"],
+    ))).one()
+
+
+library_occupancy = LibraryOccupancyService(
+    journal_path=settings.LIBRARY_JOURNAL_PATH,
+    flush_interval=settings.LIBRARY_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.LIBRARY_FLUSH_BATCH_SIZE,
+    fsync=settings.LIBRARY_JOURNAL_FSYNC,
+    enabled=settings.LIBRARY_WRITE_BEHIND_ENABLED,
+)
+
+
+# --- Admin sửa/xóa phòng: cập nhật bộ nhớ sau khi commit ---
+def queue_library_room_update(session: Session, room_id: int, quantity: Optional[int], max_quantity: Optional[int]) -> None:
+    if library_occupancy.enabled:
+        session.info.setdefault(_ROOM_UPDATES_KEY, []).append((room_id, quantity, max_quantity))
+
+def queue_library_room_removed(session: Session, room_id: int) -> None:
+    if library_occupancy.enabled:
+        session.info.setdefault(_ROOM_UPDATES_KEY, []).append((room_id, None, None, True))
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_room_updates(session) -> None:
+    if session.in_nested_transaction():
+        return
+    for room_id, quantity, max_quantity, *removed in session.info.pop(_ROOM_UPDATES_KEY, None) or ():
+        if removed:
+            library_occupancy.forget_room(room_id)
+        else:
+            library_occupancy.set_room(room_id, quantity, max_quantity)
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_room_updates(session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_ROOM_UPDATES_KEY, None)
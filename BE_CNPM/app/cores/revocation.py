@@ -0,0 +1,94 @@
+'''
+Danh sách access token đã bị thu hồi, giữ trong bộ nhớ của từng worker.
+
+Hai loại mục:
+    jti     : thu hồi đúng 1 token (đăng xuất).
+    user_id : thu hồi mọi token của user phát hành trước thời điểm thu hồi (khóa tài khoản).
+Mục hết hạn cùng lúc với token dài nhất mà nó chặn, sau đó tự bị loại bỏ.
+
+Các worker đồng bộ với nhau qua bảng TokenRevocation (change log, id tăng dần):
+worker ghi thì áp dụng ngay, các worker khác thấy sau tối đa 1 chu kỳ đồng bộ.
+'''
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class TokenRevocationList:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis: Dict[str, float] = {}  # jti -> hết hạn (epoch giây)
+        self._users: Dict[int, Tuple[float, float]] = {}  # user_id -> (thu hồi lúc, hết hạn)
+        self.cursor = 0  # id lớn nhất đã đọc trong change log
+        self.last_sync: Optional[float] = None
+        self.syncs = 0
+        self.rejected = 0
+
+    def revoke_jti(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            self._jtis[jti] = max(expires_at, self._jtis.get(jti, 0))
+
+    def revoke_user(self, user_id: int, revoked_at: float, expires_at: float) -> bool:
+        # True nếu đây là lần thu hồi mới (chưa áp dụng trước đó)
+        with self._lock:
+            current = self._users.get(user_id)
+            if current:
+                if revoked_at <= current[0] and expires_at <= current[1]:
+                    return False
+                revoked_at, expires_at = max(revoked_at, current[0]), max(expires_at, current[1])
+            self._users[user_id] = (revoked_at, expires_at)
+            return True
+
+    def is_revoked(self, claims: dict) -> bool:
+        # Không khóa: chỉ đọc dict, CPython đảm bảo get() nguyên tử
+        now = time.time()
+        jti = claims.get("jti")
+        if jti is not None:
+            expires = self._jtis.get(jti)
+            if expires is not None and expires > now:
+                self.rejected += 1
+                return True
+        user = self._users.get(claims.get("uid"))
+        if user is not None and user[1] > now:
+            # Token cũ không có iat: coi như phát hành từ trước
+            if (claims.get("iat") or 0) <= user[0]:
+                self.rejected += 1
+                return True
+        return False
+
+    def advance(self, cursor: int) -> None:
+        with self._lock:
+            self.cursor = max(self.cursor, cursor)
+            self.last_sync = time.time()
+            self.syncs += 1
+
+    def evict_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            jtis = [jti for jti, expires in self._jtis.items() if expires <= now]
+            users = [user_id for user_id, (_, expires) in self._users.items() if expires <= now]
+            for jti in jtis:
+                del self._jtis[jti]
+            for user_id in users:
+                del self._users[user_id]
+        return len(jtis) + len(users)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._jtis.clear()
+            self._users.clear()
+            self.cursor = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "revoked_tokens": len(self._jtis),
+                "revoked_users": len(self._users),
+                "cursor": self.cursor,
+                "syncs": self.syncs,
+                "seconds_since_sync": time.time() - self.last_sync if self.last_sync else None,
+                "rejected": self.rejected,
+            }
+
+
+token_revocations = TokenRevocationList()
@@ -0,0 +1,175 @@
+'''
+Kênh đẩy thay đổi trạng thái phòng (SSE) cho dashboard admin.
+
+Các đường ghi (đặt phòng, hủy, check-in, check-out, thư viện) gọi queue_room_event;
+sự kiện chỉ được phát sau khi transaction commit (rollback thì bỏ), giống queue_slot_patch.
+RoomEventHub phát mỗi sự kiện tới hàng đợi riêng của từng client đang nghe.
+Hàng đợi có giới hạn (ROOM_EVENTS_QUEUE_SIZE): client đọc chậm bị bỏ phần tồn đọng và
+nhận 1 sự kiện "resync" (tải lại ảnh chụp từ /admin/room_occupancy), nên bộ nhớ không phình.
+
+Loại sự kiện:
+    booked / released : room_id, date, mask (các giờ vừa được đặt / trả)
+    occupancy         : room_id, occupants (số người đang check-in phòng)
+    library           : room_id, quantity (số người trong thư viện)
+    resync            : client đã bị bỏ sự kiện, cần tải lại toàn bộ
+    ready             : đã đăng ký xong, client tải ảnh chụp rồi áp dụng các sự kiện đến sau
+
+Hub nằm trong bộ nhớ của từng worker. Với ROOM_EVENTS_SHARED, sự kiện của mỗi transaction còn
+được ghi 1 dòng vào bảng RoomEvent (app.cores.change_log) và các worker khác đọc mỗi
+CHANGE_LOG_SYNC_SECONDS (sync_room_events), giống đồng bộ thu hồi token.
+Tắt ROOM_EVENTS_SHARED khi chỉ chạy 1 worker: khi đó không có client thì các đường ghi không tốn gì thêm.
+Occupancy thư viện write-behind phát thẳng từ bộ nhớ (chế độ đó chỉ chạy 1 worker).
+'''
+import asyncio
+import threading
+import time
+from typing import List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from app.cores.change_log import ChangeLogReader, log_entry
+from app.cores.config import settings
+from app.model import RoomEvent
+
+_EVENTS_KEY = "room_events"
+
+
+class RoomEventClient:
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def _offer(self, events: List[dict]) -> None:
+        # Chạy trong event loop của client
+        for item in events:
+            if self.queue.full():
+                # Client đọc không kịp: bỏ phần tồn đọng, báo tải lại ảnh chụp
+                self.dropped += self.queue.qsize()
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait({"type": "resync", "seq": item["seq"] - 1})
+            self.queue.put_nowait(item)
+
+
+class RoomEventHub:
+    def __init__(self, queue_size: int, max_clients: int, shared: bool):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.shared = shared
+        self.log = ChangeLogReader(RoomEvent)
+        self._lock = threading.Lock()
+        self._clients: Set[RoomEventClient] = set()
+        self.seq = 0
+        self.published = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._clients)
+
+    @property
+    def recording(self) -> bool:
+        # Có client ở worker này, hoặc có thể có ở worker khác
+        return self.shared or bool(self._clients)
+
+    @property
+    def full(self) -> bool:
+        return len(self._clients) >= self.max_clients
+
+    def subscribe(self) -> Optional[RoomEventClient]:
+        """Register a client on the running event loop; None when max_clients are already connected."""
+        client = RoomEventClient(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client: RoomEventClient) -> None:
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, events: List[dict]) -> None:
+        """Number the events and hand them to every client. Safe to call from any thread."""
+        if not events:
+            return
+        now = time.time()
+        with self._lock:
+            for item in events:
+                self.seq += 1
+                item["seq"] = self.seq
+                item["ts"] = now
+            self.published += len(events)
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.loop.call_soon_threadsafe(client._offer, events)
+            except RuntimeError:
+                # Event loop của client đã đóng
+                self.unsubscribe(client)
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = list(self._clients)
+        return {
+            "clients": len(clients),
+            "max_clients": self.max_clients,
+            "queue_size": self.queue_size,
+            "shared": self.shared,
+            "seq": self.seq,
+            "published": self.published,
+            **self.log.stats(),
+            "queued": sum(client.queue.qsize() for client in clients),
+            "dropped": sum(client.dropped for client in clients),
+        }
+
+
+room_events = RoomEventHub(
+    queue_size=settings.ROOM_EVENTS_QUEUE_SIZE,
+    max_clients=settings.ROOM_EVENTS_MAX_CLIENTS,
+    shared=settings.ROOM_EVENTS_SHARED,
+)
+
+
+def queue_room_event(session: OrmSession, kind: str, room_id: int, **fields) -> None:
+    """Remember a room status change, published once the session commits."""
+    if room_events.recording:
+        session.info.setdefault(_EVENTS_KEY, []).append({"type": kind, "room_id": room_id, **fields})
+
+
+def sync_room_events(session: Session) -> int:
+    """
+    Publish the room events written by other workers since the last sync.
+
+    Returns:
+        int: The number of events received from other workers.
+    """
+    events = [item for payload in room_events.log.read(session) for item in payload]
+    # Không có client: chỉ dời con trỏ
+    if room_events.active:
+        room_events.publish(events)
+    return len(events)
+
+# before_commit/after_commit/after_rollback cũng chạy cho SAVEPOINT, chỉ xử lý transaction ngoài cùng
+@event.listens_for(OrmSession, "before_commit")
+def _log_events(session) -> None:
+    # Ghi change log trong chính transaction này: commit thì các worker khác thấy, rollback thì không
+    if session.in_nested_transaction() or not room_events.shared:
+        return
+    events = session.info.get(_EVENTS_KEY)
+    if events:
+        session.add(log_entry(RoomEvent, events))
+
+@event.listens_for(OrmSession, "after_commit")
+def _publish_events(session) -> None:
+    if session.in_nested_transaction():
+        return
+    room_events.publish(session.info.pop(_EVENTS_KEY, None) or [])
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_events(session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_EVENTS_KEY, None)
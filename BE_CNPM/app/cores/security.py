@@ -1,48 +1,174 @@
+import asyncio
+import threading
+import time
+import uuid
 import jwt
+from concurrent.futures import Future, ThreadPoolExecutor
 from fastapi import HTTPException, status
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
-from .config import SECRET_KEY, ADMIN_SECRET_KEY
-from typing import Dict
+from .config import SECRET_KEY, ADMIN_SECRET_KEY, settings
+from typing import Callable, Dict, Optional, Tuple
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 120  # 2 hours
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max = cost cấu hình: hash có cost khác được needs_update đánh dấu để hash lại
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 def verify_key(key: str) -> bool:
     if key == ADMIN_SECRET_KEY:
         return True
     else:
         return False
-    
+
+
+class PasswordHasher:
+    '''
+    Chạy bcrypt trên executor riêng có giới hạn, để đợt đăng nhập dồn dập không chiếm
+    hết threadpool của AnyIO. Khi hàng đợi vượt max_queue thì trả 503 ngay.
+    '''
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0  # đang chạy + đang chờ
+        self.max_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please try again",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        try:
+            return self._executor.submit(self._run, time.perf_counter(), fn, args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+
+    def _run(self, enqueued: float, fn: Callable, args: tuple):
+        wait = time.perf_counter() - enqueued
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def _verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        if not self.context.verify(password, hashed):
+            return False, None
+        if self.context.needs_update(hashed):
+            with self._lock:
+                self.rehashed += 1
+            return True, self.context.hash(password)
+        return True, None
+
+    # Dùng từ route async: không giữ thread nào trong lúc chờ
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self._submit(self.context.verify, password, hashed))
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await asyncio.wrap_future(self._submit(self._verify_and_update, password, hashed))
+
+    # Dùng từ code sync: vẫn giới hạn số bcrypt chạy song song
+    def hash_sync(self, password: str) -> str:
+        return self._submit(self.context.hash, password).result()
+
+    def verify_sync(self, password: str, hashed: str) -> bool:
+        return self._submit(self.context.verify, password, hashed).result()
+
+    def verify_and_update_sync(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return self._submit(self._verify_and_update, password, hashed).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "rounds": settings.BCRYPT_ROUNDS,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "max_pending": self.max_pending,
+                "completed": completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "avg_wait_ms": self.total_wait / completed * 1000 if completed else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash_sync(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify_sync(plain_password, hashed_password)
+
+
+def user_token_claims(user) -> dict:
+    # Claims của access token cho một User
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "isuser": user.isUser,
+        "isadmin": user.isAdmin,
+        "isactive": user.isActive
+    }
 
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # jti/iat để thu hồi được từng token hoặc mọi token phát hành trước một thời điểm
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def decode_access_token(token: str) -> Dict[str, any]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
-
-        print("token in decode: ",token)
-        data ={
-            "sub": username,
+        return {
+            "sub": payload.get("sub"),
+            "uid": payload.get("uid"),  # token cũ không có uid
             "isuser": payload.get("isuser"),
             "isadmin": payload.get("isadmin"),
-            "isactive": payload.get("isactive")
+            "isactive": payload.get("isactive"),
+            "jti": payload.get("jti"),
+            "iat": payload.get("iat"),
+            "exp": payload.get("exp"),
         }
-        print("data to return: ",data)
-        return data
     
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -0,0 +1,165 @@
+'''
+Client bất đồng bộ lấy thông tin sinh viên từ SSO của trường (CAS) và MyBK,
+dùng khi một người đăng nhập lần đầu (create_user).
+
+Một pool connection (httpx transport) dùng chung cho mọi lần đăng nhập; mỗi lần
+đăng nhập có client/cookie riêng để phiên CAS của người này không lẫn sang người khác.
+'''
+import asyncio
+import base64
+import json
+import logging
+from typing import Optional
+from urllib.parse import quote
+
+import httpx
+from lxml import html as lxml_html
+
+from app.cores.config import settings
+from app.cores.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Mobile Safari/537.36 Edg/126.0.0.0'
+
+
+class SSOUnavailable(Exception):
+    '''SSO/MyBK không trả lời được (timeout, lỗi mạng, lỗi 5xx, trang không đúng định dạng).'''
+
+
+def decode_jwt_payload(jwt: str) -> dict:
+    # Tách phần payload của JWT, chuyển Base64-URL thành Base64 chuẩn (thêm padding nếu cần)
+    payload = jwt.split(".")[1]
+    payload += "=" * (-len(payload) % 4)
+    return json.loads(base64.urlsafe_b64decode(payload).decode("utf-8"))
+
+
+def _input_value(content: bytes, xpath: str) -> Optional[str]:
+    values = lxml_html.fromstring(content).xpath(xpath)
+    return values[0] if values else None
+
+
+class SSOClient:
+    def __init__(
+        self,
+        sso_base_url: str,
+        mybk_base_url: str,
+        timeout: float,
+        connect_timeout: float,
+        max_connections: int,
+    ):
+        self.sso_base_url = sso_base_url.rstrip("/")
+        self.mybk_base_url = mybk_base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def login_url(self) -> str:
+        service = quote(f"{self.mybk_base_url}/app/login/cas", safe="")
+        return f"{self.sso_base_url}/cas/login?service={service}"
+
+    @property
+    def home_url(self) -> str:
+        return f"{self.mybk_base_url}/app/"
+
+    def _client(self) -> httpx.AsyncClient:
+        # Client nhẹ cho từng lần đăng nhập (cookie riêng), dùng chung transport (pool connection).
+        # Connection gắn với event loop đã tạo ra nó, nên đổi loop thì tạo pool mới.
+        loop = asyncio.get_running_loop()
+        if self._transport is None or self._loop is not loop:
+            self._transport = httpx.AsyncHTTPTransport(limits=self.limits, retries=1)
+            self._loop = loop
+        return httpx.AsyncClient(
+            transport=self._transport,
+            timeout=self.timeout,
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+
+    async def aclose(self) -> None:
+        if self._transport is not None:
+            await self._transport.aclose()
+            self._transport = None
+
+    async def get_information(self, username: str, password: str) -> dict:
+        """
+        Log in to the SSO with the student's credentials and read their profile from MyBK.
+
+        Args:
+            username (str): SSO username.
+            password (str): SSO password.
+
+        Returns:
+            dict: {"status": "success", "full_info": {code, lastName, firstName, orgEmail}}
+            or {"status": "failed"} when the credentials are rejected.
+
+        Raises:
+            SSOUnavailable: The SSO or MyBK did not answer as expected.
+        """
+        # Không đóng client: đóng sẽ đóng luôn transport dùng chung
+        client = self._client()
+        try:
+            r = await client.get(self.login_url)
+            r.raise_for_status()
+            login_data = {
+                'username': username,
+                'password': password,
+                '_eventId': 'submit',
+                'submit': 'Login',
+                'lt': _input_value(r.content, '//input[@name="lt"]/@value'),
+                'execution': _input_value(r.content, '//input[@name="execution"]/@value'),
+            }
+            if login_data['lt'] is None or login_data['execution'] is None:
+                raise SSOUnavailable("Unexpected SSO login page")
+
+            r = await client.post(self.login_url, data=login_data)
+            if r.status_code >= 500:
+                raise SSOUnavailable(f"SSO returned {r.status_code}")
+            if str(r.url) != self.home_url:
+                return {"status": "failed"}
+
+            r = await client.get(f"{self.mybk_base_url}/app/he-thong-quan-ly/sinh-vien/ket-qua-hoc-tap")
+            r.raise_for_status()
+            token = _input_value(r.content, '//input[@id="hid_Token"]/@value')
+            if token is None:
+                raise SSOUnavailable("MyBK token not found")
+            person_id = json.loads(decode_jwt_payload(token)['profiles'])['personId']
+
+            r = await client.get(
+                f"{self.mybk_base_url}/api/v1/student/detail-info-by-code/{person_id}?null",
+                headers={'Authorization': 'Bearer ' + token, 'Content-Type': 'application/json'},
+            )
+            r.raise_for_status()
+            data = r.json()['data']
+            info = {
+                'code': data['code'],
+                'lastName': data['lastName'],
+                'firstName': data['firstName'],
+                'orgEmail': data['orgEmail'],
+            }
+        except httpx.HTTPError as e:
+            logger.warning(f"SSO request failed: {type(e).__name__}: {e}")
+            raise SSOUnavailable(f"{type(e).__name__}: {e}") from e
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Unexpected MyBK response: {e}")
+            raise SSOUnavailable(f"Unexpected MyBK response: {e}") from e
+
+        return {"status": "success", "full_info": info}
+
+
+sso_client = SSOClient(
+    sso_base_url=settings.SSO_BASE_URL,
+    mybk_base_url=settings.MYBK_BASE_URL,
+    timeout=settings.SSO_TIMEOUT_SECONDS,
+    connect_timeout=settings.SSO_CONNECT_TIMEOUT_SECONDS,
+    max_connections=settings.SSO_MAX_CONNECTIONS,
+)
+
+sso_breaker = CircuitBreaker(
+    "sso",
+    failure_threshold=settings.SSO_BREAKER_FAILURES,
+    reset_timeout=settings.SSO_BREAKER_RESET_SECONDS,
+    failure_exceptions=(SSOUnavailable,),
+)
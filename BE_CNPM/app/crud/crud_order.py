@@ -1,10 +1,194 @@
 from sqlmodel import Session, select
-from sqlalchemy import desc, asc
-from app.model import OrderRoom, CancelRoom, UsedRoom, Room, User
+from sqlalchemy import desc, asc, func, exists, case, and_, or_, update, delete, insert
+from sqlalchemy.exc import IntegrityError
+from app.model import OrderRoom, CancelRoom, UsedRoom, ActiveSession, Report, Room, RoomType, User, RoomDaySlots, SlotClaim, Branch, Building
 from fastapi import HTTPException
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import date, time, datetime,timedelta
-from app.crud.crud_room import check_library,update_room
+from app.crud.crud_room import check_library
+from app.cores.config import settings
+from app.cores.availability import availability_matrix, queue_slot_patch
+from app.cores.library_occupancy import library_occupancy
+from app.cores.room_events import room_events, queue_room_event
+from app.crud.unit_of_work import commit_or_flush
+from app.crud.crud_stats import order_stats, track_order_stats
+from app.schemas.order import MAX_AVAILABILITY_CELLS
+
+# --- RoomDaySlots ---
+FULL_DAY_MASK = (1 << 24) - 1
+
+def hours_mask(begin: time, end: time) -> int:
+    """
+    Build the 24-bit mask of the hours covered by [begin, end).
+    Bit h is set when hour [h, h+1) intersects the range; a partial last hour counts as booked.
+    
+    Args:
+        begin (time): The start time of the range.
+        end (time): The end time of the range.
+    
+    Returns:
+        int: The hour mask, 0 for an empty range.
+    """
+    start_hour = begin.hour
+    end_hour = end.hour + (1 if (end.minute or end.second or end.microsecond) else 0)
+    if end_hour <= start_hour:
+        return 0
+    return ((1 << end_hour) - 1) ^ ((1 << start_hour) - 1)
+
+def add_room_day_slots(session: Session, room_id: int, date: date, mask: int) -> None:
+    """
+    Mark hours as booked in the RoomDaySlots of a room-day (mask |= bits).
+    Does not commit: it runs in the caller's transaction. The update is a single
+    atomic SQL statement, so concurrent bookings of different hours do not lose bits.
+    
+    Args:
+        session (Session): The database session.
+        room_id (int): The ID of the room.
+        date (date): The booked date.
+        mask (int): The hour bits to set.
+    """
+    if not mask:
+        return
+    queue_slot_patch(session, room_id, date, mask, booked=True)
+    queue_room_event(session, "booked", room_id, date=date.isoformat(), mask=mask)
+    statement = (
+        update(RoomDaySlots)
+        .where(RoomDaySlots.room_id == room_id, RoomDaySlots.date == date)
+        .values(mask=RoomDaySlots.mask.op("|")(mask))
+        .execution_options(synchronize_session="fetch")
+    )
+    if session.execute(statement).rowcount:
+        return
+    # Chưa có dòng cho room-day này: tạo mới, nếu request khác vừa tạo thì cập nhật lại
+    try:
+        with session.begin_nested():
+            session.add(RoomDaySlots(room_id=room_id, date=date, mask=mask))
+    except IntegrityError:
+        session.execute(statement)
+
+def release_room_day_slots(session: Session, room_id: int, date: date, mask: int) -> None:
+    """
+    Mark hours as free in the RoomDaySlots of a room-day (mask &= ~bits).
+    Does not commit: it runs in the caller's transaction.
+    
+    Args:
+        session (Session): The database session.
+        room_id (int): The ID of the room.
+        date (date): The booked date.
+        mask (int): The hour bits to clear.
+    """
+    if not mask:
+        return
+    queue_slot_patch(session, room_id, date, mask, booked=False)
+    queue_room_event(session, "released", room_id, date=date.isoformat(), mask=mask)
+    session.execute(
+        update(RoomDaySlots)
+        .where(RoomDaySlots.room_id == room_id, RoomDaySlots.date == date)
+        .values(mask=RoomDaySlots.mask.op("&")(FULL_DAY_MASK ^ mask))
+        .execution_options(synchronize_session="fetch")
+    )
+
+def get_room_day_mask(session: Session, room_id: int, date: date) -> int:
+    """
+    Return the booked-hours mask of a room-day, 0 if nothing is booked.
+    
+    Args:
+        session (Session): The database session.
+        room_id (int): The ID of the room.
+        date (date): The date to read.
+    
+    Returns:
+        int: The booked-hours mask.
+    """
+    slots = session.get(RoomDaySlots, (room_id, date))
+    return slots.mask if slots else 0
+
+# --- SlotClaim ---
+def claim_slots(session: Session, order_id: int, room_id: int, date: date, mask: int) -> None:
+    """
+    Claim one SlotClaim row per booked hour of an order, inside the caller's transaction.
+    The primary key on (room_id, date, hour) makes a concurrent booking of the same hour fail.
+    
+    Args:
+        session (Session): The database session.
+        order_id (int): The ID of the OrderRoom holding the hours.
+        room_id (int): The ID of the room.
+        date (date): The booked date.
+        mask (int): The booked hours (see hours_mask).
+    
+    Raises:
+        HTTPException: 409 if another order already holds one of the hours.
+    """
+    rows = [
+        {"room_id": room_id, "date": date, "hour": hour, "order_id": order_id}
+        for hour in range(24) if mask >> hour & 1
+    ]
+    if not rows:
+        return
+    try:
+        with session.begin_nested():
+            session.execute(insert(SlotClaim), rows)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Room is already booked at this time")
+
+def release_slots(session: Session, order_id: int) -> None:
+    """
+    Release every SlotClaim row held by an order, inside the caller's transaction.
+    
+    Args:
+        session (Session): The database session.
+        order_id (int): The ID of the OrderRoom.
+    """
+    session.execute(delete(SlotClaim).where(SlotClaim.order_id == order_id))
+
+def rebuild_room_day_slots(session: Session, start_date: Optional[date] = None) -> int:
+    """
+    Rebuild RoomDaySlots and SlotClaim from the non-canceled OrderRoom rows and commit.
+    If old orders overlap, the hour stays with the order that has the smallest ID.
+    
+    Args:
+        session (Session): The database session.
+        start_date (Optional[date]): Only rebuild room-days from this date on (default: all).
+    
+    Returns:
+        int: The number of room-day rows written.
+    """
+    query = (
+        select(OrderRoom.id, OrderRoom.room_id, OrderRoom.date, OrderRoom.begin, OrderRoom.end)
+        .where(OrderRoom.is_cancel == False)
+        .order_by(OrderRoom.id)
+    )
+    clear_slots = delete(RoomDaySlots)
+    clear_claims = delete(SlotClaim)
+    if start_date is not None:
+        query = query.where(OrderRoom.date >= start_date)
+        clear_slots = clear_slots.where(RoomDaySlots.date >= start_date)
+        clear_claims = clear_claims.where(SlotClaim.date >= start_date)
+
+    masks = {}
+    claims = {}
+    for order_id, room_id, order_date, begin, end in session.exec(query):
+        key = (room_id, order_date)
+        mask = hours_mask(begin, end)
+        masks[key] = masks.get(key, 0) | mask
+        for hour in range(24):
+            if mask >> hour & 1:
+                claims.setdefault((room_id, order_date, hour), order_id)
+
+    session.execute(clear_slots)
+    session.execute(clear_claims)
+    session.add_all(
+        RoomDaySlots(room_id=room_id, date=order_date, mask=mask)
+        for (room_id, order_date), mask in masks.items() if mask
+    )
+    if claims:
+        session.execute(insert(SlotClaim), [
+            {"room_id": room_id, "date": order_date, "hour": hour, "order_id": order_id}
+            for (room_id, order_date, hour), order_id in claims.items()
+        ])
+    session.commit()
+    return sum(1 for mask in masks.values() if mask)
+
 # --- OrderRoom ---
 def create_order_room(
     session: Session,
@@ -56,8 +240,13 @@ def create_order_room(
         end=end
     )
     session.add(order_room)
-    session.commit()
-    session.refresh(order_room)
+    session.flush()  # lấy order_room.id cho SlotClaim
+
+    mask = hours_mask(begin, end)
+    claim_slots(session, order_room.id, room_id, date, mask)
+    add_room_day_slots(session, room_id, date, mask)
+    track_order_stats(session, None, order_stats(session, order_room))
+    commit_or_flush(session, order_room)
     return order_room
 
 def get_order_room(session: Session, order_id: int) -> OrderRoom:
@@ -110,6 +299,8 @@ def update_order_room(
     order_room = session.get(OrderRoom, order_id)
     if not order_room:
         raise HTTPException(status_code=404, detail="OrderRoom not found")
+    old_slot = (order_room.room_id, order_room.date, hours_mask(order_room.begin, order_room.end))
+    old_stats = order_stats(session, order_room)
 
     if room_id is not None:
         room = session.get(Room, room_id)
@@ -130,9 +321,17 @@ def update_order_room(
     if end is not None:
         order_room.end = end
 
+    # Chuyển các giờ đã giữ sang slot mới
+    new_slot = (order_room.room_id, order_room.date, hours_mask(order_room.begin, order_room.end))
+    if not order_room.is_cancel and new_slot != old_slot:
+        release_slots(session, order_id)
+        claim_slots(session, order_id, *new_slot)
+        release_room_day_slots(session, *old_slot)
+        add_room_day_slots(session, *new_slot)
+    track_order_stats(session, old_stats, order_stats(session, order_room))
+
     session.add(order_room)
-    session.commit()
-    session.refresh(order_room)
+    commit_or_flush(session, order_room)
     return order_room
 
 def update_state_order_room(session: Session, order_id: int, isused: bool=False, iscancel: bool=True) -> bool:
@@ -155,11 +354,22 @@ def update_state_order_room(session: Session, order_id: int, isused: bool=False,
     if not order_room:
         raise HTTPException(status_code=404, detail="OrderRoom not found")
     
+    old_stats = order_stats(session, order_room)
+    if iscancel != order_room.is_cancel:
+        mask = hours_mask(order_room.begin, order_room.end)
+        if iscancel:
+            release_slots(session, order_id)
+            release_room_day_slots(session, order_room.room_id, order_room.date, mask)
+        else:
+            claim_slots(session, order_id, order_room.room_id, order_room.date, mask)
+            add_room_day_slots(session, order_room.room_id, order_room.date, mask)
+
     order_room.is_used = isused
     order_room.is_cancel = iscancel
+    track_order_stats(session, old_stats, order_stats(session, order_room))
 
     session.add(order_room)
-    session.commit()
+    commit_or_flush(session)
     return True
 
 def return_state_order_room(session: Session, order_id: int) -> int:
@@ -207,8 +417,12 @@ def delete_order_room(session: Session, order_id: int) -> bool:
     if not order_room:
         raise HTTPException(status_code=404, detail="OrderRoom not found")
     
+    if not order_room.is_cancel:
+        release_slots(session, order_id)
+        release_room_day_slots(session, order_room.room_id, order_room.date, hours_mask(order_room.begin, order_room.end))
+    track_order_stats(session, order_stats(session, order_room), None)
     session.delete(order_room)
-    session.commit()
+    commit_or_flush(session)
     return True
 
 def get_all_order_rooms(session: Session, user_id:int ) -> List[OrderRoom]:
@@ -306,6 +520,92 @@ def get_order_rooms_by_filter(
 
     return order_rooms
 
+# --- Calendar feed ---
+CalendarCursor = Tuple[date, time, int]  # (date, begin, id) của sự kiện cuối trang trước
+
+def encode_calendar_cursor(cursor: CalendarCursor) -> str:
+    day, begin, order_id = cursor
+    return f"{day.isoformat()}_{begin.isoformat()}_{order_id}"
+
+def decode_calendar_cursor(value: str) -> CalendarCursor:
+    """
+    Parse a cursor returned by get_calendar_events.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        day, begin, order_id = value.split("_")
+        return date.fromisoformat(day), time.fromisoformat(begin), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def get_calendar_events(
+    session: Session,
+    building_id: int,
+    date_from: date,
+    date_to: date,
+    room_id: Optional[int] = None,
+    after: Optional[CalendarCursor] = None,
+    limit: int = 500
+) -> Tuple[List[dict], Optional[CalendarCursor]]:
+    """
+    Bookings of a building between two dates (any range, across years), ordered by
+    (date, begin, id) and paged with a keyset cursor. Selects only the needed columns,
+    without loading OrderRoom objects. An empty page is not an error.
+
+    Args:
+        session (Session): The database session.
+        building_id (int): The building.
+        date_from (date): First day (included).
+        date_to (date): Last day (included).
+        room_id (Optional[int]): Only this room.
+        after (Optional[CalendarCursor]): Continue after this (date, begin, id).
+        limit (int): Maximum number of events.
+
+    Returns:
+        Tuple[List[dict], Optional[CalendarCursor]]: [{id, room_id, date, begin, end, state}]
+        with state "booked", "used" or "cancelled", and the cursor of the next page (None on the last page).
+
+    Raises:
+        HTTPException: If the date range is invalid.
+    """
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+
+    query = (
+        select(OrderRoom.id, OrderRoom.room_id, OrderRoom.date, OrderRoom.begin, OrderRoom.end,
+               OrderRoom.is_used, OrderRoom.is_cancel)
+        .join(Room, Room.id == OrderRoom.room_id)
+        .where(Room.building_id == building_id, OrderRoom.date >= date_from, OrderRoom.date <= date_to)
+        .order_by(OrderRoom.date, OrderRoom.begin, OrderRoom.id)
+        .limit(limit + 1)
+    )
+    if room_id is not None:
+        query = query.where(OrderRoom.room_id == room_id)
+    if after is not None:
+        day, begin, order_id = after
+        query = query.where(or_(
+            OrderRoom.date > day,
+            and_(OrderRoom.date == day, or_(
+                OrderRoom.begin > begin,
+                and_(OrderRoom.begin == begin, OrderRoom.id > order_id),
+            )),
+        ))
+
+    rows = session.exec(query).all()
+    events = [
+        {"id": order_id, "room_id": event_room_id, "date": day, "begin": begin, "end": end,
+         # Đơn đã check-in rồi trả phòng cũng có is_cancel: vẫn tính là đã dùng
+         "state": "used" if is_used else "cancelled" if is_cancel else "booked"}
+        for order_id, event_room_id, day, begin, end, is_used, is_cancel in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = events[-1]
+        next_cursor = (last["date"], last["begin"], last["id"])
+    return events, next_cursor
+
 
 def find_order_for_checkin(
     session: Session,
@@ -521,6 +821,7 @@ def check_room_availability(
     """
     Check if a room is available for a given time range on a specific date.
     Returns True if no OrderRoom exists that overlaps with the provided time range.
+    The check is a bitwise AND against the RoomDaySlots mask of the room-day.
     
     Args:
         session (Session): The database session.
@@ -543,7 +844,11 @@ def check_room_availability(
     if not room:
         raise HTTPException(status_code=404, detail=f"Room with ID {room_id} not found")
 
-    # Tìm các OrderRoom có thời gian trùng lặp
+    requested = hours_mask(start_time, end_time)
+    if requested:
+        return not (get_room_day_mask(session, room_id, date) & requested)
+
+    # Khoảng thời gian rỗng không biểu diễn được bằng bitmap, kiểm tra trực tiếp trên OrderRoom
     query = (
         select(OrderRoom)
         .where(OrderRoom.room_id == room_id)
@@ -559,41 +864,360 @@ def check_room_availability(
     # Nếu không có OrderRoom nào trùng, phòng trống
     return not conflicting_order
 
+def search_available_rooms(
+    session: Session,
+    date: date,
+    start_time: time,
+    end_time: time,
+    branch_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    type_id: Optional[int] = None,
+    limit: int = 0
+) -> Tuple[List[Room], int]:
+    """
+    Find the active rooms matching the filters that are free on a date for a time range.
+    Uses the same rule as check_room_availability, but answers for every room at once
+    by joining the RoomDaySlots masks instead of running one query per room.
+    When the in-memory availability matrix is enabled and covers the date, the
+    free rooms are computed from it and only the returned rooms are loaded.
+    If limit is 0, return all available rooms.
+
+    Args:
+        session (Session): The database session.
+        date (date): The date to check availability for.
+        start_time (time): The start time of the time range.
+        end_time (time): The end time of the time range.
+        branch_id (Optional[int]): Filter by branch ID.
+        building_id (Optional[int]): Filter by building ID.
+        type_id (Optional[int]): Filter by room type ID.
+        limit (int): Maximum number of rooms to return (default: 0, meaning no limit).
+
+    Returns:
+        Tuple[List[Room], int]: The available rooms (ordered by ID, cut at limit)
+                                and the total number of available rooms.
+
+    Raises:
+        HTTPException: If required fields are missing or no rooms match the filters.
+    """
+    if not date or not start_time or not end_time:
+        raise HTTPException(status_code=400, detail="Date, start time, and end time are required")
+
+    # Điều kiện lọc phòng, giống filter_rooms
+    room_filters = [Room.active == True]
+    if branch_id:
+        room_filters.append(Room.branch_id == branch_id)
+    if building_id:
+        room_filters.append(Room.building_id == building_id)
+    if type_id:
+        room_filters.append(Room.type_id == type_id)
+
+    requested = hours_mask(start_time, end_time)
+
+    if availability_matrix.is_stale():
+        availability_matrix.load(session.get_bind())
+    from_matrix = availability_matrix.search(date, requested, branch_id, building_id, type_id, limit)
+    if from_matrix is not None:
+        room_ids, total_rooms, total_available = from_matrix
+        if not total_rooms:
+            raise HTTPException(status_code=404, detail="No rooms found with the given filters")
+        if not room_ids:
+            return [], 0
+        rooms = session.exec(select(Room).where(Room.id.in_(room_ids)).order_by(Room.id)).all()
+        return rooms, total_available
+
+    if requested:
+        # Phòng trống nếu bitmap của room-day không giao với các giờ yêu cầu
+        available = func.coalesce(RoomDaySlots.mask, 0).op("&")(requested) == 0
+    else:
+        # Khoảng thời gian rỗng: dùng điều kiện giao nhau trên OrderRoom như check_room_availability
+        available = ~exists().where(
+            OrderRoom.room_id == Room.id,
+            OrderRoom.date == date,
+            OrderRoom.is_cancel == False,
+            OrderRoom.begin < end_time,
+            OrderRoom.end > start_time
+        )
+    slots_join = and_(RoomDaySlots.room_id == Room.id, RoomDaySlots.date == date)
+
+    # Đếm tổng số phòng và số phòng trống trong cùng một query
+    total_rooms, total_available = session.exec(
+        select(
+            func.count(Room.id),
+            func.coalesce(func.sum(case((available, 1), else_=0)), 0)
+        ).select_from(Room).outerjoin(RoomDaySlots, slots_join).where(*room_filters)
+    ).one()
+
+    if not total_rooms:
+        raise HTTPException(status_code=404, detail="No rooms found with the given filters")
+    if not total_available:
+        return [], 0
+
+    query = (
+        select(Room)
+        .outerjoin(RoomDaySlots, slots_join)
+        .where(*room_filters)
+        .where(available)
+        .order_by(Room.id)
+    )
+    if limit > 0:
+        query = query.limit(limit)
+    rooms = session.exec(query).all()
+
+    return rooms, int(total_available)
+
+# --- Free slot finder ---
+BOOKING_LEAD = timedelta(minutes=50)  # giống /orderroom: đặt trước ít nhất 50 phút
+
+def _first_free_run(mask: int, duration: int, first_hour: int) -> Optional[Tuple[int, int]]:
+    if first_hour + duration > settings.BOOKING_CLOSE_HOUR:
+        return None
+    # Bit h của free: giờ h còn trống trong giờ đặt phòng và không sớm hơn first_hour
+    free = ~mask & hours_mask(time(max(first_hour, settings.BOOKING_OPEN_HOUR)), time(settings.BOOKING_CLOSE_HOUR))
+    runs = free
+    for _ in range(duration - 1):
+        runs &= runs >> 1  # bit h còn lại: các giờ h..h+duration-1 đều trống
+    if not runs:
+        return None
+    start = (runs & -runs).bit_length() - 1
+    end = start + duration
+    while free >> end & 1:
+        end += 1
+    return start, end
+
+def find_free_slots(
+    session: Session,
+    duration: int,
+    date_from: date,
+    date_to: date,
+    branch_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    type_id: Optional[int] = None,
+    limit: int = 10,
+    now: Optional[datetime] = None
+) -> List[dict]:
+    """
+    Find the earliest bookable windows of `duration` hours between date_from and date_to.
+    Reads the RoomDaySlots masks of every matching room in one query ordered by date and room,
+    then finds the first free run of each room-day with bit operations on the mask
+    (same rule as check_room_availability). Each room-day gives at most one candidate, its earliest start.
+
+    Args:
+        session (Session): The database session.
+        duration (int): Length of the booking in hours.
+        date_from (date): First day to search (days before today are skipped).
+        date_to (date): Last day to search.
+        branch_id (Optional[int]): Filter by branch ID.
+        building_id (Optional[int]): Filter by building ID.
+        type_id (Optional[int]): Filter by room type ID.
+        limit (int): Maximum number of candidates.
+        now (Optional[datetime]): Current time (default: now), for the 50-minute booking lead.
+
+    Returns:
+        List[dict]: [{room_id, no_room, branch_id, building_id, type_id, date, start_time, end_time, free_until}]
+                    ordered by date, start time and room ID.
+
+    Raises:
+        HTTPException: If the duration or the date range is invalid, or no rooms match the filters.
+    """
+    longest = settings.BOOKING_CLOSE_HOUR - settings.BOOKING_OPEN_HOUR
+    if duration < 1 or duration > longest:
+        raise HTTPException(status_code=400, detail=f"Duration must be between 1 and {longest} hours")
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+
+    # Điều kiện lọc phòng như search_available_rooms, bỏ thư viện (không đặt trước được)
+    room_filters = [
+        Room.active == True,
+        Room.type_id.not_in(select(RoomType.id).where(RoomType.type_name == "Library")),
+    ]
+    if branch_id:
+        room_filters.append(Room.branch_id == branch_id)
+    if building_id:
+        room_filters.append(Room.building_id == building_id)
+    if type_id:
+        room_filters.append(Room.type_id == type_id)
+    rooms = session.exec(
+        select(Room.id, Room.no_room, Room.branch_id, Room.building_id, Room.type_id)
+        .where(*room_filters)
+        .order_by(Room.id)
+    ).all()
+    if not rooms:
+        raise HTTPException(status_code=404, detail="No rooms found with the given filters")
+
+    earliest = (now or datetime.now()) + BOOKING_LEAD
+    date_from = max(date_from, earliest.date())
+    masks = {}
+    for day, room_id, mask in session.exec(
+        select(RoomDaySlots.date, RoomDaySlots.room_id, RoomDaySlots.mask)
+        .join(Room, Room.id == RoomDaySlots.room_id)
+        .where(RoomDaySlots.date >= date_from, RoomDaySlots.date <= date_to, RoomDaySlots.mask != 0, *room_filters)
+        .order_by(RoomDaySlots.date, RoomDaySlots.room_id)
+    ):
+        masks.setdefault(day, {})[room_id] = mask
+
+    slots = []
+    day = date_from
+    while day <= date_to and len(slots) < limit:
+        first_hour = settings.BOOKING_OPEN_HOUR
+        if day == earliest.date():
+            first_hour = earliest.hour + (1 if (earliest.minute or earliest.second or earliest.microsecond) else 0)
+        day_masks = masks.get(day, {})
+        candidates = []
+        for room_id, no_room, room_branch_id, room_building_id, room_type_id in rooms:
+            run = _first_free_run(day_masks.get(room_id, 0), duration, first_hour)
+            if run is None:
+                continue
+            start, free_until = run
+            candidates.append({
+                "room_id": room_id, "no_room": no_room, "branch_id": room_branch_id,
+                "building_id": room_building_id, "type_id": room_type_id, "date": day,
+                "start_time": start, "end_time": start + duration, "free_until": free_until,
+            })
+        candidates.sort(key=lambda slot: (slot["start_time"], slot["room_id"]))
+        slots.extend(candidates[:limit - len(slots)])
+        day += timedelta(days=1)
+    return slots
+
+# --- Batch availability ---
+AVAILABILITY_RANGE_GAP = timedelta(days=7)  # các ngày cách nhau xa hơn: tách thành query riêng
+
+def check_availability_batch(
+    session: Session,
+    cells: List[Tuple[int, date, int, int]]
+) -> Tuple[List[dict], List[bool]]:
+    """
+    Check many (room, date, start hour, end hour) cells at once against RoomDaySlots
+    (same rule as check_room_availability). The requested dates are split into ranges
+    (a new range starts after a gap of more than AVAILABILITY_RANGE_GAP) and each range
+    is read with one query over all the requested rooms.
+
+    Args:
+        session (Session): The database session.
+        cells (List[Tuple[int, date, int, int]]): (room_id, date, start_hour, end_hour), 0 <= start < end <= 24.
+
+    Returns:
+        Tuple[List[dict], List[bool]]: The booked-hours mask of every requested room-day
+        ([{room_id, date, mask}] ordered by room and date; bit h set = hour h booked)
+        and, for each cell in order, whether it is free.
+
+    Raises:
+        HTTPException: If there are too many cells, an hour range is invalid or a room is not found.
+    """
+    if len(cells) > MAX_AVAILABILITY_CELLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_AVAILABILITY_CELLS} cells per request")
+    for _, _, start_hour, end_hour in cells:
+        if not 0 <= start_hour < end_hour <= 24:
+            raise HTTPException(status_code=400, detail="Start time must be before end time")
+    if not cells:
+        return [], []
+
+    room_days = {(room_id, day) for room_id, day, _, _ in cells}
+    room_ids = sorted({room_id for room_id, _ in room_days})
+    found = set(session.exec(select(Room.id).where(Room.id.in_(room_ids))).all())
+    missing = [room_id for room_id in room_ids if room_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Rooms not found: {', '.join(map(str, missing))}")
+
+    # Gom các ngày liên tiếp (cách nhau <= AVAILABILITY_RANGE_GAP) thành các khoảng
+    ranges = []
+    for day in sorted({day for _, day in room_days}):
+        if ranges and day - ranges[-1][1] <= AVAILABILITY_RANGE_GAP:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+
+    masks = dict.fromkeys(room_days, 0)
+    for first_day, last_day in ranges:
+        for room_id, day, mask in session.exec(
+            select(RoomDaySlots.room_id, RoomDaySlots.date, RoomDaySlots.mask)
+            .where(RoomDaySlots.room_id.in_(room_ids),
+                   RoomDaySlots.date >= first_day, RoomDaySlots.date <= last_day)
+        ):
+            if (room_id, day) in masks:
+                masks[(room_id, day)] = mask
+
+    free = [
+        not masks[(room_id, day)] & (((1 << end_hour) - 1) ^ ((1 << start_hour) - 1))
+        for room_id, day, start_hour, end_hour in cells
+    ]
+    days = [{"room_id": room_id, "date": day, "mask": mask} for (room_id, day), mask in sorted(masks.items())]
+    return days, free
+
 # ---checkin checkout library ---
 
-def checkin_library(session: Session, room_id:int) -> bool:
-    if not room_id:
-        raise HTTPException(status_code=400, detail="Room ID is required")
+def _change_library_quantity(session: Session, room_id: int, delta: int) -> Optional[int]:
+    # 1 câu UPDATE có điều kiện: không đọc-rồi-ghi nên không mất lượt khi nhiều người quét cùng lúc
+    is_library = Room.type_id.in_(select(RoomType.id).where(RoomType.type_name == "Library"))
+    room_filter = (Room.quantity < Room.max_quantity) if delta > 0 else (Room.quantity > 0)
+    statement = (
+        update(Room)
+        .where(Room.id == room_id, is_library, room_filter)
+        .values(quantity=Room.quantity + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if session.get_bind().dialect.update_returning:
+        return session.execute(statement.returning(Room.quantity)).scalar_one_or_none()
+    # MySQL không có UPDATE ... RETURNING: dòng đã bị khóa bởi UPDATE tới khi commit,
+    # nên đọc lại trong cùng transaction vẫn ra đúng giá trị vừa ghi
+    if session.execute(statement).rowcount != 1:
+        return None
+    return session.execute(select(Room.quantity).where(Room.id == room_id)).scalar_one()
+
+def _library_error(session: Session, room_id: int) -> HTTPException:
+    # Chỉ chạy khi UPDATE không khớp dòng nào, để báo đúng lý do
     room = session.get(Room, room_id)
     if not room:
-        raise HTTPException(status_code=404, detail=f"Room with ID {room_id} not found")
-    
+        return HTTPException(status_code=404, detail=f"Room with ID {room_id} not found")
     if not check_library(session=session, room_id=room_id):
-        raise HTTPException(status_code=400, detail="Room is not a library room")
-    
-    if room.quantity > room.max_quantity:
-        raise HTTPException(status_code=400, detail="Library is not available now")
-    
-    update_room(session, room_id, quantity=room.quantity+1)
-    return True
+        return HTTPException(status_code=400, detail="Room is not a library room")
+    return HTTPException(status_code=400, detail="Library is not available now")
+
+def checkin_library(session: Session, room_id:int) -> int:
+    """
+    Count one more student in a library room, atomically and only while it is not full.
+
+    Args:
+        session (Session): The database session.
+        room_id (int): The ID of the library room.
+
+    Returns:
+        int: The new occupancy of the room.
 
+    Raises:
+        HTTPException: 404 if the room does not exist, 400 if it is not a library or is full.
+    """
+    if not room_id:
+        raise HTTPException(status_code=400, detail="Room ID is required")
+    quantity = _change_library_quantity(session, room_id, 1)
+    if quantity is None:
+        raise _library_error(session, room_id)
+    queue_room_event(session, "library", room_id, quantity=quantity)
+    commit_or_flush(session)
+    return quantity
+
+def checkout_library(session: Session, room_id:int) -> int:
+    """
+    Count one student out of a library room, atomically and never below zero.
+
+    Args:
+        session (Session): The database session.
+        room_id (int): The ID of the library room.
 
+    Returns:
+        int: The new occupancy of the room.
 
-def checkout_library(session: Session, room_id:int) -> bool:
+    Raises:
+        HTTPException: 404 if the room does not exist, 400 if it is not a library or is empty.
+    """
     if not room_id:
         raise HTTPException(status_code=400, detail="Room ID is required")
-    room = session.get(Room, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail=f"Room with ID {room_id} not found")
-    
-    if not check_library(session=session, room_id=room_id):
-        raise HTTPException(status_code=400, detail="Room is not a library room")
-    
-    if room.quantity <= 0:
-        raise HTTPException(status_code=400, detail="Library is not available now")
-    
-    update_room(session, room_id, quantity=room.quantity-1)
-    return True
+    quantity = _change_library_quantity(session, room_id, -1)
+    if quantity is None:
+        raise _library_error(session, room_id)
+    queue_room_event(session, "library", room_id, quantity=quantity)
+    commit_or_flush(session)
+    return quantity
+
 # --- CancelRoom ---
 
 def create_cancel_room(
@@ -637,8 +1261,7 @@ def create_cancel_room(
         date_cancel=date_cancel
     )
     session.add(cancel_room)
-    session.commit()
-    session.refresh(cancel_room)
+    commit_or_flush(session, cancel_room)
     return cancel_room
 
 def get_cancel_room(session: Session, cancel_id: int) -> CancelRoom:
@@ -703,8 +1326,7 @@ def update_cancel_room(
         cancel_room.date_cancel = date_cancel
 
     session.add(cancel_room)
-    session.commit()
-    session.refresh(cancel_room)
+    commit_or_flush(session, cancel_room)
     return cancel_room
 
 def delete_cancel_room(session: Session, cancel_id: int) -> bool:
@@ -726,7 +1348,7 @@ def delete_cancel_room(session: Session, cancel_id: int) -> bool:
         raise HTTPException(status_code=404, detail="CancelRoom not found")
     
     session.delete(cancel_room)
-    session.commit()
+    commit_or_flush(session)
     return True
 
 def get_all_cancel_rooms(session: Session) -> List[CancelRoom]:
@@ -812,6 +1434,112 @@ def check_order_cancel(session: Session, order_id: int) -> bool:
 
 
 
+# --- ActiveSession ---
+
+def start_active_session(
+    session: Session,
+    user_id: int,
+    room_id: int,
+    order_id: int|None = None,
+    started_at: datetime|None = None
+) -> ActiveSession:
+    """
+    Check a user into a room: create their ActiveSession.
+    
+    Args:
+        session (Session): The database session.
+        user_id (int): The ID of the user.
+        room_id (int): The ID of the room.
+        order_id (int|None): The ID of the OrderRoom (None for a library).
+        started_at (datetime|None): Check-in time (default: now).
+    
+    Returns:
+        ActiveSession: The new session.
+    
+    Raises:
+        HTTPException: If the user is already checked in a room.
+    """
+    # Với write-behind, check-in thư viện có thể chưa được ghi xuống DB
+    if session.get(ActiveSession, user_id) or (library_occupancy.enabled and library_occupancy.active_room(user_id)):
+        raise HTTPException(status_code=400, detail="You have already checked in a room")
+    active = ActiveSession(
+        user_id=user_id,
+        room_id=room_id,
+        order_id=order_id,
+        started_at=started_at or datetime.now()
+    )
+    session.add(active)
+    try:
+        _queue_occupancy_event(session, room_id)
+        commit_or_flush(session, active)
+    except IntegrityError:
+        # Hai lần check-in đồng thời của cùng user: khóa chính user_id chặn lần thứ hai
+        session.rollback()
+        raise HTTPException(status_code=400, detail="You have already checked in a room")
+    return active
+
+def _queue_occupancy_event(session: Session, room_id: int) -> None:
+    # Chỉ đếm khi có thể có admin đang nghe kênh trạng thái phòng
+    if room_events.recording:
+        session.flush()
+        occupants = session.exec(
+            select(func.count()).select_from(ActiveSession).where(ActiveSession.room_id == room_id)
+        ).one()
+        queue_room_event(session, "occupancy", room_id, occupants=occupants)
+
+def get_active_session(session: Session, user_id: int) -> ActiveSession:
+    """
+    Return the room the user is in right now (primary-key read).
+    
+    Raises:
+        HTTPException: If the user has not checked in any room.
+    """
+    active = session.get(ActiveSession, user_id)
+    if not active:
+        raise HTTPException(status_code=404, detail="You have not checked in any room")
+    return active
+
+def end_active_session(session: Session, user_id: int, ended_at: datetime|None = None) -> UsedRoom:
+    """
+    Check a user out: move their ActiveSession into UsedRoom and link the reports
+    they filed during the session to it.
+    
+    Args:
+        session (Session): The database session.
+        user_id (int): The ID of the user.
+        ended_at (datetime|None): Check-out time (default: now).
+    
+    Returns:
+        UsedRoom: The finished session.
+    
+    Raises:
+        HTTPException: If the user has not checked in any room.
+    """
+    active = get_active_session(session, user_id)
+    ended_at = ended_at or datetime.now()
+    if ended_at <= active.started_at:
+        raise HTTPException(status_code=400, detail="Check-in time must be before check-out time")
+    used_room = UsedRoom(
+        order_id=active.order_id,
+        user_id=user_id,
+        room_id=active.room_id,
+        date=active.started_at.date(),
+        checkin=active.started_at.time(),
+        checkout=ended_at.time(),
+        checkout_date=ended_at.date()
+    )
+    session.add(used_room)
+    session.delete(active)
+    session.flush()
+    _queue_occupancy_event(session, used_room.room_id)
+    session.execute(
+        update(Report)
+        .where(Report.user_id == user_id, Report.room_id == used_room.room_id, Report.used_room_id.is_(None))
+        .values(used_room_id=used_room.id)
+    )
+    commit_or_flush(session, used_room)
+    return used_room
+
 # --- UsedRoom ---
 
 def create_used_room(
@@ -821,10 +1549,12 @@ def create_used_room(
     room_id: int,
     date: date,
     checkin: time,
-    checkout: time =time(23, 59, 59)
+    checkout: time,
+    checkout_date: date|None = None
 ) -> UsedRoom:
     """
-    Create a new UsedRoom entry for a room usage record.
+    Create a new UsedRoom entry for a finished room usage
+    (rooms in use are ActiveSession rows, see start_active_session).
     
     Args:
         session (Session): The database session.
@@ -834,6 +1564,7 @@ def create_used_room(
         date (date): The date of usage.
         checkin (time): The check-in time.
         checkout (time): The check-out time.
+        checkout_date (date|None): The check-out date if it is not `date`.
     
     Returns:
         UsedRoom: The newly created UsedRoom object.
@@ -870,11 +1601,11 @@ def create_used_room(
         room_id=room_id,
         date=date,
         checkin=checkin,
-        checkout=checkout
+        checkout=checkout,
+        checkout_date=checkout_date
     )
     session.add(used_room)
-    session.commit()
-    session.refresh(used_room)
+    commit_or_flush(session, used_room)
     return used_room
 
 def get_used_room(session: Session, used_room_id: int) -> UsedRoom:
@@ -1013,8 +1744,7 @@ def update_used_room(
             raise HTTPException(status_code=400, detail="Check-in time must be before check-out time")
 
     session.add(used_room)
-    session.commit()
-    session.refresh(used_room)
+    commit_or_flush(session, used_room)
     return used_room
 
 def delete_used_room(session: Session, used_room_id: int) -> bool:
@@ -1036,7 +1766,7 @@ def delete_used_room(session: Session, used_room_id: int) -> bool:
         raise HTTPException(status_code=404, detail="UsedRoom not found")
     
     session.delete(used_room)
-    session.commit()
+    commit_or_flush(session)
     return True
 
 def get_used_room_by_order_id(session: Session, order_id: int) -> UsedRoom:
@@ -1101,27 +1831,19 @@ def get_used_room_by_user_id(session: Session, user_id: int) -> List[UsedRoom]:
 #         raise HTTPException(status_code=404, detail="No UsedRooms found for this user")
 #     return used_rooms
 
-def get_used_room_being_used_by_user_id(session: Session, user_id: int) -> UsedRoom:
-    used_room = session.exec(
-        select(UsedRoom)
-        .where(UsedRoom.user_id == user_id)
-        .where(UsedRoom.checkout == time(23, 59, 59))
-        .where(UsedRoom.date == date.today())  # Thêm điều kiện ngày
-    ).first()
-    if not used_room:
-        raise HTTPException(status_code=404, detail="No UsedRooms found for this user")
-    return used_room
-    
+
 def check_using_room_by_used_room_id(session: Session, used_room_id: int) -> bool:
     """
     Check if a UsedRoom entry is being used by used_room_id.
+    UsedRoom rows are written at check-out, so they are never in use
+    (rooms in use are ActiveSession rows).
     
     Args:
         session (Session): The database session.
         used_room_id (int): The ID of the UsedRoom to check.
     
     Returns:
-        bool: True if the UsedRoom has been used, False otherwise.
+        bool: Always False.
     
     Raises:
         HTTPException: If the UsedRoom is not found.
@@ -1130,36 +1852,93 @@ def check_using_room_by_used_room_id(session: Session, used_room_id: int) -> boo
     if not used_room:
         raise HTTPException(status_code=404, detail="UsedRoom not found")
     
-    if used_room.checkout is time(23, 59, 59):
-        return True
-    
     return False
 
 def get_rooms_being_used(session: Session) -> List[Room]:
     """
-    Retrieve all UsedRoom entries that are currently being used.
+    Retrieve the rooms that someone is checked in right now (from ActiveSession).
     
     Args:
         session (Session): The database session.
     
     Returns:
-        List[UsedRoom]: A list of UsedRoom objects that are currently being used.
+        List[Room]: The rooms currently in use.
     
     Raises:
-        HTTPException: If no UsedRooms are found.
+        HTTPException: If no room is in use.
     """
-    used_rooms = session.exec(select(UsedRoom).where(UsedRoom.checkout == time(23, 59, 59))).all()
-    if not used_rooms:
+    rooms = session.exec(
+        select(Room).where(Room.id.in_(select(ActiveSession.room_id).distinct()))
+    ).all()
+    if not rooms:
         raise HTTPException(status_code=404, detail="No UsedRooms found")
-    order_id = [used_room.order_id for used_room in used_rooms]
-    if not order_id:
-        raise HTTPException(status_code=404, detail="No OrderRooms found")
-    order_rooms = [session.get(OrderRoom, order_id) for order_id in order_id]
-    if not order_rooms:
-        raise HTTPException(status_code=404, detail="No OrderRooms found")
-    rooms=[session.get(Room, order_room.room_id) for order_room in order_rooms]
     return rooms
 
+def get_room_occupancy(
+    session: Session,
+    branch_id: int|None = None,
+    building_id: int|None = None,
+    in_use: bool = False
+) -> List[dict]:
+    """
+    Retrieve every room with the users checked in it right now, grouped by branch and building,
+    with one query (Room joined to Branch/Building/RoomType, outer-joined to ActiveSession/User).
+    
+    Args:
+        session (Session): The database session.
+        branch_id (int|None): Only rooms of this branch.
+        building_id (int|None): Only rooms of this building.
+        in_use (bool): Only rooms with at least one user checked in.
+    
+    Returns:
+        List[dict]: [{branch_id, branch_name, buildings: [{building_id, building_name,
+        rooms: [{room_id, no_room, type_name, active, max_quantity, quantity, occupants: [...]}]}]}].
+        An empty list when nothing matches.
+    """
+    query = (
+        select(
+            Branch.id, Branch.branch_name, Building.id, Building.building_name,
+            Room.id, Room.no_room, Room.active, Room.max_quantity, Room.quantity, RoomType.type_name,
+            ActiveSession.user_id, ActiveSession.order_id, ActiveSession.started_at,
+            User.MSSV, User.lastname, User.firstname
+        )
+        .join(Branch, Branch.id == Room.branch_id)
+        .join(Building, Building.id == Room.building_id)
+        .join(RoomType, RoomType.id == Room.type_id)
+        .join(ActiveSession, ActiveSession.room_id == Room.id, isouter=not in_use)
+        .join(User, User.id == ActiveSession.user_id, isouter=not in_use)
+        .order_by(Branch.id, Building.id, Room.no_room, Room.id, ActiveSession.started_at)
+    )
+    if branch_id is not None:
+        query = query.where(Room.branch_id == branch_id)
+    if building_id is not None:
+        query = query.where(Room.building_id == building_id)
+
+    # Kết quả đã sắp theo branch -> building -> room: gom nhóm trong 1 lượt
+    branches: List[dict] = []
+    building = room = None
+    for (branch_key, branch_name, building_key, building_name, room_id, no_room, active, max_quantity,
+         quantity, type_name, user_id, order_id, started_at, mssv, lastname, firstname) in session.exec(query):
+        if not branches or branches[-1]["branch_id"] != branch_key:
+            branches.append({"branch_id": branch_key, "branch_name": branch_name, "buildings": []})
+            building = None
+        if building is None or building["building_id"] != building_key:
+            building = {"building_id": building_key, "building_name": building_name, "rooms": []}
+            branches[-1]["buildings"].append(building)
+            room = None
+        if room is None or room["room_id"] != room_id:
+            # Thư viện khi bật write-behind: số người trong bộ nhớ mới hơn DB
+            memory = library_occupancy.quantity(room_id) if library_occupancy.enabled else None
+            if memory is not None:
+                quantity = memory
+            room = {"room_id": room_id, "no_room": no_room, "type_name": type_name, "active": active,
+                    "max_quantity": max_quantity, "quantity": quantity, "occupants": []}
+            building["rooms"].append(room)
+        if user_id is not None:
+            room["occupants"].append({"user_id": user_id, "MSSV": mssv, "lastname": lastname, "firstname": firstname,
+                                      "order_id": order_id, "started_at": started_at})
+    return branches
+
 def get_all_used_rooms(session: Session) -> List[UsedRoom]:
     """
     Retrieve all UsedRoom entries.
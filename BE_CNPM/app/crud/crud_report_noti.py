@@ -89,9 +89,9 @@ async def delete_notification(db: Session, notification_id: int) -> dict:
     return {"message": "Notification deleted successfully"}
 
 # ------------------- Report CRUD -------------------
-async def create_report(
+def create_report(
     db: Session,
-    used_room_id: int,
+    used_room_id: int | None,
     user_id: int,
     room_id: int,
     led: bool = False,
@@ -103,15 +103,17 @@ async def create_report(
     description: str | None = None
 ) -> Report:
     # Verify foreign keys exist
-    used_room = await db.get(UsedRoom, used_room_id)
-    if not used_room:
-        raise HTTPException(status_code=404, detail="UsedRoom not found")
+    # None: báo cáo lúc đang ở phòng, gắn UsedRoom khi check-out
+    if used_room_id is not None:
+        used_room = db.get(UsedRoom, used_room_id)
+        if not used_room:
+            raise HTTPException(status_code=404, detail="UsedRoom not found")
     
-    user = await db.get(User, user_id)
+    user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    room = await db.get(Room, room_id)
+    room = db.get(Room, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -130,19 +132,19 @@ async def create_report(
     )
     
     db.add(db_report)
-    await db.commit()
-    await db.refresh(db_report)
+    db.commit()
+    db.refresh(db_report)
     return db_report
 
 
-async def get_report(db: Session, report_id: int) -> Report:
-    report = await db.get(Report, report_id)
+def get_report(db: Session, report_id: int) -> Report:
+    report = db.get(Report, report_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
     return report
 
 
-async def get_reports(
+def get_reports(
     db: Session,
     user_id: int | None = None,
     room_id: int | None = None,
@@ -156,12 +158,12 @@ async def get_reports(
         statement = statement.where(Report.room_id == room_id)
     
     statement = statement.offset(skip).limit(limit)
-    results = await db.exec(statement)
+    results = db.exec(statement)
     reports = results.all()
     return reports
 
 
-async def update_report(
+def update_report(
     db: Session,
     report_id: int,
     led: bool | None = None,
@@ -172,7 +174,7 @@ async def update_report(
     online_meeting_devices: bool | None = None,
     description: str | None = None
 ) -> Report:
-    db_report = await db.get(Report, report_id)
+    db_report = db.get(Report, report_id)
     if not db_report:
         raise HTTPException(status_code=404, detail="Report not found")
     
@@ -192,15 +194,15 @@ async def update_report(
         db_report.description = description
     
     db.add(db_report)
-    await db.commit()
-    await db.refresh(db_report)
+    db.commit()
+    db.refresh(db_report)
     return db_report
 
-async def delete_report(db: Session, report_id: int) -> dict:
-    db_report = await db.get(Report, report_id)
+def delete_report(db: Session, report_id: int) -> dict:
+    db_report = db.get(Report, report_id)
     if not db_report:
         raise HTTPException(status_code=404, detail="Report not found")
     
-    await db.delete(db_report)
-    await db.commit()
+    db.delete(db_report)
+    db.commit()
     return {"message": "Report deleted successfully"}
\ No newline at end of file
@@ -3,6 +3,10 @@ from sqlmodel import Session, select
 from app.model import Branch, Building, RoomType, Room, RoomDevice
 from fastapi import HTTPException
 from typing import Optional, List
+from app.cores.availability import queue_rooms_changed
+from app.cores.library_occupancy import library_occupancy, queue_library_room_update, queue_library_room_removed
+from app.crud.crud_stats import move_room_stats
+from app.crud.unit_of_work import commit_or_flush
 
 # --- Branch ---
 def create_branch(session: Session, Branch_name: str) -> Branch:
@@ -25,8 +29,7 @@ def create_branch(session: Session, Branch_name: str) -> Branch:
    
     branch = Branch(branch_name=Branch_name)
     session.add(branch)
-    session.commit()
-    session.refresh(branch)
+    commit_or_flush(session, branch)
 
     return branch
 
@@ -78,8 +81,7 @@ def update_branch(session: Session, branch_id: int, branch_name_new: str) -> Bra
         raise HTTPException(status_code=404, detail="Branch not found")
     branch.branch_name = branch_name_new
     session.add(branch)
-    session.commit()
-    session.refresh(branch)
+    commit_or_flush(session, branch)
     return branch
 
 def delete_branch(session: Session, branch_id: int, branch_name: str|None) -> bool:
@@ -101,7 +103,7 @@ def delete_branch(session: Session, branch_id: int, branch_name: str|None) -> bo
     if not branch:
         raise HTTPException(status_code=404, detail="Branch not found")
     session.delete(branch)
-    session.commit()
+    commit_or_flush(session)
     return True
 
 def get_all_branches(session: Session) -> List[Branch]:
@@ -150,8 +152,7 @@ def create_building(session: Session, building_name: str, branch_id: int|None, b
     
     building = Building(building_name=building_name, branch_id=branch.id)
     session.add(building)
-    session.commit()
-    session.refresh(building)
+    commit_or_flush(session, building)
     return building
 
 def get_building(session: Session, building_id: int|None, buiding_name:str|None) -> Building:
@@ -233,8 +234,7 @@ def update_building(session: Session, building_id: int, building_name: Optional[
         building.building_name = building_name
     if branch_id:
         building.branch_id = branch_id
-    session.commit()
-    session.refresh(building)
+    commit_or_flush(session, building)
     return building
 
 def delete_building(session: Session, building_id: int):
@@ -252,7 +252,7 @@ def delete_building(session: Session, building_id: int):
     if not building:
         raise HTTPException(status_code=404, detail="Building not found")
     session.delete(building)
-    session.commit()
+    commit_or_flush(session)
 
 # --- RoomType ---
 def create_room_type(session: Session, room_type: str, max_capacity: int|None) -> RoomType:
@@ -275,8 +275,7 @@ def create_room_type(session: Session, room_type: str, max_capacity: int|None) -
         raise HTTPException(status_code=400, detail="RoomType already exists")
     room_type = RoomType(type_name=room_type, max_capacity=max_capacity)
     session.add(room_type)
-    session.commit()
-    session.refresh(room_type)
+    commit_or_flush(session, room_type)
     return room_type
 
 def get_room_type(session: Session, type_id: int|None, room_type: str|None) -> RoomType:
@@ -328,7 +327,7 @@ def delete_room_type(session: Session, type_id: int|None, room_type: str|None):
     if not room_type:
         raise HTTPException(status_code=404, detail="RoomType not found")
     session.delete(room_type)
-    session.commit()
+    commit_or_flush(session)
 
 def get_all_rt(session: Session) -> List[RoomType]:
     """
@@ -389,8 +388,7 @@ def create_room_device(session: Session,
         online_meeting_devices=online_meeting_devicese
     )
     session.add(room_device)
-    session.commit()
-    session.refresh(room_device)
+    commit_or_flush(session, room_device)
     return room_device
 
 def get_room_device(session: Session, room_id: int|None, room_name: str|None) -> RoomDevice:
@@ -483,8 +481,7 @@ def update_room_device(
     if online_meeting_devices is not None:
         room_device.online_meeting_devices = online_meeting_devices
     session.add(room_device)
-    session.commit()
-    session.refresh(room_device)
+    commit_or_flush(session, room_device)
     return room_device
 
 def delete_room_device(session: Session, room_id: int | None = None, room_name: str | None = None) -> bool:
@@ -520,7 +517,7 @@ def delete_room_device(session: Session, room_id: int | None = None, room_name:
 
     # Xóa RoomDevice
     session.delete(room_device)
-    session.commit()
+    commit_or_flush(session)
     return True
 # --- Room ---
 
@@ -576,8 +573,8 @@ def create_room(
         quantity=0,
     )
     session.add(room)
-    session.commit()
-    session.refresh(room)
+    queue_rooms_changed(session)
+    commit_or_flush(session, room)
     return room
 
 def get_room(session: Session, room_id: int|None, no_room: str|None) -> Room:
@@ -640,6 +637,7 @@ def update_room(
     room = session.get(Room, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
+    placement = (room.branch_id, room.building_id, room.type_id)
     if room_name:
         room.room_name = room_name
     if branch_id:
@@ -648,13 +646,20 @@ def update_room(
         room.building_id = building_id
     if type_id:
         room.type_id = type_id
+    if branch_id or building_id or type_id:
+        queue_rooms_changed(session)
+        # Số liệu theo ngày của các đơn cũ chuyển theo phòng, cùng transaction
+        move_room_stats(session, room_id, placement, (room.branch_id, room.building_id, room.type_id))
     if capacity is not None:
         room.max_quantity = capacity
     
     room.quantity = quantity 
+    if type_id:
+        queue_library_room_removed(session, room_id)  # có thể không còn là thư viện
+    else:
+        queue_library_room_update(session, room_id, room.quantity, room.max_quantity)
 
-    session.commit()
-    session.refresh(room)
+    commit_or_flush(session, room)
     return room
 
 def delete_room(session: Session, room_id: int) -> bool:
@@ -677,7 +682,9 @@ def delete_room(session: Session, room_id: int) -> bool:
     
     # Xóa Room
     session.delete(room)
-    session.commit()
+    queue_rooms_changed(session)
+    queue_library_room_removed(session, room_id)
+    commit_or_flush(session)
     return True
 
 def check_library(session: Session, room_id: int) -> bool:
@@ -717,6 +724,10 @@ def check_lib_available(session: Session, room_id: int) -> bool:
     """
     if not room_id:
         raise HTTPException(status_code=400, detail="Room ID is required")
+    if library_occupancy.enabled:
+        available = library_occupancy.is_available(room_id)
+        if available is not None:
+            return available
     room = session.get(Room, room_id)
     type_id = room.type_id
     
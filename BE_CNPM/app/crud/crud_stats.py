@@ -0,0 +1,230 @@
+from sqlmodel import Session, select
+from sqlalchemy import func, case, and_, update, delete, insert
+from sqlalchemy.exc import IntegrityError
+from fastapi import HTTPException
+from typing import Optional, List, Tuple
+from datetime import date, timedelta
+
+from app.model import DailyBookingStats, OrderRoom, Room
+
+# (date, branch_id, building_id, type_id), (bookings, cancellations, checkins)
+StatsKey = Tuple[date, int, int, int]
+OrderStats = Tuple[StatsKey, Tuple[int, int, int]]
+
+GRAINS = ("day", "week", "month")
+MAX_PERIODS = 1000
+
+# --- DailyBookingStats ---
+def order_stats(session: Session, order: OrderRoom) -> OrderStats:
+    """
+    The rollup row an order counts in and what it adds to it.
+    An order checked in and later released at check-out (is_used and is_cancel) is not a cancellation.
+
+    Args:
+        session (Session): The database session.
+        order (OrderRoom): The order.
+
+    Returns:
+        OrderStats: (date, branch_id, building_id, type_id), (bookings, cancellations, checkins).
+    """
+    room = session.get(Room, order.room_id)
+    key = (order.date, room.branch_id, room.building_id, room.type_id)
+    return key, (1, int(order.is_cancel and not order.is_used), int(order.is_used))
+
+def track_order_stats(session: Session, before: Optional[OrderStats], after: Optional[OrderStats]) -> None:
+    """
+    Move an order's contribution in DailyBookingStats from `before` to `after`
+    (None for an order that is created or deleted). Does not commit: it runs in the
+    caller's transaction, so the rollup changes together with the order.
+
+    Args:
+        session (Session): The database session.
+        before (Optional[OrderStats]): order_stats of the order before the change.
+        after (Optional[OrderStats]): order_stats of the order after the change.
+    """
+    deltas = {}
+    for stats, sign in ((before, -1), (after, 1)):
+        if stats is None:
+            continue
+        key, counts = stats
+        current = deltas.get(key, (0, 0, 0))
+        deltas[key] = tuple(total + sign * count for total, count in zip(current, counts))
+    for key, delta in deltas.items():
+        if any(delta):
+            _add_booking_stats(session, key, delta)
+
+def move_room_stats(session: Session, room_id: int, before: Tuple[int, int, int], after: Tuple[int, int, int]) -> None:
+    """
+    Move the contributions of a room's orders in DailyBookingStats when an admin
+    changes its branch, building or type, so that later order changes subtract from
+    the rows the orders were added to. Does not commit (runs in the caller's transaction).
+
+    Args:
+        session (Session): The database session.
+        room_id (int): The ID of the room.
+        before (Tuple[int, int, int]): (branch_id, building_id, type_id) before the change.
+        after (Tuple[int, int, int]): (branch_id, building_id, type_id) after the change.
+    """
+    if before == after:
+        return
+    days = session.exec(
+        select(OrderRoom.date, *_order_counts())
+        .where(OrderRoom.room_id == room_id)
+        .group_by(OrderRoom.date)
+    ).all()
+    for day, *counts in days:
+        _add_booking_stats(session, (day, *before), tuple(-count for count in counts))
+        _add_booking_stats(session, (day, *after), tuple(counts))
+
+def _order_counts() -> tuple:
+    # bookings, cancellations (hủy khi chưa check-in), checkins: cùng quy tắc với order_stats
+    return (
+        func.count(OrderRoom.id),
+        func.sum(case((and_(OrderRoom.is_cancel == True, OrderRoom.is_used == False), 1), else_=0)),
+        func.sum(case((OrderRoom.is_used == True, 1), else_=0)),
+    )
+
+def _add_booking_stats(session: Session, key: StatsKey, delta: Tuple[int, int, int]) -> None:
+    # 1 câu UPDATE cộng dồn: các transaction đồng thời trên cùng ngày không mất lượt
+    day, branch_id, building_id, type_id = key
+    bookings, cancellations, checkins = delta
+    statement = (
+        update(DailyBookingStats)
+        .where(
+            DailyBookingStats.date == day,
+            DailyBookingStats.branch_id == branch_id,
+            DailyBookingStats.building_id == building_id,
+            DailyBookingStats.type_id == type_id,
+        )
+        .values(
+            bookings=DailyBookingStats.bookings + bookings,
+            cancellations=DailyBookingStats.cancellations + cancellations,
+            checkins=DailyBookingStats.checkins + checkins,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if session.execute(statement).rowcount:
+        return
+    # Chưa có dòng cho ngày này: tạo mới, nếu request khác vừa tạo thì cộng lại
+    try:
+        with session.begin_nested():
+            session.execute(insert(DailyBookingStats).values(
+                date=day, branch_id=branch_id, building_id=building_id, type_id=type_id,
+                bookings=bookings, cancellations=cancellations, checkins=checkins,
+            ))
+    except IntegrityError:
+        session.execute(statement)
+
+def rebuild_booking_stats(session: Session, start_date: Optional[date] = None) -> int:
+    """
+    Rebuild DailyBookingStats from OrderRoom with one grouped query and commit.
+
+    Args:
+        session (Session): The database session.
+        start_date (Optional[date]): Only rebuild days from this date on (default: all).
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    query = (
+        select(OrderRoom.date, Room.branch_id, Room.building_id, Room.type_id, *_order_counts())
+        .join(Room, Room.id == OrderRoom.room_id)
+        .group_by(OrderRoom.date, Room.branch_id, Room.building_id, Room.type_id)
+    )
+    clear = delete(DailyBookingStats)
+    if start_date is not None:
+        query = query.where(OrderRoom.date >= start_date)
+        clear = clear.where(DailyBookingStats.date >= start_date)
+
+    rows = [
+        {"date": day, "branch_id": branch_id, "building_id": building_id, "type_id": type_id,
+         "bookings": bookings, "cancellations": cancellations, "checkins": checkins}
+        for day, branch_id, building_id, type_id, bookings, cancellations, checkins in session.exec(query)
+    ]
+    session.execute(clear)
+    if rows:
+        session.execute(insert(DailyBookingStats), rows)
+    session.commit()
+    return len(rows)
+
+def _period_start(day: date, grain: str) -> date:
+    if grain == "week":
+        return day - timedelta(days=day.weekday())  # thứ Hai
+    if grain == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_period(start: date, grain: str) -> date:
+    if grain == "week":
+        return start + timedelta(days=7)
+    if grain == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def get_booking_timeseries(
+    session: Session,
+    grain: str,
+    date_from: date,
+    date_to: date,
+    branch_id: Optional[int] = None,
+    building_id: Optional[int] = None,
+    type_id: Optional[int] = None
+) -> List[dict]:
+    """
+    Bookings, cancellations, check-ins and no-shows per day, week (from Monday) or month,
+    read only from DailyBookingStats. Periods without bookings are returned with zeros.
+
+    Args:
+        session (Session): The database session.
+        grain (str): "day", "week" or "month".
+        date_from (date): First day (included).
+        date_to (date): Last day (included).
+        branch_id (Optional[int]): Only rooms of this branch.
+        building_id (Optional[int]): Only rooms of this building.
+        type_id (Optional[int]): Only rooms of this type.
+
+    Returns:
+        List[dict]: [{period, bookings, cancellations, checkins, no_shows}] sorted by period.
+        no_shows only counts days before today (later bookings can still be checked in).
+
+    Raises:
+        HTTPException: 400 if the grain or the date range is invalid or too long.
+    """
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain must be one of {', '.join(GRAINS)}")
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+
+    today = date.today()
+    query = (
+        select(
+            DailyBookingStats.date,
+            func.sum(DailyBookingStats.bookings),
+            func.sum(DailyBookingStats.cancellations),
+            func.sum(DailyBookingStats.checkins),
+        )
+        .where(DailyBookingStats.date >= date_from, DailyBookingStats.date <= date_to)
+        .group_by(DailyBookingStats.date)
+    )
+    if branch_id is not None:
+        query = query.where(DailyBookingStats.branch_id == branch_id)
+    if building_id is not None:
+        query = query.where(DailyBookingStats.building_id == building_id)
+    if type_id is not None:
+        query = query.where(DailyBookingStats.type_id == type_id)
+
+    periods = {}
+    start = _period_start(date_from, grain)
+    while start <= date_to:
+        if len(periods) >= MAX_PERIODS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_PERIODS} periods, use a larger grain")
+        periods[start] = {"period": start, "bookings": 0, "cancellations": 0, "checkins": 0, "no_shows": 0}
+        start = _next_period(start, grain)
+    for day, bookings, cancellations, checkins in session.exec(query):
+        point = periods[_period_start(day, grain)]
+        point["bookings"] += bookings
+        point["cancellations"] += cancellations
+        point["checkins"] += checkins
+        if day < today:
+            point["no_shows"] += max(0, bookings - cancellations - checkins)
+    return list(periods.values())
@@ -0,0 +1,221 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import update, delete, or_
+from sqlmodel import Session, select
+
+from app.cores.config import settings
+from app.cores.revocation import token_revocations
+from app.model import RefreshToken, TokenRevocation
+
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _as_utc(value: datetime) -> datetime:
+    # MySQL/SQLite trả datetime không có múi giờ
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def create_refresh_token(session: Session, user_id: int, family_id: Optional[int] = None) -> str:
+    """
+    Create a refresh token for a user and commit it.
+
+    Args:
+        session (Session): The database session.
+        user_id (int): The ID of the user.
+        family_id (Optional[int]): Rotation chain to continue (default: start a new one).
+
+    Returns:
+        str: The token "<id>.<secret>" to give to the client (the secret is not stored).
+    """
+    secret = secrets.token_urlsafe(32)
+    token = RefreshToken(
+        user_id=user_id,
+        family_id=family_id or 0,
+        token_hash=_hash_secret(secret),
+        expires_at=_now() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    session.add(token)
+    session.flush()
+    if not family_id:
+        token.family_id = token.id
+    session.commit()
+    return f"{token.id}.{secret}"
+
+
+def _parse(raw_token: str) -> Tuple[int, str]:
+    token_id, _, secret = raw_token.partition(".")
+    if not token_id.isdigit() or not secret:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return int(token_id), secret
+
+
+def rotate_refresh_token(session: Session, raw_token: str) -> Tuple[int, str]:
+    """
+    Exchange a refresh token for a new one of the same family.
+    Presenting a token that was already used revokes its whole family
+    (it was probably stolen), unless it was rotated less than
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS ago and the family is still live: several
+    tabs sharing the token refreshed together, and each one gets its own successor.
+
+    Args:
+        session (Session): The database session.
+        raw_token (str): The refresh token sent by the client.
+
+    Returns:
+        Tuple[int, str]: The user ID and the new refresh token.
+
+    Raises:
+        HTTPException: 401 if the token is unknown, expired, revoked or already used.
+    """
+    token_id, secret = _parse(raw_token)
+    token = session.get(RefreshToken, token_id)
+    if not token or not hmac.compare_digest(token.token_hash, _hash_secret(secret)):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if _as_utc(token.expires_at) <= _now():
+        raise HTTPException(status_code=401, detail="Refresh token has expired")
+
+    # Thu hồi có điều kiện: chỉ 1 request trong số các request đồng thời dùng được token này
+    now = _now()
+    used = session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token_id, RefreshToken.revoked == False)
+        .values(revoked=True, rotated_at=now)
+    ).rowcount
+    if used != 1:
+        session.rollback()
+        session.refresh(token)
+        if not _within_reuse_grace(session, token, now):
+            revoke_refresh_family(session, token.family_id)
+            raise HTTPException(status_code=401, detail="Refresh token has already been used")
+
+    return token.user_id, create_refresh_token(session, token.user_id, family_id=token.family_id)
+
+
+def _within_reuse_grace(session: Session, token: RefreshToken, now: datetime) -> bool:
+    # Token vừa được đổi (không phải bị thu hồi) và family còn token sống (chưa logout/bị thu hồi)
+    if token.rotated_at is None or now - _as_utc(token.rotated_at) > timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+        return False
+    return session.exec(
+        select(RefreshToken.id)
+        .where(RefreshToken.family_id == token.family_id, RefreshToken.revoked == False)
+        .limit(1)
+    ).first() is not None
+
+
+def revoke_refresh_token(session: Session, raw_token: str) -> None:
+    """Revoke the family of a refresh token (logout). Unknown tokens are ignored."""
+    token_id, secret = _parse(raw_token)
+    token = session.get(RefreshToken, token_id)
+    if token and hmac.compare_digest(token.token_hash, _hash_secret(secret)):
+        revoke_refresh_family(session, token.family_id)
+
+
+def revoke_refresh_family(session: Session, family_id: int) -> None:
+    session.execute(update(RefreshToken).where(RefreshToken.family_id == family_id).values(revoked=True))
+    session.commit()
+
+
+def revoke_user_refresh_tokens(session: Session, user_id: int) -> None:
+    """Revoke every refresh token of a user (deactivation, password change)."""
+    session.execute(update(RefreshToken).where(RefreshToken.user_id == user_id).values(revoked=True))
+    session.commit()
+
+
+def purge_refresh_tokens(session: Session) -> int:
+    """
+    Delete expired refresh tokens. Revoked tokens are kept until they expire
+    so that reusing them still revokes their family.
+    Returns the number of deleted rows.
+    """
+    deleted = session.execute(delete(RefreshToken).where(RefreshToken.expires_at <= _now())).rowcount
+    session.commit()
+    return deleted
+
+
+# ----------------------- Thu hồi access token -----------------------
+
+REVOCATION_SYNC_LOOKBACK_SECONDS = 30
+
+
+def _access_token_lifetime() -> timedelta:
+    # Mục thu hồi theo user phải sống lâu bằng access token dài nhất có thể còn hạn
+    return timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES, seconds=60)
+
+
+def revoke_access_token(session: Session, jti: str, expires_at: float) -> None:
+    """
+    Revoke a single access token (logout) in every worker.
+
+    Args:
+        session (Session): The database session.
+        jti (str): The "jti" claim of the token.
+        expires_at (float): The "exp" claim of the token (epoch seconds).
+    """
+    entry = TokenRevocation(
+        jti=jti,
+        revoked_at=_now(),
+        expires_at=datetime.fromtimestamp(expires_at, timezone.utc),
+    )
+    session.add(entry)
+    session.commit()
+    token_revocations.revoke_jti(jti, expires_at)
+
+
+def revoke_user_access_tokens(session: Session, user_id: int) -> None:
+    """
+    Revoke every access token already issued to a user (deactivation) in every worker.
+    Tokens issued after this call are not affected.
+    """
+    now = _now()
+    entry = TokenRevocation(user_id=user_id, revoked_at=now, expires_at=now + _access_token_lifetime())
+    session.add(entry)
+    session.commit()
+    token_revocations.revoke_user(user_id, now.timestamp(), entry.expires_at.timestamp())
+
+
+def sync_token_revocations(session: Session) -> List[int]:
+    """
+    Apply the revocations written by other workers since the last sync
+    and evict the expired ones.
+
+    Returns:
+        List[int]: IDs of the users revoked since the last sync (to drop from the user cache).
+    """
+    now = _now()
+    # Đọc lại cả vài giây gần nhất: id cấp lúc INSERT nhưng commit có thể đến muộn hơn id lớn hơn
+    entries = session.exec(
+        select(TokenRevocation)
+        .where(
+            or_(TokenRevocation.id > token_revocations.cursor,
+                TokenRevocation.revoked_at >= now - timedelta(seconds=REVOCATION_SYNC_LOOKBACK_SECONDS)),
+            TokenRevocation.expires_at > now,
+        )
+        .order_by(TokenRevocation.id)
+    ).all()
+    users = []
+    for entry in entries:
+        expires_at = _as_utc(entry.expires_at).timestamp()
+        if entry.jti is not None:
+            token_revocations.revoke_jti(entry.jti, expires_at)
+        if entry.user_id is not None:
+            if token_revocations.revoke_user(entry.user_id, _as_utc(entry.revoked_at).timestamp(), expires_at):
+                users.append(entry.user_id)
+    token_revocations.advance(max((entry.id for entry in entries), default=0))
+    token_revocations.evict_expired()
+    return users
+
+
+def purge_token_revocations(session: Session) -> int:
+    """Delete expired revocation entries. Returns the number of deleted rows."""
+    deleted = session.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= _now())).rowcount
+    session.commit()
+    return deleted
@@ -1,124 +1,179 @@
+import hashlib
+import hmac
 from sqlmodel import Session, select
 from sqlmodel import func
+from sqlalchemy import update
+from sqlalchemy.orm import make_transient_to_detached
+from fastapi.concurrency import run_in_threadpool
 from math import ceil
 from typing import List, Tuple
-from app.model import User
+from app.model import User, UserCacheEviction
 from app.schemas.user import UserIn, Register_In
 from app.schemas.metadata import Metadata
 from pydantic import EmailStr
-from app.cores.security import get_password_hash, verify_password
-import requests
-import base64
-import json
-import os
-from bs4 import BeautifulSoup
+from app.cores.security import password_hasher
+from app.cores.cache import TTLCache
+from app.cores.change_log import ChangeLogReader, log_entry
+from app.cores.config import settings, SECRET_KEY
 from fastapi import HTTPException
+from app.cores.sso import sso_client, sso_breaker, SSOUnavailable
+from app.cores.circuit_breaker import CircuitOpenError
+from app.crud.crud_token import revoke_user_refresh_tokens, revoke_user_access_tokens, sync_token_revocations
 
-def get_information(user, passs):
-    login_data = {
-        'username': user,
-        'password': passs,
-        '_eventId': 'submit',
-        'submit': 'Login',
-    }
-
-    def decode_jwt_payload(jwt):
-        # Tách phần payload của JWT
-        payload = jwt.split(".")[1]
-        
-        # Chuyển Base64-URL thành Base64 chuẩn
-        payload += "=" * (-len(payload) % 4)  # Thêm padding nếu cần
-        decoded_bytes = base64.urlsafe_b64decode(payload)  # Giải mã Base64
-        
-        # Chuyển bytes thành chuỗi JSON
-        decoded_str = decoded_bytes.decode("utf-8")
-        
-        # Parse JSON thành dictionary
-        return json.loads(decoded_str)
-
-    os.system('cls')  # Clear the console
-
-    with requests.Session() as S:
-        S.cookies.clear()
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Mobile Safari/537.36 Edg/126.0.0.0'
-        }
-
-        # Login to MyBK
-        login_url = 'https://sso.hcmut.edu.vn/cas/login?service=https%3A%2F%2Fmybk.hcmut.edu.vn%2Fapp%2Flogin%2Fcas'
-        home_url = 'https://mybk.hcmut.edu.vn/app/'
-        r = S.get(login_url, headers=headers)
-        soup = BeautifulSoup(r.content, 'html5lib')
-
-        login_data['lt'] = soup.find('input', attrs={'name': 'lt'})['value']
-        login_data['execution'] = soup.find('input', attrs={'name': 'execution'})['value']
-        r = S.post(login_url, data=login_data)
-
-        if r.url == home_url:
-            uni_records_url = 'https://mybk.hcmut.edu.vn/app/he-thong-quan-ly/sinh-vien/ket-qua-hoc-tap'
-            response_records = S.get(uni_records_url)
-            soup1 = BeautifulSoup(response_records.content, 'html5lib')
-            token = soup1.find('input', attrs={'id': 'hid_Token'})['value']
-
-            json_data = decode_jwt_payload(token)
-
-            profiles = json_data['profiles']
-            person_ID = json.loads(profiles)['personId']
-
-            url_mark = f"https://mybk.hcmut.edu.vn/api/sinh-vien/xem-ket-qua-hoc-tap/v2?mssv={person_ID}&null"
-            url_full_info = f"https://mybk.hcmut.edu.vn/api/v1/student/detail-info-by-code/{person_ID}?null"
-
-            if response_records.status_code == 200:
-                headers = {
-                    'Authorization': 'Bearer ' + token,
-                    'Content-Type': 'application/json'
-                }
-
-                response_info = S.get(url_full_info, headers=headers)
-                full_info = response_info.json()
-
-                response_info = S.get(url_mark, headers=headers)
-                mark = response_info.json()
-                data = full_info['data']
-                code = data['code']
-                lastName = data['lastName']
-                firstName = data['firstName']
-                orgEmail = data['orgEmail']
-
-                # Kết quả trả về
-                info = {
-                    'code': code,
-                    'lastName': lastName,
-                    'firstName': firstName,
-                    'orgEmail': orgEmail
-}
-                return {"status": "success", "full_info": info}
+# --- Cache quanh SSO ---
+# Cặp (username, mật khẩu) vừa bị SSO từ chối: trả "failed" ngay, không đăng nhập SSO lại trong TTL.
+# Khóa theo cả mật khẩu: nhập sai không chặn lần đăng nhập đúng của chủ tài khoản
+sso_negative_cache = TTLCache(ttl=settings.SSO_NEGATIVE_CACHE_TTL_SECONDS, maxsize=10000)
+# Profile đã lấy được, theo (username, mật khẩu): thử lại sau lỗi DB không phải scrape lại
+sso_profile_cache = TTLCache(ttl=settings.SSO_PROFILE_CACHE_TTL_SECONDS, maxsize=1000)
+
+def _profile_key(user: str, passs: str) -> str:
+    # Không giữ mật khẩu gốc trong bộ nhớ
+    return hmac.new(SECRET_KEY.encode(), f"{user}\0{passs}".encode(), hashlib.sha256).hexdigest()
+
+async def get_information(user: str, passs: str) -> dict:
+    """
+    Fetch the student's profile from the university SSO (see app.cores.sso),
+    behind the SSO circuit breaker, a negative cache of rejected credentials and
+    a cache of fetched profiles.
+
+    Returns:
+        dict: {"status": "success", "full_info": {...}} or {"status": "failed"}.
+
+    Raises:
+        SSOUnavailable: The SSO did not answer.
+        CircuitOpenError: The SSO failed repeatedly and is not being called for now.
+    """
+    key = _profile_key(user, passs)
+    profile = sso_profile_cache.get(key)
+    if profile is not None:
+        return {"status": "success", "full_info": profile}
+    if sso_negative_cache.get(key):
         return {"status": "failed"}
 
+    result = await sso_breaker.call(sso_client.get_information, user, passs)
+    if result["status"] == "success":
+        sso_profile_cache.set(key, result["full_info"])
+    else:
+        sso_negative_cache.set(key, True)
+    return result
+
 def get_user_by_username(session: Session, username: str) -> User | None:
     return session.exec(select(User).where(User.username == username)).first()
 
 
+# --- Cache User theo id cho get_current_user ---
+user_cache = TTLCache(ttl=settings.USER_CACHE_TTL_SECONDS, maxsize=settings.USER_CACHE_SIZE)
+
+def get_user_cached(session: Session, user_id: int) -> User | None:
+    """
+    Get a user by ID through the in-process user cache.
+    The cache keeps a detached copy; each call merges it into the session
+    without a query, so callers get a normal session-bound User.
+
+    Args:
+        session (Session): The database session.
+        user_id (int): The ID of the user.
+
+    Returns:
+        User | None: The user, or None if it does not exist.
+    """
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return session.merge(cached, load=False)
+    user = session.get(User, user_id)
+    if user is None:
+        return None
+    cache_user(user)
+    return user
+
+def cache_user(user: User) -> None:
+    # Bản sao ở trạng thái detached (có identity, không có thay đổi) để merge(load=False) được
+    detached = User(**user.model_dump())
+    make_transient_to_detached(detached)
+    user_cache.set(user.id, detached)
+
+def invalidate_cached_user(user_id: int) -> None:
+    user_cache.pop(user_id)
+
+# Các worker khác xóa user khỏi cache khi đọc được dòng này (cùng commit với thay đổi)
+user_cache_evictions = ChangeLogReader(UserCacheEviction)
+
+def log_user_change(session: Session, user_id: int) -> None:
+    """Add to the session of a profile change an entry telling other workers to drop the cached user."""
+    session.add(log_entry(UserCacheEviction, user_id))
+
+def sync_revoked_users(session: Session) -> int:
+    """
+    Pull token revocations and profile changes written by other workers and drop
+    those users from this worker's user cache. Returns the number of users dropped.
+    """
+    users = set(sync_token_revocations(session)) | set(user_cache_evictions.read(session))
+    for user_id in users:
+        invalidate_cached_user(user_id)
+    return len(users)
+
+
 def authenticate_user(session: Session, username: str, password: str) -> User | None:
     user = get_user_by_username(session, username)
     if not user:
         return None
-    if not verify_password(password, user.password):
+    ok, new_hash = password_hasher.verify_and_update_sync(password, user.password)
+    if not ok:
+        return None
+    if new_hash:
+        upgrade_password_hash(session, user, new_hash)
+    return user
+
+async def authenticate_user_async(session: Session, username: str, password: str) -> User | None:
+    """
+    Same as authenticate_user, for async routes: the DB calls run in the threadpool
+    and bcrypt runs on the password hasher, so no thread is held while waiting for it.
+    """
+    user = await run_in_threadpool(get_user_by_username, session, username)
+    if not user:
+        return None
+    ok, new_hash = await password_hasher.verify_and_update(password, user.password)
+    if not ok:
         return None
+    if new_hash:
+        await run_in_threadpool(upgrade_password_hash, session, user, new_hash)
     return user
 
+def upgrade_password_hash(session: Session, user: User, new_hash: str) -> None:
+    """
+    Replace a hash made with a stale bcrypt cost (passlib needs_update) after a successful login.
+    The row is only updated if the password did not change in the meantime.
+    """
+    session.execute(
+        update(User)
+        .where(User.id == user.id, User.password == user.password)
+        .values(password=new_hash)
+    )
+    session.commit()
+    invalidate_cached_user(user.id)
 
 
-def create_user(session: Session, user_create: UserIn) -> User:
-    
-    result = get_information(user_create.username, user_create.password)
+
+async def create_user(session: Session, user_create: UserIn) -> User:
+    """
+    Provision a user on first login from their SSO profile.
+    The SSO calls and bcrypt are awaited; only the insert runs in the threadpool.
+
+    Raises:
+        HTTPException: 503 if the SSO is unavailable.
+    """
+    try:
+        result = await get_information(user_create.username, user_create.password)
+    except (SSOUnavailable, CircuitOpenError):
+        raise HTTPException(status_code=503, detail="SSO is unavailable, please try again later")
     if result["status"] == "failed":
         return None
     data= result["full_info"]
 
     db_user = User(
         username=user_create.username,
-        password=get_password_hash(user_create.password),
+        password=await password_hasher.hash(user_create.password),
         MSSV=data['code'],
         lastname=data['lastName'],
         firstname=data['firstName'],
@@ -127,16 +182,25 @@ def create_user(session: Session, user_create: UserIn) -> User:
         isAdmin=False,
         isActive=True
     )
+    db_user = await run_in_threadpool(_insert_user, session, db_user)
+    sso_profile_cache.pop(_profile_key(user_create.username, user_create.password))
+    return db_user
+
+def _insert_user(session: Session, db_user: User) -> User:
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
     return db_user
 
 
-def register_user(session: Session, user_create: Register_In, isAdmin: bool =False ) -> User:
+async def register_user(session: Session, user_create: Register_In, isAdmin: bool =False ) -> User:
+    """
+    Create a local account. bcrypt is awaited on the password hasher,
+    only the insert runs in the threadpool.
+    """
     db_user = User(
         username=user_create.username,
-        password=get_password_hash(user_create.password),
+        password=await password_hasher.hash(user_create.password),
         MSSV=None,
         lastname=user_create.lastname,
         firstname=user_create.firstname,
@@ -145,24 +209,35 @@ def register_user(session: Session, user_create: Register_In, isAdmin: bool =Fal
         isAdmin=isAdmin,
         isActive=True
     )
-    print(db_user)
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
-    return db_user
+    return await run_in_threadpool(_insert_user, session, db_user)
 
-def change_user_pasword(session: Session, username: str, new_password: str, old_password:str) -> User:
-    db_user = get_user_by_username(session, username)
+async def change_user_pasword(session: Session, username: str, new_password: str, old_password:str) -> User:
+    """
+    Change a user's password. The three bcrypt runs are awaited on the password hasher,
+    the DB calls run in the threadpool.
+
+    Raises:
+        HTTPException: 404 if the user does not exist, 400 if the old password is wrong
+                       or the new one is the same.
+    """
+    db_user = await run_in_threadpool(get_user_by_username, session, username)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    if not verify_password(old_password, db_user.password):
+    if not await password_hasher.verify(old_password, db_user.password):
         raise HTTPException(status_code=400, detail="Old password is incorrect")
-    if verify_password(new_password, db_user.password):
+    if await password_hasher.verify(new_password, db_user.password):
         raise HTTPException(status_code=400, detail="New password cannot be the same as old password")
-   
-    db_user.password = get_password_hash(new_password)
+
+    new_hash = await password_hasher.hash(new_password)
+    return await run_in_threadpool(_save_password, session, db_user, new_hash)
+
+def _save_password(session: Session, db_user: User, new_hash: str) -> User:
+    db_user.password = new_hash
     session.add(db_user)
-    session.commit()
+    log_user_change(session, db_user.id)
+    # Đổi mật khẩu thì đăng xuất mọi phiên khác (commit cùng lúc với mật khẩu mới)
+    revoke_user_refresh_tokens(session, db_user.id)
+    invalidate_cached_user(db_user.id)
     session.refresh(db_user)
     return db_user
 
@@ -171,8 +246,6 @@ def change_user_info(session: Session, username: str,
                      lastname: str,
                      firstname: str,
                      email: EmailStr) -> User:
-    print("username: ", username)
-    
     db_user = get_user_by_username(session, username)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -183,9 +256,10 @@ def change_user_info(session: Session, username: str,
     if email is not None:
         db_user.email = email
     session.add(db_user)
+    log_user_change(session, db_user.id)
     session.commit()
+    invalidate_cached_user(db_user.id)
     session.refresh(db_user)
-    print("call db ok")
     return db_user
 
 def change_user_status(session: Session, username: str, isActive: bool) -> List[User]:
@@ -194,7 +268,15 @@ def change_user_status(session: Session, username: str, isActive: bool) -> List[
         raise HTTPException(status_code=404, detail="User not found")
     db_user.isActive = isActive
     session.add(db_user)
-    session.commit()
+    log_user_change(session, db_user.id)
+    if isActive:
+        session.commit()
+    else:
+        # Khoá tài khoản: refresh token không còn đổi được access token mới,
+        # access token đang dùng bị chặn ngay ở mọi worker
+        revoke_user_refresh_tokens(session, db_user.id)
+        revoke_user_access_tokens(session, db_user.id)
+    invalidate_cached_user(db_user.id)
     session.refresh(db_user)
     return db_user
 
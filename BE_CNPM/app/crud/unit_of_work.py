@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from typing import Iterator
+from sqlmodel import Session, SQLModel
+
+_UNIT_OF_WORK_KEY = "unit_of_work"
+
+@contextmanager
+def unit_of_work(session: Session) -> Iterator[Session]:
+    """
+    Run several CRUD calls in one transaction.
+    Inside the block, CRUD helpers flush instead of commit; the transaction is
+    committed once when the block exits and rolled back if it raises.
+    A nested unit_of_work joins the outer one.
+    
+    Args:
+        session (Session): The database session.
+    
+    Yields:
+        Session: The same session.
+    """
+    if session.info.get(_UNIT_OF_WORK_KEY):
+        yield session
+        return
+
+    session.info[_UNIT_OF_WORK_KEY] = True
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.info.pop(_UNIT_OF_WORK_KEY, None)
+
+def in_unit_of_work(session: Session) -> bool:
+    return bool(session.info.get(_UNIT_OF_WORK_KEY))
+
+def commit_or_flush(session: Session, *instances: SQLModel) -> None:
+    """
+    End a CRUD helper's write: flush inside a unit_of_work, otherwise commit and
+    refresh the given instances (the behaviour every helper had before).
+    
+    Args:
+        session (Session): The database session.
+        *instances (SQLModel): Instances to refresh after a commit.
+    """
+    if in_unit_of_work(session):
+        session.flush()
+        return
+    session.commit()
+    for instance in instances:
+        session.refresh(instance)
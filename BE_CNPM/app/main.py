@@ -219,10 +219,101 @@ from app.api.routers.admin import router as admin_router
 from app.api.routers.user import router as user_router
 from app.api.dependencies import check_user_role, check_admin_role, get_current_user, oauth2_scheme, CurrentUser
 from app.cores.config import DATABASE_URL, API_V1_STR
+from app.api.middleware import JWTAuthMiddleware, AccessRule
+from app.cores.db import engine
+from app.cores.availability import availability_matrix
+from app.cores.library_occupancy import library_occupancy
+from app.cores.sso import sso_client
+from app.cores.config import settings
+from app.crud.crud_user import sync_revoked_users
+from app.cores.room_events import room_events, sync_room_events
+from app.cores.analytics import heatmap_cache, sync_heatmap_changes
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import logging
 import jwt
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, Session
 
-app = FastAPI(title="CNPM API", dependencies=[])
+logger = logging.getLogger(__name__)
+
+
+def _sync_token_revocations() -> None:
+    with Session(engine) as session:
+        sync_revoked_users(session)
+
+
+async def _sync_token_revocations_forever() -> None:
+    # Đọc thu hồi token do các worker khác ghi; lỗi DB chỉ ghi log rồi thử lại chu kỳ sau
+    while True:
+        await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
+        try:
+            await run_in_threadpool(_sync_token_revocations)
+        except Exception as e:
+            logger.warning(f"Token revocation sync failed: {e}")
+
+
+def _sync_change_logs() -> None:
+    with Session(engine) as session:
+        if room_events.shared:
+            sync_room_events(session)
+        if heatmap_cache.shared:
+            sync_heatmap_changes(session)
+
+
+async def _sync_change_logs_forever() -> None:
+    # Sự kiện phòng và thay đổi heatmap do worker khác ghi
+    while True:
+        await asyncio.sleep(settings.CHANGE_LOG_SYNC_SECONDS)
+        try:
+            await run_in_threadpool(_sync_change_logs)
+        except Exception as e:
+            logger.warning(f"Change log sync failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nạp ma trận phòng trống (nếu bật) trước khi nhận request
+    if availability_matrix.enabled:
+        availability_matrix.load(engine)
+    # Occupancy thư viện write-behind (nếu bật): ghi lại journal còn sót rồi nạp trạng thái
+    if library_occupancy.enabled:
+        library_occupancy.start(engine)
+    # Nạp các thu hồi token còn hạn rồi đồng bộ định kỳ
+    _sync_token_revocations()
+    revocation_sync = asyncio.create_task(_sync_token_revocations_forever())
+    # Sự kiện phòng và cache heatmap giữa các worker: bắt đầu từ cuối change log hiện có
+    shared = room_events.shared or heatmap_cache.shared
+    if shared:
+        _sync_change_logs()
+        change_log_sync = asyncio.create_task(_sync_change_logs_forever())
+    yield
+    revocation_sync.cancel()
+    with suppress(asyncio.CancelledError):
+        await revocation_sync
+    if shared:
+        change_log_sync.cancel()
+        with suppress(asyncio.CancelledError):
+            await change_log_sync
+    if library_occupancy.enabled:
+        await run_in_threadpool(library_occupancy.stop)
+    await sso_client.aclose()
+
+app = FastAPI(title="CNPM API", dependencies=[], lifespan=lifespan)
+
+# Middleware kiểm tra JWT, quy tắc theo prefix của từng router.
+# Thêm trước CORS để CORS nằm ngoài cùng và cả response 401/403 cũng có header CORS.
+app.add_middleware(
+    JWTAuthMiddleware,
+    rules=[
+        AccessRule(f"{API_V1_STR}/auth", public=True),
+        AccessRule(f"{API_V1_STR}/admin", role="isadmin", detail="Admin role required"),
+        AccessRule(f"{API_V1_STR}/user", role="isuser", detail="User role required"),
+        AccessRule("/default", public=True),
+        AccessRule("/docs", public=True),
+        AccessRule("/openapi.json", public=True),
+    ],
+)
 
 # Thêm middleware CORS
 app.add_middleware(
@@ -233,61 +324,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware kiểm tra JWT
-@app.middleware("http")
-async def jwt_middleware(request: Request, call_next):
-    print(f"🚀 Middleware chạy!")
-    print(f"👉 Path: {request.url.path}")
-    print(f"👉 Method: {request.method}")  # Thêm log để kiểm tra method
-    print(f"👉 Authorization: {request.headers.get('Authorization')}")
-    
-    # Bỏ qua yêu cầu OPTIONS để CORS middleware xử lý
-    if request.method == "OPTIONS":
-        print("👉 Bỏ qua middleware cho yêu cầu OPTIONS")
-        return await call_next(request)
-
-    # Các route công khai không cần kiểm tra JWT
-    public_paths = [f"{API_V1_STR}/auth", "/default", "/docs", "/openapi.json"]
-    print(f"Public paths: {public_paths}")
-    
-    if any(request.url.path.startswith(path) for path in public_paths):
-        print("👉 Bỏ qua middleware cho route công khai")
-        return await call_next(request)
-
-    # Lấy token từ header Authorization
-    token = request.headers.get("Authorization", "").replace("Bearer ", "")
-    print(f"Token: {token}")
-    
-    if not token:
-        print("👉 Thiếu token")
-        return JSONResponse(status_code=401, content={"detail": "Missing token"})
-
-    try:
-        if request.url.path.startswith(f"{API_V1_STR}/admin"):
-            isadmin = check_admin_role(token)
-            if not isadmin:
-                print("👉 Không có quyền admin")
-                return JSONResponse(status_code=403, content={"detail": "Admin role required"})
-                pass
-        elif request.url.path.startswith(f"{API_V1_STR}/user"):
-            isuser = check_user_role(token)
-            if not isuser:
-                print("👉 Không có quyền user")
-                return JSONResponse(status_code=403, content={"detail": "User role required"})
-    except jwt.ExpiredSignatureError:
-        print("👉 Token hết hạn")
-        return JSONResponse(status_code=401, content={"detail": "Token has expired"})
-    except jwt.PyJWTError:
-        print("👉 Token không hợp lệ")
-        return JSONResponse(status_code=401, content={"detail": "Invalid token"})
-    except Exception as e:
-        print(f"👉 Lỗi khác: {str(e)}")
-        return JSONResponse(status_code=401, content={"detail": str(e)})
-
-    print("👉 Token hợp lệ, tiếp tục xử lý request")
-    response = await call_next(request)
-    return response
-
 app.include_router(auth_router, 
                    prefix=f"{API_V1_STR}/auth",
                    tags=["auth"]
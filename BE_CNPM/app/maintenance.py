@@ -0,0 +1,95 @@
+'''
+Các lệnh bảo trì dữ liệu, chạy từ thư mục BE_CNPM:
+
+    python -m app.maintenance rebuild-slots [--from YYYY-MM-DD]
+    python -m app.maintenance check-matrix [--samples N]
+    python -m app.maintenance purge-refresh-tokens
+    python -m app.maintenance purge-token-revocations
+    python -m app.maintenance rebuild-booking-stats [--from YYYY-MM-DD]
+'''
+import argparse
+import logging
+import sys
+from datetime import date
+
+from sqlmodel import Session
+
+from app.cores.db import engine
+from app.crud.crud_order import rebuild_room_day_slots
+from app.crud.crud_token import purge_refresh_tokens, purge_token_revocations
+from app.crud.crud_stats import rebuild_booking_stats
+from app.cores.availability import AvailabilityMatrix
+from app.cores.config import AVAILABILITY_MATRIX_DAYS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def rebuild_slots(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        count = rebuild_room_day_slots(session, start_date=args.start_date)
+    logger.info(f"Rebuilt {count} RoomDaySlots rows")
+
+
+def check_matrix(args: argparse.Namespace) -> None:
+    matrix = AvailabilityMatrix(days=AVAILABILITY_MATRIX_DAYS)
+    if not matrix.enabled:
+        logger.error("numpy is not installed")
+        sys.exit(2)
+    matrix.load(engine)
+    with Session(engine) as session:
+        mismatches = matrix.verify(session, samples=args.samples)
+    for mismatch in mismatches:
+        logger.error(mismatch)
+    logger.info(f"{len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+
+def purge_tokens(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        count = purge_refresh_tokens(session)
+    logger.info(f"Deleted {count} expired refresh tokens")
+
+
+def purge_revocations(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        count = purge_token_revocations(session)
+    logger.info(f"Deleted {count} expired token revocations")
+
+
+def rebuild_stats(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        count = rebuild_booking_stats(session, start_date=args.start_date)
+    logger.info(f"Rebuilt {count} DailyBookingStats rows")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-slots", help="Backfill RoomDaySlots masks and SlotClaim rows from OrderRoom")
+    rebuild.add_argument("--from", dest="start_date", type=date.fromisoformat, default=None,
+                         help="Only rebuild room-days from this date (default: all)")
+    rebuild.set_defaults(func=rebuild_slots)
+
+    check = commands.add_parser("check-matrix", help="Check the availability matrix against the database")
+    check.add_argument("--samples", type=int, default=1000, help="Number of random check_room_availability probes")
+    check.set_defaults(func=check_matrix)
+
+    purge = commands.add_parser("purge-refresh-tokens", help="Delete expired refresh tokens")
+    purge.set_defaults(func=purge_tokens)
+
+    purge_revoked = commands.add_parser("purge-token-revocations", help="Delete expired access token revocations")
+    purge_revoked.set_defaults(func=purge_revocations)
+
+    stats = commands.add_parser("rebuild-booking-stats", help="Backfill DailyBookingStats from OrderRoom")
+    stats.add_argument("--from", dest="start_date", type=date.fromisoformat, default=None,
+                       help="Only rebuild days from this date (default: all)")
+    stats.set_defaults(func=rebuild_stats)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
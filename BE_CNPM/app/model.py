@@ -1,6 +1,8 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import DateTime, Index, Text
 from typing import Optional, List
 from datetime import datetime, date, time
+from datetime import date as date_type
 from uuid import uuid4
 
 # ======================= 1️⃣ User =======================
@@ -81,6 +83,14 @@ class RoomDevice(SQLModel, table=True):
 
 # ======================= 7️⃣ OrderRoom =======================
 class OrderRoom(SQLModel, table=True):
+    # Index cho các truy vấn theo phòng/ngày và theo người dùng/ngày trong crud_order;
+    # (date, begin, id) và (room_id, date, begin, id): thứ tự keyset của lịch admin (get_calendar_events)
+    __table_args__ = (
+        Index("ix_orderroom_room_id_date_begin_id", "room_id", "date", "begin", "id"),
+        Index("ix_orderroom_user_id_date", "user_id", "date"),
+        Index("ix_orderroom_date_begin_id", "date", "begin", "id"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     room_id: int = Field(foreign_key="room.id", ondelete="CASCADE")
     user_id: int = Field(foreign_key="user.id", ondelete="CASCADE")
@@ -109,6 +119,14 @@ class CancelRoom(SQLModel, table=True):
 
 # ======================= 9️⃣ UsedRoom =======================
 class UsedRoom(SQLModel, table=True):
+    '''
+    Lượt dùng phòng đã kết thúc (check-out chuyển ActiveSession sang đây).
+    date/checkin: lúc check-in; checkout_date/checkout: lúc check-out (có thể là ngày sau).
+    '''
+    __table_args__ = (
+        Index("ix_usedroom_user_id_date", "user_id", "date"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     order_id: int | None = Field(default=None, foreign_key="orderroom.id", ondelete="CASCADE")
     user_id: int = Field(foreign_key="user.id", ondelete="CASCADE")
@@ -117,6 +135,7 @@ class UsedRoom(SQLModel, table=True):
     date: date
     checkin: time
     checkout: time
+    checkout_date: Optional[date_type] = None  # None: dòng cũ, check-out cùng ngày
 
     order: Optional[OrderRoom] = Relationship(back_populates="used_rooms")
     user: Optional[User] = Relationship(back_populates="used_rooms")
@@ -126,7 +145,8 @@ class UsedRoom(SQLModel, table=True):
 # ======================= 10️⃣ Report =======================
 class Report(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    used_room_id: int = Field(foreign_key="usedroom.id", ondelete="CASCADE")
+    # None khi báo cáo lúc đang ở phòng; gắn vào UsedRoom khi check-out
+    used_room_id: Optional[int] = Field(default=None, foreign_key="usedroom.id", ondelete="CASCADE")
     user_id: int = Field(foreign_key="user.id", ondelete="CASCADE")
     room_id: int = Field(foreign_key="room.id", ondelete="CASCADE")
 
@@ -152,4 +172,112 @@ class Notification(SQLModel, table=True):
     date: datetime = Field(default_factory=datetime.now)
     is_read: bool = Field(default=False)
 
-    user: Optional[User] = Relationship(back_populates="notifications")
\ No newline at end of file
+    user: Optional[User] = Relationship(back_populates="notifications")
+
+# ======================= 1️⃣2️⃣ RoomDaySlots =======================
+class RoomDaySlots(SQLModel, table=True):
+    '''
+    Bitmap các giờ đã được đặt của một phòng trong một ngày.
+    Bit thứ h bật khi giờ [h, h+1) thuộc một OrderRoom chưa hủy.
+    '''
+    room_id: int = Field(foreign_key="room.id", primary_key=True, ondelete="CASCADE")
+    date: date_type = Field(primary_key=True)  # tránh trùng tên field với kiểu date
+    mask: int = 0
+
+# ======================= 1️⃣3️⃣ SlotClaim =======================
+class SlotClaim(SQLModel, table=True):
+    '''
+    Mỗi giờ của một OrderRoom chưa hủy giữ một dòng (room_id, date, hour).
+    Khóa chính trên (room_id, date, hour) chặn hai đơn cùng giữ một giờ, kể cả khi đặt đồng thời.
+    '''
+    room_id: int = Field(foreign_key="room.id", primary_key=True, ondelete="CASCADE")
+    date: date_type = Field(primary_key=True)
+    hour: int = Field(primary_key=True)
+    order_id: int = Field(foreign_key="orderroom.id", index=True, ondelete="CASCADE")
+
+# ======================= 1️⃣4️⃣ RefreshToken =======================
+class RefreshToken(SQLModel, table=True):
+    '''
+    Refresh token dạng "<id>.<secret>", chỉ lưu sha256 của secret.
+    Mỗi lần refresh, token cũ bị thu hồi và token mới cùng family_id được cấp;
+    dùng lại token đã thu hồi sẽ thu hồi cả family (trừ trong REFRESH_TOKEN_REUSE_GRACE_SECONDS
+    sau lần đổi, khi nhiều tab cùng refresh bằng 1 token).
+    '''
+    id: int = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True, ondelete="CASCADE")
+    family_id: int = Field(default=0, index=True)  # id của token đầu tiên trong chuỗi
+    token_hash: str = Field(max_length=64)
+    expires_at: datetime
+    revoked: bool = False
+    rotated_at: Optional[datetime] = None  # lúc đổi sang token mới (None: chưa đổi hoặc bị thu hồi)
+
+# ======================= 1️⃣5️⃣ TokenRevocation =======================
+class TokenRevocation(SQLModel, table=True):
+    '''
+    Change log thu hồi access token, các worker đọc theo id tăng dần (app.cores.revocation).
+    Có jti: thu hồi 1 token. Có user_id: thu hồi mọi token của user có iat <= revoked_at.
+    '''
+    id: int = Field(default=None, primary_key=True)
+    jti: Optional[str] = Field(default=None, max_length=32)
+    user_id: Optional[int] = None
+    revoked_at: datetime
+    expires_at: datetime = Field(index=True)
+
+# ======================= 1️⃣6️⃣ ActiveSession =======================
+class ActiveSession(SQLModel, table=True):
+    '''
+    Người đang ở trong phòng: mỗi user tối đa 1 dòng (khóa chính user_id).
+    Check-in tạo dòng này, check-out xóa nó và ghi 1 dòng UsedRoom.
+    '''
+    user_id: int = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    room_id: int = Field(foreign_key="room.id", index=True, ondelete="CASCADE")
+    order_id: Optional[int] = Field(default=None, foreign_key="orderroom.id", ondelete="CASCADE")
+    started_at: datetime = Field(sa_type=DateTime)  # giờ địa phương, cùng hệ với UsedRoom.date/checkin
+
+# ======================= 1️⃣7️⃣ DailyBookingStats =======================
+class DailyBookingStats(SQLModel, table=True):
+    '''
+    Số liệu đặt phòng theo ngày × cơ sở × tòa nhà × loại phòng (ngày = OrderRoom.date),
+    cập nhật trong cùng transaction với đặt/hủy/check-in (app.crud.crud_stats).
+    No-show = bookings - cancellations - checkins của các ngày đã qua.
+    '''
+    date: date_type = Field(primary_key=True)
+    branch_id: int = Field(foreign_key="branch.id", primary_key=True, ondelete="CASCADE")
+    building_id: int = Field(foreign_key="building.id", primary_key=True, ondelete="CASCADE")
+    type_id: int = Field(foreign_key="roomtype.id", primary_key=True, ondelete="CASCADE")
+    bookings: int = 0
+    cancellations: int = 0  # hủy khi chưa check-in
+    checkins: int = 0
+
+# ======================= 1️⃣8️⃣ RoomEvent =======================
+class RoomEvent(SQLModel, table=True):
+    '''
+    Change log sự kiện trạng thái phòng (app.cores.room_events): mỗi transaction có sự kiện ghi 1 dòng,
+    các worker khác đọc theo id tăng dần và phát cho client SSE của mình. Dòng cũ bị xóa sau vài phút.
+    '''
+    id: int = Field(default=None, primary_key=True)
+    worker: str = Field(max_length=32)  # worker đã ghi (và đã tự phát) các sự kiện này
+    payload: str = Field(sa_type=Text)  # danh sách sự kiện dạng JSON
+    created_at: datetime = Field(index=True)
+
+# ======================= 1️⃣9️⃣ HeatmapChange =======================
+class HeatmapChange(SQLModel, table=True):
+    '''
+    Change log các (phòng, ngày) có đơn/lượt dùng thay đổi (app.cores.analytics): các worker khác
+    đọc theo id tăng dần và xóa heatmap đã cache chứa các ngày đó. Dòng cũ bị xóa sau vài phút.
+    '''
+    id: int = Field(default=None, primary_key=True)
+    worker: str = Field(max_length=32)
+    payload: str = Field(sa_type=Text)  # JSON: [[room_id, "YYYY-MM-DD"], ...] hoặc "all"
+    created_at: datetime = Field(index=True)
+
+# ======================= 2️⃣0️⃣ UserCacheEviction =======================
+class UserCacheEviction(SQLModel, table=True):
+    '''
+    Change log các user có hồ sơ vừa thay đổi (app.crud.crud_user): các worker khác đọc
+    theo id tăng dần và xóa user đó khỏi cache User. Dòng cũ bị xóa sau vài phút.
+    '''
+    id: int = Field(default=None, primary_key=True)
+    worker: str = Field(max_length=32)
+    payload: str = Field(sa_type=Text)  # JSON: user_id
+    created_at: datetime = Field(index=True)
@@ -13,4 +13,13 @@ class getUser(BaseModel):
 
 class changeUserStatus(BaseModel):
     msg: str
-    data: None | User
\ No newline at end of file
+    data: None | User
+
+class matrixCheck(BaseModel):
+    msg: str
+    data: List[str] = []
+
+
+class poolStatus(BaseModel):
+    msg: str
+    data: dict
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from app.model import Room,OrderRoom, CancelRoom, User, Room, Branch, Building, RoomType, UsedRoom, Report
+from app.schemas.metadata import Metadata
+from app.model import Room,OrderRoom, CancelRoom, User, Room, Branch, Building, RoomType, UsedRoom, ActiveSession, Report
 from datetime import datetime, date, time
 
 
@@ -29,12 +30,12 @@ class CheckOut2(BaseModel):
 
 class Report(BaseModel):
     room_id: int
-    led: bool = True,
-    air_conditioner: bool = True,
-    socket: bool =True,
-    projector: bool = True,
-    interactive_display: bool = True,
-    online_meeting_devices: bool = True,
+    led: bool = True
+    air_conditioner: bool = True
+    socket: bool =True
+    projector: bool = True
+    interactive_display: bool = True
+    online_meeting_devices: bool = True
     description: str | None = "Short description of the problem"
 
 
@@ -54,4 +55,67 @@ class OrderRoomOut(BaseModel):
 
 class responseorder(BaseModel):
     msg: str
-    data: User|Report|OrderRoomOut|Room|OrderRoom|CancelRoom|UsedRoom|List[Report]|List[Room]|List[OrderRoom]|List[CancelRoom]|List[UsedRoom]|List[OrderRoomOut]|None = None
\ No newline at end of file
+    data: User|Report|OrderRoomOut|Room|OrderRoom|CancelRoom|UsedRoom|ActiveSession|List[Report]|List[Room]|List[OrderRoom]|List[CancelRoom]|List[UsedRoom]|List[OrderRoomOut]|None = None
+    metadata: Metadata|None = None
+
+class LibraryOccupancy(BaseModel):
+    room_id: int
+    quantity: int
+
+class responselibrary(BaseModel):
+    msg: str
+    data: LibraryOccupancy|None = None
+
+class FreeSlot(BaseModel):
+    room_id: int
+    no_room: str
+    branch_id: int
+    building_id: int
+    type_id: int
+    date: date
+    start_time: int  # giờ bắt đầu sớm nhất
+    end_time: int  # start_time + duration
+    free_until: int  # phòng còn trống liên tục tới giờ này
+
+class responsefreeslot(BaseModel):
+    msg: str
+    data: List[FreeSlot] = []
+    metadata: Metadata|None = None
+
+class AvailabilityCell(BaseModel):
+    room_id: int
+    date: date
+    start_time: int = Field(ge=0, le=23)
+    end_time: int = Field(ge=1, le=24)
+
+MAX_AVAILABILITY_CELLS = 5000
+
+class AvailabilityBatchIn(BaseModel):
+    # Quá số ô: bị từ chối ngay lúc validate (422), không dựng hết danh sách rồi mới kiểm tra
+    cells: List[AvailabilityCell] = Field(default_factory=list, max_length=MAX_AVAILABILITY_CELLS)
+
+class RoomDayMask(BaseModel):
+    room_id: int
+    date: date
+    mask: int  # bit h = 1: giờ h đã được đặt
+
+class AvailabilityBatch(BaseModel):
+    days: List[RoomDayMask] = []
+    free: List[bool] = []  # theo thứ tự cells trong request
+
+class responseavailability(BaseModel):
+    msg: str
+    data: AvailabilityBatch
+
+class CalendarEvent(BaseModel):
+    id: int  # OrderRoom.id
+    room_id: int
+    date: date
+    begin: time
+    end: time
+    state: str  # booked | used | cancelled
+
+class responsecalendar(BaseModel):
+    msg: str
+    data: List[CalendarEvent] = []
+    next_cursor: Optional[str] = None  # truyền vào `after` để lấy trang sau, None: hết
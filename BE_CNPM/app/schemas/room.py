@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import datetime
 from app.model import Room, Branch, Building, RoomType
 from app.schemas.metadata import Metadata
 class Branch_In(BaseModel):
@@ -43,4 +44,35 @@ class reponse(BaseModel):
     msg: str
     data: Room|Branch|Building|RoomType|None|List[Room]|List[Branch]|List[Building]|List[RoomType]
     metadata: Metadata|None = None
-    
\ No newline at end of file
+
+
+class Occupant(BaseModel):
+    user_id: int
+    MSSV: int|None = None
+    lastname: str
+    firstname: str
+    order_id: int|None = None
+    started_at: datetime
+
+class RoomOccupancy(BaseModel):
+    room_id: int
+    no_room: str
+    type_name: str
+    active: bool
+    max_quantity: int|None = None
+    quantity: int|None = None
+    occupants: List[Occupant] = []
+
+class BuildingOccupancy(BaseModel):
+    building_id: int
+    building_name: str
+    rooms: List[RoomOccupancy] = []
+
+class BranchOccupancy(BaseModel):
+    branch_id: int
+    branch_name: str
+    buildings: List[BuildingOccupancy] = []
+
+class responseoccupancy(BaseModel):
+    msg: str
+    data: List[BranchOccupancy] = []
@@ -0,0 +1,57 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date
+
+
+class TimeseriesPoint(BaseModel):
+    period: date  # ngày đầu của kỳ (thứ Hai với week, ngày 1 với month)
+    bookings: int = 0
+    cancellations: int = 0
+    checkins: int = 0
+    no_shows: int = 0
+
+class responsetimeseries(BaseModel):
+    msg: str
+    data: List[TimeseriesPoint] = []
+
+
+class UtilizationMetrics(BaseModel):
+    bookings: int = 0  # đơn không bị hủy trước khi dùng
+    booked_hours: float = 0
+    used_sessions: int = 0
+    used_hours: float = 0
+    utilization: Optional[float] = None  # used_hours / booked_hours
+    no_shows: int = 0
+    no_show_rate: Optional[float] = None  # chỉ tính các ngày đã qua
+    mean_checkin_delay_minutes: Optional[float] = None  # âm = check-in sớm
+
+class RoomUtilization(UtilizationMetrics):
+    room_id: int
+    no_room: str
+    branch_id: int
+    building_id: int
+    type_name: str
+
+class Utilization(BaseModel):
+    rooms: List[RoomUtilization] = []
+    total: UtilizationMetrics
+    orders: int = 0  # số dòng OrderRoom đã đọc
+    used_rooms: int = 0  # số dòng UsedRoom đã đọc
+
+class responseutilization(BaseModel):
+    msg: str
+    data: Utilization
+
+
+class Heatmap(BaseModel):
+    building_id: int
+    date_from: date
+    date_to: date
+    rooms: int  # số phòng của tòa nhà
+    days: List[int]  # số thứ Hai..Chủ nhật trong khoảng ngày
+    booked: List[List[float]]  # [thứ][giờ]: số phòng được đặt trung bình, thứ Hai trước
+    used: List[List[float]]  # [thứ][giờ]: số lượt đang check-in trung bình (thư viện: số người)
+
+class responseheatmap(BaseModel):
+    msg: str
+    data: Heatmap
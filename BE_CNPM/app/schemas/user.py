@@ -49,6 +49,10 @@ class Token_json(BaseModel):
     msg: str
     data: None | dict = None
     access_token: None | str = None
+    refresh_token: None | str = None
+
+class RefreshIn(BaseModel):
+    refresh_token: str
 
 class UpdateUser(BaseModel):
     lastname: str | None = None
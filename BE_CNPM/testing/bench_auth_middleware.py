@@ -0,0 +1,125 @@
+'''
+Micro-benchmark chi phí middleware JWT trên mỗi request, chạy từ thư mục BE_CNPM:
+
+    SECRET_KEY=... ADMIN_SECRET_KEY=... python -m testing.bench_auth_middleware [-n 20000]
+
+So sánh 3 app giống nhau, chỉ khác middleware:
+    none    : không có middleware (mốc)
+    before  : @app.middleware("http") cũ (BaseHTTPMiddleware + print + quét public_paths)
+    after   : JWTAuthMiddleware (ASGI thuần + regex prefix)
+Request được gọi thẳng vào ASGI app (không qua socket) để chỉ đo phần middleware.
+'''
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.api.middleware import JWTAuthMiddleware, AccessRule
+from app.cores.config import API_V1_STR
+from app.cores.security import create_access_token, decode_access_token
+
+
+def build_app(kind: str) -> FastAPI:
+    app = FastAPI()
+
+    if kind == "before":
+        # Bản sao middleware cũ trong app/main.py
+        @app.middleware("http")
+        async def jwt_middleware(request: Request, call_next):
+            print(f"🚀 Middleware chạy!")
+            print(f"👉 Path: {request.url.path}")
+            print(f"👉 Method: {request.method}")
+            print(f"👉 Authorization: {request.headers.get('Authorization')}")
+            if request.method == "OPTIONS":
+                return await call_next(request)
+            public_paths = [f"{API_V1_STR}/auth", "/default", "/docs", "/openapi.json"]
+            print(f"Public paths: {public_paths}")
+            if any(request.url.path.startswith(path) for path in public_paths):
+                return await call_next(request)
+            token = request.headers.get("Authorization", "").replace("Bearer ", "")
+            print(f"Token: {token}")
+            if not token:
+                return JSONResponse(status_code=401, content={"detail": "Missing token"})
+            try:
+                data = decode_access_token(token)
+                if request.url.path.startswith(f"{API_V1_STR}/admin"):
+                    if not data.get("isadmin"):
+                        return JSONResponse(status_code=403, content={"detail": "Admin role required"})
+                elif request.url.path.startswith(f"{API_V1_STR}/user"):
+                    if not data.get("isuser"):
+                        return JSONResponse(status_code=403, content={"detail": "User role required"})
+            except HTTPException as e:
+                return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            print("👉 Token hợp lệ, tiếp tục xử lý request")
+            return await call_next(request)
+    elif kind == "after":
+        app.add_middleware(
+            JWTAuthMiddleware,
+            rules=[
+                AccessRule(f"{API_V1_STR}/auth", public=True),
+                AccessRule(f"{API_V1_STR}/admin", role="isadmin"),
+                AccessRule(f"{API_V1_STR}/user", role="isuser"),
+                AccessRule("/default", public=True),
+                AccessRule("/docs", public=True),
+                AccessRule("/openapi.json", public=True),
+            ],
+        )
+
+    @app.get(f"{API_V1_STR}/user/ping")
+    async def ping():
+        return {"msg": "pong"}
+
+    return app
+
+
+async def run(app: FastAPI, token: str, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": f"{API_V1_STR}/user/ping", "raw_path": b"",
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    status = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    # Làm nóng
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+    assert status["code"] == 200, status
+
+    started = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000, help="Requests per app")
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "bench", "uid": 1, "isuser": True, "isadmin": False, "isactive": True})
+    results = {}
+    # print của middleware cũ vẫn được định dạng và ghi, chỉ không hiện ra màn hình
+    with contextlib.redirect_stdout(io.StringIO()):
+        for kind in ("none", "before", "after"):
+            results[kind] = asyncio.run(run(build_app(kind), token, args.n))
+
+    for kind, micros in results.items():
+        overhead = micros - results["none"]
+        print(f"{kind:>6}: {micros:8.1f} us/request   middleware overhead {overhead:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
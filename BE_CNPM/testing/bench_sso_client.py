@@ -0,0 +1,74 @@
+'''
+Benchmark SSOClient với fake SSO (testing/fake_sso.py) chạy trong cùng tiến trình:
+
+    SECRET_KEY=... ADMIN_SECRET_KEY=... python -m testing.bench_sso_client [-n 500] [-c 50] [--latency-ms 20]
+
+--no-pool tạo transport mới cho mỗi lần đăng nhập (không dùng lại connection) để so sánh.
+'''
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+import uvicorn
+
+from app.cores.sso import SSOClient
+from testing.fake_sso import create_app
+
+
+def start_fake_sso(users: int, latency_ms: float) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(users, latency_ms), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run(base_url: str, n: int, concurrency: int, users: int, pooled: bool) -> None:
+    client = SSOClient(base_url, base_url, timeout=10, connect_timeout=3, max_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            sso = client if pooled else SSOClient(base_url, base_url, timeout=10, connect_timeout=3, max_connections=1)
+            started = time.perf_counter()
+            result = await sso.get_information(f"student{i % users}", f"pass{i % users}")
+            latencies.append(time.perf_counter() - started)
+            if not pooled:
+                await sso.aclose()
+            if result["status"] != "success":
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+
+    latencies.sort()
+    print(f"{'pooled' if pooled else 'no pool'}: {n} logins, concurrency {concurrency}: "
+          f"{n / elapsed:.0f} logins/s, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, failures {failures}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500, help="Number of logins")
+    parser.add_argument("-c", type=int, default=50, help="Concurrent logins")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay of the fake SSO per response")
+    parser.add_argument("--no-pool", action="store_true", help="New connections for every login")
+    args = parser.parse_args()
+
+    base_url = start_fake_sso(args.users, args.latency_ms)
+    asyncio.run(run(base_url, args.n, args.c, args.users, pooled=not args.no_pool))
+
+
+if __name__ == "__main__":
+    main()
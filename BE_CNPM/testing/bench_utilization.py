@@ -0,0 +1,167 @@
+'''
+Bench thống kê mức sử dụng phòng (app.cores.analytics), chạy từ thư mục BE_CNPM:
+
+    SECRET_KEY=... ADMIN_SECRET_KEY=... python -m testing.bench_utilization [-n 1000000] [--rooms 200] [--loop] [--memory]
+
+Tạo 1 chi nhánh tạm với --rooms phòng và -n đơn đặt phòng ngẫu nhiên trong 1 học kỳ
+(~60% có check-in trong UsedRoom), đo compute_utilization với vài kích thước khối và compute_heatmap rồi xóa dữ liệu tạm.
+--loop chạy thêm cách cũ (đọc từng OrderRoom/UsedRoom thành object rồi cộng trong Python) để so sánh
+và kiểm tra hai cách cho cùng kết quả. --memory đo bộ nhớ Python cao nhất (tracemalloc, chạy chậm hơn).
+Dùng DATABASE_URL đang cấu hình.
+'''
+import argparse
+import random
+import sys
+import time as clock
+import tracemalloc
+from datetime import date, time, timedelta
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from app.cores import analytics
+from app.cores.db import engine
+from app.model import Branch, Building, OrderRoom, Room, RoomType, UsedRoom, User
+
+INSERT_BATCH = 20000
+
+
+def create_rooms(count: int) -> tuple:
+    with Session(engine) as session:
+        room_type = session.exec(select(RoomType)).first()
+        if not room_type:
+            room_type = RoomType(type_name="Individual", max_capacity=1)
+            session.add(room_type)
+        branch = Branch(branch_name="benchutil")
+        user = User(username="benchutil", password="-", email="benchutil@local", MSSV=None,
+                    lastname="bench", firstname="util")
+        session.add(branch)
+        session.add(user)
+        session.flush()
+        building = Building(branch_id=branch.id, building_name="benchutil")
+        session.add(building)
+        session.flush()
+        rooms = [Room(branch_id=branch.id, building_id=building.id, type_id=room_type.id,
+                      no_room=f"bench{i}", max_quantity=1, quantity=0) for i in range(count)]
+        session.add_all(rooms)
+        session.commit()
+        return branch.id, building.id, user.id, [room.id for room in rooms]
+
+
+def fill(user_id: int, room_ids: list, orders: int, first_day: date, days: int) -> None:
+    rng = random.Random(42)
+    with Session(engine) as session:
+        next_id = (session.exec(select(OrderRoom.id).order_by(OrderRoom.id.desc())).first() or 0) + 1
+        for start in range(0, orders, INSERT_BATCH):
+            order_rows, used_rows = [], []
+            for order_id in range(next_id + start, next_id + min(start + INSERT_BATCH, orders)):
+                day = first_day + timedelta(days=rng.randrange(days))
+                begin = rng.randrange(7, 19)
+                used = rng.random() < 0.6
+                order_rows.append({"id": order_id, "room_id": rng.choice(room_ids), "user_id": user_id,
+                                   "date": day, "begin": time(begin), "end": time(begin + rng.randint(1, 2)),
+                                   "is_used": used, "is_cancel": used or rng.random() < 0.15})
+                if used:
+                    checkin = time(begin, rng.randrange(0, 30))
+                    used_rows.append({"order_id": order_id, "room_id": order_rows[-1]["room_id"], "user_id": user_id,
+                                      "date": day, "checkin": checkin, "checkout": time(begin + 1, rng.randrange(60)),
+                                      "checkout_date": day})
+            session.execute(insert(OrderRoom), order_rows)
+            if used_rows:
+                session.execute(insert(UsedRoom), used_rows)
+            session.commit()
+
+
+def drop_rooms(branch_id: int, building_id: int, user_id: int, room_ids: list) -> None:
+    with Session(engine) as session:
+        session.execute(delete(UsedRoom).where(UsedRoom.room_id.in_(room_ids)))
+        session.execute(delete(OrderRoom).where(OrderRoom.room_id.in_(room_ids)))
+        session.execute(delete(Room).where(Room.id.in_(room_ids)))
+        session.execute(delete(Building).where(Building.id == building_id))
+        session.execute(delete(Branch).where(Branch.id == branch_id))
+        session.execute(delete(User).where(User.id == user_id))
+        session.commit()
+
+
+def loop_utilization(session: Session, branch_id: int, date_from: date, date_to: date) -> dict:
+    # Cách cũ: đọc toàn bộ object rồi cộng từng dòng
+    rooms = [room.id for room in session.exec(select(Room).where(Room.branch_id == branch_id))]
+    booked_hours = used_hours = 0.0
+    bookings = 0
+    for order in session.exec(select(OrderRoom).where(OrderRoom.room_id.in_(rooms),
+                                                       OrderRoom.date >= date_from, OrderRoom.date <= date_to)).all():
+        if order.is_cancel and not order.is_used:
+            continue
+        bookings += 1
+        booked_hours += (order.end.hour * 60 + order.end.minute - order.begin.hour * 60 - order.begin.minute) / 60
+    for used in session.exec(select(UsedRoom).where(UsedRoom.room_id.in_(rooms),
+                                                     UsedRoom.date >= date_from, UsedRoom.date <= date_to)).all():
+        used_hours += (used.checkout.hour * 60 + used.checkout.minute + used.checkout.second / 60
+                       - used.checkin.hour * 60 - used.checkin.minute - used.checkin.second / 60) / 60
+    return {"bookings": bookings, "booked_hours": round(booked_hours, 2), "used_hours": round(used_hours, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--orders", type=int, default=1_000_000)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--days", type=int, default=120, help="Length of the semester")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--loop", action="store_true", help="Also run the row-by-row Python loop")
+    parser.add_argument("--memory", action="store_true", help="Trace peak Python memory (slower)")
+    args = parser.parse_args()
+    if not analytics.ENABLED:
+        sys.exit("numpy is required")
+
+    first_day = date.today() - timedelta(days=args.days)
+    last_day = first_day + timedelta(days=args.days - 1)
+    branch_id, building_id, user_id, room_ids = create_rooms(args.rooms)
+    try:
+        started = clock.perf_counter()
+        fill(user_id, room_ids, args.orders, first_day, args.days)
+        print(f"inserted {args.orders} orders in {clock.perf_counter() - started:.1f}s")
+
+        failed = False
+        for chunk_size in args.chunks:
+            with Session(engine) as session:
+                if args.memory:
+                    tracemalloc.start()
+                started = clock.perf_counter()
+                result = analytics.compute_utilization(session, first_day, last_day,
+                                                       branch_id=branch_id, chunk_size=chunk_size)
+                elapsed = clock.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] if args.memory else 0
+                tracemalloc.stop()
+            total = result["total"]
+            print(f"numpy chunk={chunk_size}: {result['orders']} orders + {result['used_rooms']} used rooms "
+                  f"in {elapsed:.2f}s{f', peak {peak / 2**20:.1f} MiB' if args.memory else ''}, utilization {total['utilization']}, "
+                  f"no-show rate {total['no_show_rate']}, delay {total['mean_checkin_delay_minutes']} min")
+
+        with Session(engine) as session:
+            started = clock.perf_counter()
+            heatmap = analytics.compute_heatmap(session, building_id, first_day, last_day)
+            elapsed = clock.perf_counter() - started
+        busiest = max((value, day, hour) for day, row in enumerate(heatmap["booked"]) for hour, value in enumerate(row))
+        print(f"heatmap: {elapsed:.2f}s, busiest weekday {busiest[1]} hour {busiest[2]}: {busiest[0]} booked rooms")
+
+        if args.loop:
+            with Session(engine) as session:
+                if args.memory:
+                    tracemalloc.start()
+                started = clock.perf_counter()
+                expected = loop_utilization(session, branch_id, first_day, last_day)
+                elapsed = clock.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] if args.memory else 0
+                tracemalloc.stop()
+            print(f"loop: {elapsed:.2f}s{f', peak {peak / 2**20:.1f} MiB' if args.memory else ''}")
+            for key, value in expected.items():
+                if abs(total[key] - value) > 0.01:
+                    print(f"mismatch {key}: numpy {total[key]}, loop {value}")
+                    failed = True
+    finally:
+        drop_rooms(branch_id, building_id, user_id, room_ids)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+'''
+Fake SSO (CAS) + MyBK chạy local, đủ các bước mà app.cores.sso.SSOClient gọi.
+Dùng để test/bench đăng nhập lần đầu mà không gọi server thật của trường.
+
+    python -m testing.fake_sso --port 8081 --latency-ms 50
+
+Sau đó chạy backend với:
+    SSO_BASE_URL=http://127.0.0.1:8081 MYBK_BASE_URL=http://127.0.0.1:8081
+
+Tài khoản hợp lệ: student<i> / pass<i> với i trong [0, --users).
+'''
+import argparse
+import asyncio
+import base64
+import json
+import secrets
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+
+LOGIN_PAGE = '''<html><body><form method="post">
+<input type="text" name="username"/><input type="password" name="password"/>
+<input type="hidden" name="lt" value="{lt}"/>
+<input type="hidden" name="execution" value="e1s1"/>
+<input type="hidden" name="_eventId" value="submit"/>
+</form>{error}</body></html>'''
+
+RECORDS_PAGE = '''<html><body><input type="hidden" id="hid_Token" value="{token}"/></body></html>'''
+
+
+def _fake_jwt(payload: dict) -> str:
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{part({'alg': 'none'})}.{part(payload)}.signature"
+
+
+def create_app(users: int = 1000, latency_ms: float = 0) -> FastAPI:
+    app = FastAPI(title="Fake SSO")
+    tickets = {}   # lt -> True
+    sessions = {}  # cookie mybk -> MSSV
+    tokens = {}    # token -> MSSV
+
+    def code_of(username: str):
+        if username.startswith("student") and username[7:].isdigit() and int(username[7:]) < users:
+            return 2000000 + int(username[7:])
+        return None
+
+    @app.middleware("http")
+    async def latency(request: Request, call_next):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return await call_next(request)
+
+    @app.get("/cas/login")
+    async def login_page():
+        lt = f"LT-{secrets.token_hex(8)}"
+        tickets[lt] = True
+        return HTMLResponse(LOGIN_PAGE.format(lt=lt, error=""))
+
+    @app.post("/cas/login")
+    async def login(service: str, request: Request):
+        # Tự đọc form urlencoded để không cần python-multipart
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+        username, password, lt = form.get("username", ""), form.get("password", ""), form.get("lt", "")
+        code = code_of(username)
+        if not tickets.pop(lt, None) or code is None or password != f"pass{username[7:]}":
+            lt = f"LT-{secrets.token_hex(8)}"
+            tickets[lt] = True
+            return HTMLResponse(LOGIN_PAGE.format(lt=lt, error="Invalid credentials"), status_code=401)
+        ticket = f"ST-{code}-{secrets.token_hex(4)}"
+        return RedirectResponse(f"{service}?ticket={ticket}", status_code=302)
+
+    @app.get("/app/login/cas")
+    async def service_login(ticket: str):
+        code = int(ticket.split("-")[1])
+        cookie = secrets.token_hex(16)
+        sessions[cookie] = code
+        response = RedirectResponse("/app/", status_code=302)
+        response.set_cookie("mybk", cookie)
+        return response
+
+    @app.get("/app/")
+    async def home():
+        return HTMLResponse("<html><body>MyBK</body></html>")
+
+    @app.get("/app/he-thong-quan-ly/sinh-vien/ket-qua-hoc-tap")
+    async def records(request: Request):
+        code = sessions.get(request.cookies.get("mybk"))
+        if code is None:
+            return RedirectResponse("/app/", status_code=302)
+        token = _fake_jwt({"profiles": json.dumps({"personId": code})})
+        tokens[token] = code
+        return HTMLResponse(RECORDS_PAGE.format(token=token))
+
+    @app.get("/api/v1/student/detail-info-by-code/{code}")
+    async def detail(code: int, request: Request):
+        token = request.headers.get("Authorization", "").replace("Bearer ", "")
+        if tokens.get(token) != code:
+            return JSONResponse({"message": "Unauthorized"}, status_code=401)
+        i = code - 2000000
+        return {"data": {
+            "code": code,
+            "lastName": "Nguyen",
+            "firstName": f"Student {i}",
+            "orgEmail": f"student{i}@hcmut.edu.vn",
+        }}
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m testing.fake_sso")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.users, args.latency_ms), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+'''
+Load test bộ đếm người trong thư viện (checkin_library / checkout_library), chạy từ thư mục BE_CNPM:
+
+    SECRET_KEY=... ADMIN_SECRET_KEY=... python -m testing.load_library_counters [-t 32] [-n 200] [--capacity 16]
+
+Mỗi thread lặp: check-in rồi check-out cùng một phòng thư viện tạm (tạo mới, xóa khi xong).
+Cuối cùng so sánh Room.quantity trong DB với (số check-in thành công - số check-out thành công);
+lệch nhau (drift) hoặc occupancy vượt sức chứa là lỗi. --legacy chạy lại cách cũ
+(đọc quantity rồi ghi quantity+1) để so sánh.
+Dùng DATABASE_URL đang cấu hình; nên chạy trên MySQL để thấy rõ race của cách cũ.
+'''
+import argparse
+import sys
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from app.cores.db import engine
+from app.crud.crud_order import checkin_library, checkout_library
+from app.model import Branch, Building, Room, RoomType
+
+
+def create_library(capacity: int) -> int:
+    with Session(engine) as session:
+        library_type = session.exec(select(RoomType).where(RoomType.type_name == "Library")).first()
+        if not library_type:
+            library_type = RoomType(type_name="Library", max_capacity=capacity)
+            session.add(library_type)
+        branch = Branch(branch_name="loadtest")
+        session.add(branch)
+        session.flush()
+        building = Building(branch_id=branch.id, building_name="loadtest")
+        session.add(building)
+        session.flush()
+        room = Room(branch_id=branch.id, building_id=building.id, type_id=library_type.id,
+                    no_room="loadtest", max_quantity=capacity, quantity=0)
+        session.add(room)
+        session.commit()
+        return room.id
+
+
+def drop_library(room_id: int) -> None:
+    with Session(engine) as session:
+        room = session.get(Room, room_id)
+        branch = session.get(Branch, room.branch_id)
+        session.delete(room)
+        session.delete(session.get(Building, room.building_id))
+        session.delete(branch)
+        session.commit()
+
+
+def legacy_change(session: Session, room_id: int, delta: int) -> int:
+    # Cách cũ: đọc rồi ghi, không khóa dòng
+    room = session.get(Room, room_id)
+    if delta > 0 and room.quantity > room.max_quantity:
+        raise HTTPException(status_code=400, detail="Library is not available now")
+    if delta < 0 and room.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Library is not available now")
+    room.quantity = room.quantity + delta
+    session.add(room)
+    session.commit()
+    return room.quantity
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--threads", type=int, default=32)
+    parser.add_argument("-n", "--iterations", type=int, default=200, help="Check-in/check-out pairs per thread")
+    parser.add_argument("--capacity", type=int, default=16, help="Keep it below --threads so the limit is hit")
+    parser.add_argument("--legacy", action="store_true", help="Use the old read-modify-write update")
+    args = parser.parse_args()
+
+    room_id = create_library(args.capacity)
+    checkin = (lambda s: legacy_change(s, room_id, 1)) if args.legacy else (lambda s: checkin_library(s, room_id))
+    checkout = (lambda s: legacy_change(s, room_id, -1)) if args.legacy else (lambda s: checkout_library(s, room_id))
+
+    lock = threading.Lock()
+    counts = {"in": 0, "out": 0, "full": 0, "errors": 0, "max_seen": 0}
+
+    def worker() -> None:
+        for _ in range(args.iterations):
+            for kind, action in (("in", checkin), ("out", checkout)):
+                with Session(engine) as session:
+                    try:
+                        quantity = action(session)
+                    except HTTPException:
+                        with lock:
+                            counts["full"] += 1
+                        continue
+                    except Exception:
+                        with lock:
+                            counts["errors"] += 1
+                        continue
+                with lock:
+                    counts[kind] += 1
+                    counts["max_seen"] = max(counts["max_seen"], quantity)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with Session(engine) as session:
+        final = session.get(Room, room_id).quantity
+    drop_library(room_id)
+
+    expected = counts["in"] - counts["out"]
+    drift = final - expected
+    operations = counts["in"] + counts["out"] + counts["full"] + counts["errors"]
+    print(f"{'legacy' if args.legacy else 'atomic'}: {operations} operations in {elapsed:.2f}s "
+          f"({operations / elapsed:.0f} ops/s), {args.threads} threads")
+    print(f"check-in {counts['in']}, check-out {counts['out']}, rejected {counts['full']}, errors {counts['errors']}")
+    print(f"final quantity {final}, expected {expected}, drift {drift}, "
+          f"max occupancy seen {counts['max_seen']} / capacity {args.capacity}")
+    sys.exit(1 if drift or counts["max_seen"] > args.capacity else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import { createContext, useContext, useState, ReactNode, useEffect } from "react";
 import { fetchInitialData } from "./api/apiService";
+import api from "./api/axiosConfig";
 
 // Định nghĩa cấu trúc User dựa trên API response
 interface User {
@@ -26,7 +27,7 @@ interface AuthContextType {
   token: string | null;
   isAuthenticated: boolean;
   facilities: Facility[];
-  login: (userData: User, token: string) => void;
+  login: (userData: User, token: string, refreshToken?: string) => void;
   logout: () => void;
 }
 
@@ -79,23 +80,32 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   }, []);
 
   // Hàm login: Lưu user và token
-  const login = (userData: User, token: string) => {
+  const login = (userData: User, token: string, refreshToken?: string) => {
     setUser(userData);
     setToken(token);
     setIsAuthenticated(true);
     localStorage.setItem(LOCAL_STORAGE_KEY, JSON.stringify(userData));
     localStorage.setItem("token", token);
+    if (refreshToken) {
+      localStorage.setItem("refresh_token", refreshToken);
+    }
     console.log("Đã lưu token vào localStorage:", token);
   };
 
   // Hàm logout: Xóa user và token
   const logout = () => {
+    // Thu hồi refresh token trên server, không cần chờ kết quả
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (refreshToken) {
+      api.post("/api/v1/auth/logout", { refresh_token: refreshToken }).catch(() => {});
+    }
     setUser(null);
     setToken(null);
     setIsAuthenticated(false);
     setFacilities([]);
     localStorage.removeItem(LOCAL_STORAGE_KEY);
     localStorage.removeItem("token");
+    localStorage.removeItem("refresh_token");
   };
 
   return (
@@ -106,12 +106,9 @@ interface RoomResponse {
 interface CheckinResponse {
   msg: string;
   data: {
-    id: number;
     room_id: number;
     user_id: number;
-    date: string;
-    checkin: string;
-    checkout: string;
+    started_at: string;
     order_id: number;
   };
 }
@@ -199,6 +196,58 @@ export const searchRooms = async (params: {
   }
 };
 
+export interface FreeSlot {
+  room_id: number;
+  no_room: string;
+  branch_id: number;
+  building_id: number;
+  type_id: number;
+  date: string;
+  start_time: number;
+  end_time: number;
+  free_until: number;
+}
+
+export const findSlots = async (params: {
+  duration: number;
+  building_id?: number;
+  branch_id?: number;
+  type_id?: number;
+  date_from?: string;
+  date_to?: string;
+  limitation?: number;
+}): Promise<FreeSlot[]> => {
+  try {
+    const response = await api.get('/api/v1/user/findslot', { params });
+    return response.data.data || [];
+  } catch (error: any) {
+    console.error('Error finding free slots:', error);
+    throw error;
+  }
+};
+
+export interface AvailabilityCell {
+  room_id: number;
+  date: string; // YYYY-MM-DD
+  start_time: number;
+  end_time: number;
+}
+
+export interface AvailabilityBatch {
+  days: { room_id: number; date: string; mask: number }[]; // bit h = giờ h đã được đặt
+  free: boolean[]; // theo thứ tự cells
+}
+
+export const checkAvailability = async (cells: AvailabilityCell[]): Promise<AvailabilityBatch> => {
+  try {
+    const response = await api.post('/api/v1/user/availability', { cells });
+    return response.data.data;
+  } catch (error: any) {
+    console.error('Error checking availability:', error);
+    throw error;
+  }
+};
+
 export const orderRoom = async (params: {
   room_id: number;
   date: number;
@@ -307,4 +356,150 @@ export const getOrdersByFilter = async (params: {
     console.error('Error fetching orders by filter:', error.response?.data || error.message);
     throw error.response?.data || error;
   }
-};
\ No newline at end of file
+};
+
+// Lịch đặt phòng của 1 tòa nhà theo khoảng ngày, đọc hết các trang (keyset cursor)
+export interface CalendarEvent {
+  id: number;
+  room_id: number;
+  date: string;
+  begin: string; // HH:mm:ss
+  end: string;
+  state: 'booked' | 'used' | 'cancelled';
+}
+
+export const getCalendarEvents = async (params: {
+  building_id: number;
+  date_from: string; // YYYY-MM-DD
+  date_to: string;
+  room_id?: number;
+  limit?: number;
+}): Promise<CalendarEvent[]> => {
+  const events: CalendarEvent[] = [];
+  let after: string | null = null;
+  try {
+    do {
+      const response: any = await api.get('/api/v1/admin/calendar', {
+        params: after ? { ...params, after } : params,
+      });
+      events.push(...response.data.data);
+      after = response.data.next_cursor;
+    } while (after);
+    return events;
+  } catch (error: any) {
+    console.error('Error fetching calendar events:', error.response?.data || error.message);
+    throw error.response?.data || error;
+  }
+};
+
+// Phòng và người đang check-in, nhóm theo cơ sở / tòa nhà
+export interface RoomOccupancy {
+  room_id: number;
+  no_room: string;
+  type_name: string;
+  active: boolean;
+  max_quantity: number | null;
+  quantity: number | null;
+  occupants: {
+    user_id: number;
+    MSSV: number | null;
+    lastname: string;
+    firstname: string;
+    order_id: number | null;
+    started_at: string;
+  }[];
+}
+
+export interface BranchOccupancy {
+  branch_id: number;
+  branch_name: string;
+  buildings: {
+    building_id: number;
+    building_name: string;
+    rooms: RoomOccupancy[];
+  }[];
+}
+
+export const getRoomOccupancy = async (params: {
+  branch_id?: number;
+  building_id?: number;
+  in_use?: boolean;
+} = {}): Promise<{ msg: string; data: BranchOccupancy[] }> => {
+  try {
+    const response = await api.get('/api/v1/admin/room_occupancy', { params });
+    return response.data;
+  } catch (error: any) {
+    console.error('Error fetching room occupancy:', error.response?.data || error.message);
+    throw error.response?.data || error;
+  }
+};
+
+export interface RoomEvent {
+  type: 'booked' | 'released' | 'occupancy' | 'library' | 'resync' | 'ready';
+  seq: number;
+  room_id?: number;
+  occupants?: number;
+  quantity?: number;
+  date?: string;
+  mask?: number;
+}
+
+// Nghe sự kiện trạng thái phòng (SSE). Dùng fetch thay cho EventSource để gửi được header Authorization.
+// Sự kiện đầu tiên là "ready" (đã đăng ký): tải ảnh chụp từ lúc đó để không lỡ sự kiện nào.
+// Promise kết thúc khi server đóng luồng, bị lỗi khi kết nối thất bại hoặc bị hủy qua signal.
+export const subscribeRoomEvents = async (
+  onEvent: (event: RoomEvent) => void,
+  signal: AbortSignal
+): Promise<void> => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${api.defaults.baseURL}/api/v1/admin/room_events`, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Room events: HTTP ${response.status}`);
+  }
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+    let end;
+    while ((end = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      const data = block
+        .split('\n')
+        .filter((line) => line.startsWith('data:'))
+        .map((line) => line.slice(5).trim())
+        .join('\n');
+      if (data) onEvent(JSON.parse(data));
+    }
+  }
+};
+
+export interface TimeseriesPoint {
+  period: string;
+  bookings: number;
+  cancellations: number;
+  checkins: number;
+  no_shows: number;
+}
+
+export const getBookingTimeseries = async (params: {
+  grain: 'day' | 'week' | 'month';
+  date_from?: string;
+  date_to?: string;
+  branch_id?: number;
+  building_id?: number;
+  type_id?: number;
+}): Promise<{ msg: string; data: TimeseriesPoint[] }> => {
+  try {
+    const response = await api.get('/api/v1/admin/stats/timeseries', { params });
+    return response.data;
+  } catch (error: any) {
+    console.error('Error fetching booking timeseries:', error.response?.data || error.message);
+    throw error.response?.data || error;
+  }
+};
@@ -27,14 +27,49 @@ api.interceptors.request.use(
   }
 );
 
+// Chỉ 1 lần gọi /auth/refresh tại một thời điểm, các request 401 khác chờ chung kết quả
+let refreshPromise: Promise<string> | null = null;
+
+const refreshAccessToken = (): Promise<string> => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshPromise = (refreshToken
+      ? axios.post(`${api.defaults.baseURL}/api/v1/auth/refresh`, { refresh_token: refreshToken })
+      : Promise.reject(new Error('No refresh token'))
+    )
+      .then((response) => {
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token as string;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Xử lý lỗi response (ví dụ: 401 Unauthorized)
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401 && !isRedirecting) {
+  async (error) => {
+    const original = error.config;
+    // Access token hết hạn: đổi bằng refresh token rồi gửi lại request (1 lần)
+    if (error.response?.status === 401 && original && !original._retry && !original.url?.includes('/auth/')) {
+      original._retry = true;
+      try {
+        const token = await refreshAccessToken();
+        original.headers['Authorization'] = `Bearer ${token}`;
+        return api(original);
+      } catch {
+        // Refresh thất bại: xử lý như token hết hạn bên dưới
+      }
+    }
+    if (error.response?.status === 401 && !isRedirecting && !original?.url?.includes('/auth/login')) {
       console.log("Token không hợp lệ hoặc hết hạn:", error.response.config.url);
       isRedirecting = true; // Đánh dấu đang redirect
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       localStorage.removeItem('user');
       window.location.href = '/login'; // Redirect khi token hết hạn
     }
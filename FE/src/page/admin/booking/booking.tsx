@@ -15,7 +15,7 @@ import { createEventModalPlugin } from "@schedule-x/event-modal";
 
 import "@schedule-x/theme-default/dist/index.css";
 import { useAuth } from "../../../AuthContext";
-import { fetchBuildings, getAllRooms, getOrdersByFilter } from "../../../api/apiService";
+import { fetchBuildings, getAllRooms, getCalendarEvents } from "../../../api/apiService";
 
 interface Building {
   id: number;
@@ -153,33 +153,33 @@ function Booking() {
       return;
     }
 
-    const roomId = room.id;
-
-    const params = {
-      room_id: roomId,
-      year: parseInt(selectedYear),
-      date_start: parseInt(selectedDay),
-      date_end: parseInt(selectedDay),
-      month_start: parseInt(selectedMonth),
-      month_end: parseInt(selectedMonth),
-    };
+    const day = `${selectedYear}-${selectedMonth.padStart(2, "0")}-${selectedDay.padStart(2, "0")}`;
+    const stateLabels = { booked: "Chưa sử dụng", used: "Đã sử dụng", cancelled: "Đã hủy" };
 
     try {
-      const response = await getOrdersByFilter(params);
+      const calendarEvents = await getCalendarEvents({
+        building_id: buildingId,
+        room_id: room.id,
+        date_from: day,
+        date_to: day,
+      });
 
       // Chuyển đổi dữ liệu từ API thành định dạng sự kiện của ScheduleXCalendar với description
-      const newEvents: Event[] = response.data.map(order => ({
-        id: order.id.toString(),
-        title: `Room ${order.room_id} - Order ${order.id}`,
-        start: `${order.date}T${order.begin}:00`,
-        end: `${order.date}T${order.end}:00`,
-        description: `Đơn hàng ${order.id} - Trạng thái: ${order.is_used ? 'Đã sử dụng' : 'Chưa sử dụng'}`,
-        calendarId: order.is_used ? "hieu" : "leisure",
+      const newEvents: Event[] = calendarEvents.map(event => ({
+        id: event.id.toString(),
+        title: `Room ${event.room_id} - Order ${event.id}`,
+        start: `${event.date} ${event.begin.slice(0, 5)}`,
+        end: `${event.date} ${event.end.slice(0, 5)}`,
+        description: `Đơn hàng ${event.id} - Trạng thái: ${stateLabels[event.state]}`,
+        calendarId: event.state === "used" ? "hieu" : "leisure",
       }));
 
       setFilteredEvents(newEvents);
+      if (!newEvents.length) {
+        setSearchError("Không có lịch đặt nào cho phòng này.");
+      }
     } catch (error: any) {
-      setSearchError(error.message || "Không có lịch đặt nào cho phòng này.");
+      setSearchError(error.detail || error.message || "Không tải được lịch đặt phòng.");
       setFilteredEvents([]);
     }
   };
@@ -11,6 +11,7 @@ import {
   CategoryScale,
 } from "chart.js";
 import { Line } from "react-chartjs-2";
+import { getBookingTimeseries } from "../../../api/apiService";
 
 // Đăng ký các thành phần cần dùng
 ChartJS.register(
@@ -51,32 +52,44 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ timeFrame }) => {
   useEffect(() => {
     console.log("ChartComponent: timeFrame changed to", timeFrame);
 
-    // TODO: Thay thế phần này bằng logic fetch dữ liệu thực tế
-    // Dựa vào timeFrame ('week' hoặc 'month'), gọi API hoặc lấy dữ liệu tương ứng
-    let newLabels: string[] = [];
-    let newDataPoints: number[] = [];
+    // Tuần: 7 ngày gần nhất theo ngày; tháng: 4 tuần gần nhất theo tuần (bảng tổng hợp theo ngày)
+    const toIso = (d: Date) =>
+      `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}-${String(d.getDate()).padStart(2, "0")}`;
+    const dateTo = new Date();
+    const dateFrom = new Date();
+    dateFrom.setDate(dateTo.getDate() - (timeFrame === "week" ? 6 : 27));
+    let cancelled = false;
 
-    if (timeFrame === "week") {
-      // Dữ liệu ví dụ cho tuần
-      newLabels = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"];
-      newDataPoints = [10, 20, 15, 30, 25, 40, 35]; // Thay bằng dữ liệu thực
-    } else {
-      // timeFrame === 'month'
-      // Dữ liệu ví dụ cho tháng (ví dụ 4 tuần)
-      newLabels = ["Tuần 1", "Tuần 2", "Tuần 3", "Tuần 4"]; // Hoặc ngày trong tháng
-      newDataPoints = [75, 90, 85, 115]; // Thay bằng dữ liệu thực
-    }
+    getBookingTimeseries({
+      grain: timeFrame === "week" ? "day" : "week",
+      date_from: toIso(dateFrom),
+      date_to: toIso(dateTo),
+    })
+      .then((response) => {
+        if (cancelled) return;
+        const newLabels = response.data.map((point, index) =>
+          timeFrame === "week"
+            ? new Date(`${point.period}T00:00:00`).toLocaleDateString("en-US", { weekday: "short" })
+            : `Tuần ${index + 1}`
+        );
+        const newDataPoints = response.data.map((point) => point.bookings);
 
-    // Cập nhật state của biểu đồ
-    setChartData({
-      labels: newLabels,
-      datasets: [
-        {
-          ...chartData.datasets[0], // Giữ lại các cấu hình khác
-          data: newDataPoints, // Cập nhật data points mới
-        },
-      ],
-    });
+        // Cập nhật state của biểu đồ
+        setChartData((current) => ({
+          labels: newLabels,
+          datasets: [
+            {
+              ...current.datasets[0], // Giữ lại các cấu hình khác
+              data: newDataPoints, // Cập nhật data points mới
+            },
+          ],
+        }));
+      })
+      .catch((err) => console.error("Error loading booking chart:", err));
+
+    return () => {
+      cancelled = true;
+    };
   }, [timeFrame]); // Dependency array: Chạy lại effect khi timeFrame thay đổi
 
   // --- Options biểu đồ (có thể giữ nguyên hoặc điều chỉnh) ---
@@ -1,22 +1,96 @@
 // File: RoomStatusTable.tsx
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { FaRegCalendarAlt } from "react-icons/fa";
 import DatePicker from "react-datepicker";
+import { getRoomOccupancy, subscribeRoomEvents, RoomEvent } from "../../../api/apiService";
+
+const RECONNECT_DELAY_MS = 5000;
 
 // Định nghĩa kiểu dữ liệu cho một phòng (tùy chọn nhưng nên có)
 interface Room {
   id: number;
   name: string;
-  status: string; // Có thể dùng 'Hoạt động' | 'Bảo trì' | ... union type
-  bookings: number;
+  active: boolean;
+  status: string; // 'Đang sử dụng' | 'Trống' | 'Bảo trì'
+  occupants: number;
 }
 
+const roomStatus = (active: boolean, occupants: number): string =>
+  !active ? "Bảo trì" : occupants > 0 ? "Đang sử dụng" : "Trống";
+
 function RoomStatusTable() {
-  const rooms: Room[] = [
-    { id: 1, name: "Phòng 812", status: "Hoạt động", bookings: 12 },
-    { id: 2, name: "Phòng 810", status: "Hoạt động", bookings: 12 },
-    { id: 3, name: "Phòng 811", status: "Hoạt động", bookings: 12 },
-  ];
+  const [rooms, setRooms] = useState<Room[]>([]);
+
+  // Đăng ký nghe trước, tải ảnh chụp sau (khi nhận "ready"), rồi cập nhật theo sự kiện server đẩy về (không poll)
+  useEffect(() => {
+    const controller = new AbortController();
+    const load = async (): Promise<Room[] | null> => {
+      try {
+        const response = await getRoomOccupancy();
+        return response.data.flatMap((branch) =>
+          branch.buildings.flatMap((building) =>
+            building.rooms.map((room) => {
+              const occupants = Math.max(room.occupants.length, room.quantity ?? 0);
+              return {
+                id: room.room_id,
+                name: `${branch.branch_name} - ${building.building_name} - Phòng ${room.no_room}`,
+                active: room.active,
+                status: roomStatus(room.active, occupants),
+                occupants,
+              };
+            })
+          )
+        );
+      } catch (err) {
+        console.error("Error loading room occupancy:", err);
+        return null;
+      }
+    };
+    const apply = (event: RoomEvent) => {
+      const occupants = event.type === "occupancy" ? event.occupants : event.type === "library" ? event.quantity : undefined;
+      if (occupants === undefined) return;
+      setRooms((current) =>
+        current.map((room) =>
+          room.id === event.room_id
+            ? { ...room, occupants, status: roomStatus(room.active, occupants) }
+            : room
+        )
+      );
+    };
+    // Sự kiện đến trong lúc tải ảnh chụp được giữ lại rồi áp dụng sau ảnh chụp
+    let buffered: RoomEvent[] | null = null;
+    const resync = async () => {
+      const pending: RoomEvent[] = [];
+      buffered = pending;
+      const snapshot = await load();
+      // Đã bị hủy hoặc một lần resync mới hơn đang chạy
+      if (controller.signal.aborted || buffered !== pending) return;
+      buffered = null;
+      if (snapshot) setRooms(snapshot);
+      pending.forEach(apply);
+    };
+    const onEvent = (event: RoomEvent) => {
+      if (event.type === "ready" || event.type === "resync") resync();
+      else if (buffered) buffered.push(event);
+      else apply(event);
+    };
+    const listen = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          await subscribeRoomEvents(onEvent, controller.signal);
+        } catch (err) {
+          if (controller.signal.aborted) return;
+          console.error("Room events disconnected:", err);
+          // Không nghe được (vd. quá nhiều client): vẫn làm mới bảng sau mỗi lần thử lại
+          resync();
+        }
+        // Mất kết nối: chờ rồi nghe lại (ảnh chụp được tải lại khi nhận "ready")
+        await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS));
+      }
+    };
+    listen();
+    return () => controller.abort();
+  }, []);
 
   // --- State cho Date Range Picker ---
   const [startDate, setStartDate] = useState<Date | null>(new Date()); // Ngày bắt đầu, ví dụ: hôm nay
@@ -94,7 +168,7 @@ function RoomStatusTable() {
             <th className="pb-3 font-medium pt-2">No</th>
             <th className="pb-3 font-medium pt-2">Tên phòng</th>
             <th className="pb-3 font-medium pt-2">Trạng thái</th>
-            <th className="pb-3 font-medium pt-2">Số lượt đặt</th>
+            <th className="pb-3 font-medium pt-2">Số người</th>
           </tr>
         </thead>
         <tbody>
@@ -105,15 +179,17 @@ function RoomStatusTable() {
               <td className="py-3">
                 <span
                   className={`px-2.5 py-0.5 rounded-full text-xs font-medium ${
-                    room.status === "Hoạt động"
+                    room.status === "Đang sử dụng"
                       ? "bg-green-100 text-green-700"
-                      : "bg-yellow-100 text-yellow-700" // Example for other statuses
+                      : room.status === "Trống"
+                      ? "bg-gray-100 text-gray-700"
+                      : "bg-yellow-100 text-yellow-700"
                   }`}
                 >
                   {room.status}
                 </span>
               </td>
-              <td className="py-3 text-gray-600">{room.bookings}</td>
+              <td className="py-3 text-gray-600">{room.occupants}</td>
             </tr>
           ))}
         </tbody>
@@ -110,7 +110,7 @@ function Login() {
         console.log("userData:", userData);
         console.log("token:", token);
 
-        login(userData, token);
+        login(userData, token, response.data.refresh_token);
 
         console.log("Token in localStorage:", localStorage.getItem("token"));
         console.log("User in localStorage:", localStorage.getItem("user"));